@@ -145,3 +145,30 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Background export jobs (see myapp/jobs.py)
+# 'thread' builds exports in a thread pool inside the web process; 'command'
+# leaves them to `python manage.py run_export_jobs`.
+EXPORT_JOB_RUNNER = os.getenv("EXPORT_JOB_RUNNER", "thread")
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", str(BASE_DIR / "export_jobs"))
+
+# Shared cache for dashboard responses (see myapp/caching.py): Redis when
+# REDIS_URL is set (needs the redis package), otherwise files on local disk, which every gunicorn worker
+# on the host shares.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR", str(BASE_DIR / "cache")),
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "3600"))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from myapp.models import DailyRecordSIAF, FemaleBirdsMortality,FemaleBirdsStock, FeedStock, MaleBirdsStock, MaleBirdsMortality, EggOut
+from myapp.models import DailyRecordSIAF, FemaleBirdsMortality,FemaleBirdsStock, FeedStock, MaleBirdsStock, MaleBirdsMortality, EggOut, FeedLedger, ExportJob, DailyFarmSummary, DeletedRow
 # Register your models here.
 admin.site.register(DailyRecordSIAF)
 admin.site.register(FeedStock)
@@ -7,4 +7,8 @@ admin.site.register(MaleBirdsStock)
 admin.site.register(MaleBirdsMortality)
 admin.site.register(FemaleBirdsStock)
 admin.site.register(FemaleBirdsMortality)
-admin.site.register(EggOut)
\ No newline at end of file
+admin.site.register(EggOut)
+admin.site.register(FeedLedger)
+admin.site.register(ExportJob)
+admin.site.register(DailyFarmSummary)
+admin.site.register(DeletedRow)
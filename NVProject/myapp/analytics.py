@@ -0,0 +1,178 @@
+"""
+Vectorised analytics over the daily SIAF records.
+
+siaf_frame() loads the records of a date range with values_list() into a
+compact DataFrame indexed by date: numeric fields as float32, the Yes/No
+equipment flags as categoricals, and the free-text notes only when asked for.
+The add_*() functions derive the report columns from it with column-wise
+arithmetic, so the cost of a range is a fixed number of queries plus vector
+operations instead of per-row Python.
+
+float32 keeps about seven significant digits. frame_records() turns values
+back into the decimals that were entered (through their shortest float32
+representation), so reports and exports show 10.1, not 10.100000381.
+"""
+import numpy as np
+import pandas as pd
+from django.db import models
+
+from .headcount import FLOCKS, flock_series
+from .models import DailyRecordSIAF
+
+# Fields of a record that are never part of the frame
+SKIPPED_FIELDS = ('id', 'created_at', 'updated_at')
+
+SIAF_FLAG_FIELDS = ('artificial_insemination', 'fogger_used', 'fan_used', 'light_used')
+SIAF_TEXT_FIELDS = ('medicine', 'notes')
+
+# A record counts as a day with feed data when any of these was entered
+SIAF_FEED_FIELDS = (
+    'feed_male_morning', 'feed_male_evening', 'feed_female_morning',
+    'feed_female_evening', 'feed_morning', 'feed_evening',
+)
+
+INTEGER_FIELDS = {
+    field.name for field in DailyRecordSIAF._meta.concrete_fields if isinstance(field, models.IntegerField)
+}
+
+
+def siaf_fields(notes=False):
+    """Record fields siaf_frame() loads, date first"""
+    return [
+        field.name for field in DailyRecordSIAF._meta.concrete_fields
+        if field.name not in SKIPPED_FIELDS and (notes or field.name != 'notes')
+    ]
+
+
+def to_frame(records, fields):
+    """
+    Compact DataFrame of records (tuples in the order of fields, or dicts),
+    indexed by date in the order given. An 'id' field stays int64.
+    """
+    frame = pd.DataFrame.from_records(list(records), columns=list(fields))
+    for name in frame.columns:
+        if name == 'date':
+            continue
+        if name == 'id':
+            frame[name] = frame[name].astype('int64')
+        elif name in SIAF_FLAG_FIELDS:
+            frame[name] = frame[name].astype('category')
+        elif name not in SIAF_TEXT_FIELDS:
+            frame[name] = frame[name].astype('float32')
+    return frame.set_index('date')
+
+
+def siaf_frame(start_date, end_date, notes=False):
+    """SIAF records of [start_date, end_date], oldest first"""
+    fields = siaf_fields(notes)
+    records = DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]).order_by('date').values_list(*fields)
+    return to_frame(records, fields)
+
+
+def entered(column):
+    """float64 copy of a float32 column holding the decimals as entered"""
+    values = column.to_numpy(dtype='float64')
+    if column.dtype == np.float32:
+        # The shortest representation of a float32 is the decimal it was made from
+        # (whole numbers are exact already)
+        fractional = np.isfinite(values) & (values != np.floor(values))
+        values[fractional] = column.to_numpy()[fractional].astype(str).astype('float64')
+    return pd.Series(values, index=column.index)
+
+
+def _ratio(numerator, denominator, scale):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(denominator > 0, numerator * scale / denominator, 0)
+    # round() rather than np.round(): the same figures as the rest of the app, halves included
+    return np.array([round(value, 2) for value in ratios.tolist()], dtype='float64')
+
+
+def add_flock_columns(frame):
+    """
+    Birds alive at the end of each day (male_birds, female_birds, total_birds)
+    and the per-bird figures: feed_per_gram_per_bird, male_feed_per_bird,
+    female_feed_per_bird and egg_percentage, rounded to 2 decimals.
+    """
+    if frame.empty:
+        birds = pd.DataFrame(columns=[sex for sex, _, _ in FLOCKS], index=frame.index, dtype='int64')
+    else:
+        series = flock_series(frame.index.min(), frame.index.max())
+        birds = pd.DataFrame.from_dict(
+            {day: {sex: flock['alive'] for sex, flock in flocks.items()} for day, flocks in series.items()},
+            orient='index',
+        ).reindex(frame.index)
+    frame['male_birds'] = birds['male'].astype('int64')
+    frame['female_birds'] = birds['female'].astype('int64')
+    frame['total_birds'] = frame['male_birds'] + frame['female_birds']
+
+    feed = entered(frame['effective_feed_kg'])
+    frame['feed_per_gram_per_bird'] = _ratio(feed, frame['total_birds'], 1000)
+    frame['male_feed_per_bird'] = _ratio(entered(frame['male_feed_kg']), frame['male_birds'], 1000)
+    frame['female_feed_per_bird'] = _ratio(entered(frame['female_feed_kg']), frame['female_birds'], 1000)
+    frame['egg_percentage'] = _ratio(entered(frame['total_eggs']), frame['female_birds'], 100)
+    return frame
+
+
+def add_mortality(frame):
+    """Mortality recorded on each day: male_mortality, female_mortality, total_mortality"""
+    frame['total_mortality'] = 0
+    for sex, _, mortality_model in FLOCKS:
+        daily = pd.Series(dtype='int64')
+        if not frame.empty:
+            daily = pd.Series(dict(
+                mortality_model.objects.filter(date__range=[frame.index.min(), frame.index.max()])
+                .values('date').annotate(total=models.Sum('mortality_count')).values_list('date', 'total')
+            ), dtype='int64')
+        frame[f'{sex}_mortality'] = daily.reindex(frame.index).fillna(0).astype('int64')
+        frame['total_mortality'] += frame[f'{sex}_mortality']
+    return frame
+
+
+def feed_totals_before(date):
+    """(feed used, days with feed data) over every record before date"""
+    has_feed = models.Q()
+    for field_name in SIAF_FEED_FIELDS:
+        has_feed |= models.Q(**{f'{field_name}__isnull': False})
+    totals = DailyRecordSIAF.objects.filter(date__lt=date).aggregate(
+        feed_used=models.Sum('effective_feed_kg'),
+        days_with_feed=models.Count('id', filter=has_feed),
+    )
+    return totals['feed_used'] or 0, totals['days_with_feed']
+
+
+def add_feed_average(frame, feed_used=None, days_with_feed=None):
+    """
+    feed_average: feed used up to each day over the days with feed data up to it.
+
+    The running totals start from feed_used/days_with_feed, which default to
+    everything recorded before the frame. Returns the totals after its last day.
+    """
+    if feed_used is None:
+        feed_used, days_with_feed = feed_totals_before(frame.index.min()) if not frame.empty else (0, 0)
+    cumulative_feed = feed_used + entered(frame['effective_feed_kg']).cumsum()
+    cumulative_days = days_with_feed + frame[list(SIAF_FEED_FIELDS)].notna().any(axis=1).cumsum()
+    frame['feed_average'] = _ratio(cumulative_feed, cumulative_days, 1)
+    if frame.empty:
+        return feed_used, days_with_feed
+    return float(cumulative_feed.iloc[-1]), int(cumulative_days.iloc[-1])
+
+
+def _python_values(column, name):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    elif column.dtype == np.float32:
+        column = entered(column)
+    values = column.tolist()
+    if name in INTEGER_FIELDS:
+        return [None if value != value else int(value) for value in values]
+    return [None if value is None or value != value else value for value in values]
+
+
+def frame_records(frame, columns=None, newest_first=False):
+    """Rows of frame as dicts of plain Python values (NaN as None), with the date under 'date'"""
+    columns = [name for name in (columns or frame.columns) if name != 'date']
+    if newest_first:
+        frame = frame.iloc[::-1]
+    keys = ['date'] + columns
+    values = [frame.index.tolist()] + [_python_values(frame[name], name) for name in columns]
+    return [dict(zip(keys, row)) for row in zip(*values)]
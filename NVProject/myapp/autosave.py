@@ -0,0 +1,107 @@
+"""
+Field-level saving of SIAF daily records.
+
+Operators fill a day's record in several sittings (morning, evening), so the
+form autosaves each field as it is edited instead of rewriting the whole row.
+
+SIAF_FIELDS is compiled once from the model: the fields an operator may enter
+(every field of RECORD_TYPES['siaf'] but the date) and the parser of each.
+parse_siaf_fields() runs the given values through it; save_siaf_fields()
+writes them with one INSERT ... ON CONFLICT (date) DO UPDATE that sets only
+those columns (and updated_at). The upsert is a single statement, so two
+sittings saving the same new day cannot create two rows, and a field-level
+save locks the row for one short write.
+"""
+from django.db import models, transaction
+
+from .analytics import SIAF_FLAG_FIELDS
+from .bulk import FLAG_VALUES, RECORD_TYPES
+from .models import DailyRecordSIAF
+from .signals import mark_rows_changed
+
+
+class InvalidFields(ValueError):
+    """Some given fields are invalid; errors maps each of them to its problem"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(f'{name} {message}' for name, message in errors.items()))
+        self.errors = errors
+
+
+def _number(convert, message):
+    def parse(value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, bool):
+            raise ValueError(message)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(message)
+        if number != number or number in (float('inf'), float('-inf')):
+            raise ValueError(message)
+        if convert is int:
+            if number != round(number):
+                raise ValueError(message)
+            return int(number)
+        return number
+    return parse
+
+
+def _flag(default):
+    def parse(value):
+        if value is None or value == '':
+            return default
+        if value not in FLAG_VALUES:
+            raise ValueError('must be Yes or No')
+        return value
+    return parse
+
+
+def _text(value):
+    if value is not None and not isinstance(value, str):
+        raise ValueError('must be text')
+    return value
+
+
+def _parser(field):
+    if field.name in SIAF_FLAG_FIELDS:
+        return _flag(field.get_default())
+    if isinstance(field, models.IntegerField):
+        return _number(int, 'must be a whole number')
+    if isinstance(field, models.FloatField):
+        return _number(float, 'must be a number')
+    return _text
+
+
+# Field attname -> parser of a submitted value
+SIAF_FIELDS = {field.attname: _parser(field) for field in RECORD_TYPES['siaf'].fields if field.name != 'date'}
+
+
+def parse_siaf_fields(values):
+    """{field: value} of submitted values parsed through SIAF_FIELDS; raises InvalidFields"""
+    parsed, errors = {}, {}
+    for name, value in values.items():
+        if name not in SIAF_FIELDS:
+            errors[name] = 'is not a field of the daily record'
+            continue
+        try:
+            parsed[name] = SIAF_FIELDS[name](value)
+        except ValueError as e:
+            errors[name] = str(e)
+    if errors:
+        raise InvalidFields(errors)
+    return parsed
+
+
+def save_siaf_fields(day, values):
+    """Upsert only the given parsed fields of the SIAF record of day (a new record takes defaults for the rest)"""
+    if not values:
+        raise ValueError('No fields to save')
+    with transaction.atomic():
+        DailyRecordSIAF.objects.bulk_create(
+            [DailyRecordSIAF(date=day, **values)],
+            update_conflicts=True, unique_fields=['date'], update_fields=[*values, 'updated_at'],
+        )
+        # Bulk writes send no signals
+        mark_rows_changed(DailyRecordSIAF, [day])
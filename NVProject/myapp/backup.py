@@ -0,0 +1,546 @@
+"""
+JSON backup of all farm data.
+
+BACKUP_MODELS lists the backup sections in the order they are written. A
+backup is either a single JSON object mapping each section name to the list
+of its rows, or NDJSON with one {"section": ..., "row": ...} line per row;
+either may be gzip-compressed.
+
+Both directions stream. backup_chunks() encodes rows as they come from
+chunked QuerySet iterators; read_backup() parses an upload one row at a time.
+Memory use depends on the chunk sizes, not on the size of the backup.
+
+An incremental backup (backup_sections(since=...)) holds only the rows
+updated after the watermark, preceded by a deleted_rows section listing the
+DeletedRow tombstones ({"section": ..., "id": ...}) recorded since then.
+Rows are stamped when they are saved, not when their transaction commits, so
+backup_watermark(), the since of the next incremental backup, lags the start
+of the export by WATERMARK_MARGIN: rows of a transaction still open while the
+export read their table fall after it. The overlap is simply applied again.
+Tombstones are kept for TOMBSTONE_RETENTION (see prune_tombstones()), so an
+incremental backup cannot start further back than that.
+
+restore_backup() replaces all farm data with a full backup. The file is read
+twice: the first pass parses and checks every row (every field converted by
+its model field type, every batch reference resolved) keeping only the ids
+seen, so a bad file changes nothing. The second pass runs in one transaction:
+tables cleared, rows inserted with bulk_create() in chunks in BACKUP_MODELS
+order (batches before their mortality) and primary key sequences moved past
+the restored ids. The feed ledger and daily summary are rebuilt once, after
+the commit.
+
+merge_backup() applies a backup (usually incremental) on top of the existing
+data the same way, but instead of clearing the tables it deletes the
+tombstoned rows and upserts the others by primary key, so only the dates the
+backup touches are refreshed.
+"""
+import gzip
+import io
+import json
+from datetime import date as date_type, datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .exports import gzip_chunks
+from .models import DailyRecordSIAF, DeletedRow, EggOut, FeedStock, FemaleBirdsMortality, FemaleBirdsStock, MaleBirdsMortality, MaleBirdsStock
+from .signals import LEDGER_SOURCES, deferred_refresh, mark_dirty, mark_rows_changed, tracked_date_field
+
+BACKUP_MODELS = (
+    ('daily_records_siaf', DailyRecordSIAF),
+    ('feed_stock', FeedStock),
+    ('male_birds_stock', MaleBirdsStock),
+    ('male_birds_mortality', MaleBirdsMortality),
+    ('female_birds_stock', FemaleBirdsStock),
+    ('female_birds_mortality', FemaleBirdsMortality),
+    ('egg_out', EggOut),
+)
+
+# Section of an incremental backup listing the rows deleted since its watermark
+DELETED_SECTION = 'deleted_rows'
+
+# Rows fetched per round trip on export, and inserted per INSERT statement on restore
+EXPORT_CHUNK_SIZE = 2000
+RESTORE_BATCH_SIZE = 1000
+
+# Characters of text collected before a chunk is written, and read per parse step
+WRITE_CHUNK_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# How far the watermark lags the start of an export; longer than any write transaction
+WATERMARK_MARGIN = timedelta(minutes=5)
+
+# How long tombstones are kept; incremental backups must be taken more often than this
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+class BackupError(ValueError):
+    """Backup file that cannot be restored"""
+
+
+def _json_default(value):
+    if isinstance(value, (date_type, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def backup_watermark():
+    """The since to use for the backup after one that starts reading now"""
+    return timezone.now() - WATERMARK_MARGIN
+
+
+def prune_tombstones(retention=TOMBSTONE_RETENTION):
+    """Delete the tombstones older than retention; returns how many were deleted"""
+    deleted, _ = DeletedRow.objects.filter(deleted_at__lt=timezone.now() - retention).delete()
+    return deleted
+
+
+def _deleted_rows(since):
+    sections = {model._meta.model_name: name for name, model in BACKUP_MODELS}
+    tombstones = DeletedRow.objects.filter(deleted_at__gt=since).order_by('pk').values_list('model', 'row_id')
+    for model_name, row_id in tombstones.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if model_name in sections:
+            yield {'section': sections[model_name], 'id': row_id}
+
+
+def backup_sections(since=None):
+    """
+    (section name, rows) of every section; rows are read in chunks as they are
+    consumed. With since, only the rows updated after it, preceded by the
+    deletions since then.
+    """
+    if since is not None:
+        yield DELETED_SECTION, _deleted_rows(since)
+    for name, model in BACKUP_MODELS:
+        rows = model.objects.order_by('pk')
+        if since is not None:
+            rows = rows.filter(updated_at__gt=since)
+        yield name, rows.values().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _encode(sections, ndjson):
+    if ndjson:
+        for name, rows in sections:
+            empty = True
+            for row in rows:
+                empty = False
+                yield json.dumps({'section': name, 'row': row}, default=_json_default) + '\n'
+            if empty:
+                # Same marker as an empty list in JSON, so the section is still known to be there
+                yield json.dumps({'section': name, 'row': None}) + '\n'
+        return
+
+    # One object of sections, each row written as soon as it arrives
+    yield '{'
+    for index, (name, rows) in enumerate(sections):
+        yield (',\n' if index else '\n') + f'  {json.dumps(name)}: ['
+        separator = '\n    '
+        for row in rows:
+            yield separator + json.dumps(row, default=_json_default)
+            separator = ',\n    '
+        yield '\n  ]' if separator != '\n    ' else ']'
+    yield '\n}\n'
+
+
+def backup_chunks(sections=None, ndjson=False):
+    """The backup of sections (all farm data by default) as text chunks of about WRITE_CHUNK_SIZE"""
+    buffer, size = [], 0
+    for piece in _encode(backup_sections() if sections is None else sections, ndjson):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= WRITE_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def backup_stream(ndjson=False, compress=False, since=None):
+    """The backup (incremental with since) as bytes chunks, gzip-compressed when compress is set"""
+    chunks = (chunk.encode('utf-8') for chunk in backup_chunks(backup_sections(since), ndjson=ndjson))
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def write_backup(output, ndjson=False, since=None, progress=None):
+    """
+    Write the backup (incremental with since) as text to output; returns the
+    number of rows written. progress, when given, is called with the rows
+    written so far after every chunk.
+    """
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    sections = ((name, counted(rows)) for name, rows in backup_sections(since))
+    for chunk in backup_chunks(sections, ndjson):
+        output.write(chunk)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+class _JsonReader:
+    """Reads the rows of a backup object from a text stream one value at a time"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, text):
+        self.text = text
+        self.buffer = ''
+        self.position = 0
+
+    def _fill(self):
+        chunk = self.text.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Next non-blank character ('' at the end of the stream)"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def take(self, char):
+        if self.peek() != char:
+            raise BackupError(f'Invalid backup file: expected {char!r}')
+        self.position += 1
+
+    def value(self):
+        """Next JSON value; objects and strings end with their own delimiter, so a partial buffer never parses"""
+        self.peek()
+        while True:
+            try:
+                value, self.position = self.decoder.raw_decode(self.buffer, self.position)
+                return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def rows(self):
+        self.take('{')
+        if self.peek() == '}':
+            self.position += 1
+        else:
+            while True:
+                name = self.value()
+                if not isinstance(name, str):
+                    raise BackupError('Invalid backup file: section names must be strings')
+                self.take(':')
+                self.take('[')
+                if self.peek() == ']':
+                    self.position += 1
+                    # An empty section still takes part in the section order checks
+                    yield name, None
+                else:
+                    while True:
+                        yield name, self.value()
+                        if self.peek() != ',':
+                            break
+                        self.position += 1
+                    self.take(']')
+                if self.peek() != ',':
+                    break
+                self.position += 1
+            self.take('}')
+        if self.peek():
+            raise BackupError('Invalid backup file: data after the end of the backup')
+
+
+def _ndjson_rows(text):
+    for line in text:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict) or set(record) != {'section', 'row'}:
+            raise BackupError('Invalid backup file: NDJSON lines must be {"section": ..., "row": ...}')
+        yield record['section'], record['row']
+
+
+def read_backup(binary, ndjson=False):
+    """
+    (section name, row) of every row of a backup in a binary file object,
+    gzip-compressed or not. A section without rows yields one (name, None).
+    """
+    binary.seek(0)
+    if binary.read(2) == GZIP_MAGIC:
+        binary.seek(0)
+        binary = gzip.GzipFile(fileobj=binary)
+    else:
+        binary.seek(0)
+    text = io.TextIOWrapper(binary, encoding='utf-8')
+    try:
+        yield from _ndjson_rows(text) if ndjson else _JsonReader(text).rows()
+    finally:
+        # Leave the underlying upload open for the next pass
+        text.detach()
+
+
+def data_rows(data):
+    """(section name, row) of parsed backup data (a dict of section lists)"""
+    if not isinstance(data, dict):
+        raise BackupError('A backup must be a JSON object of sections')
+    for name, rows in data.items():
+        if not isinstance(rows, list):
+            raise BackupError(f'Section {name} must be a list of rows')
+        if not rows:
+            yield name, None
+        for row in rows:
+            yield name, row
+
+
+def restored_fields(model):
+    """Fields of model read from a backup row (generated columns are recomputed by the database)"""
+    return [field for field in model._meta.concrete_fields if not field.generated]
+
+
+def _parse_value(field, value):
+    if value is None:
+        return None
+    if isinstance(field, models.DateTimeField):
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise ValidationError('not a date and time')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+    if isinstance(field, models.DateField):
+        # Older backups may hold a full timestamp in a date field
+        parsed = (parse_date(value) or parse_datetime(value)) if isinstance(value, str) else None
+        if parsed is None:
+            raise ValidationError('not a date')
+        return parsed.date() if isinstance(parsed, datetime) else parsed
+    return field.to_python(value)
+
+
+class RowParser:
+    """
+    Turns backup rows into unsaved instances, checking sections, fields and
+    batch references. With merge, rows may also reference batches already in
+    the database, and deleted_rows entries are collected in deleted.
+    """
+
+    def __init__(self, merge=False):
+        self.merge = merge
+        self.sections = {DELETED_SECTION: None, **dict(BACKUP_MODELS)}
+        self.order = list(self.sections)
+        self.current = None
+        self.counts = {}
+        self.ids = {}
+        self.deleted = {}
+        self.existing = {}
+
+    def _exists(self, model, pk):
+        if model not in self.existing:
+            # Only batches are referenced, so this stays small
+            self.existing[model] = set(model.objects.values_list('pk', flat=True)) - self.deleted.get(model, set())
+        return pk in self.existing[model]
+
+    def _deletion(self, position, row):
+        if not isinstance(row, dict) or set(row) != {'section', 'id'}:
+            raise BackupError(f'{position} must be {{"section": ..., "id": ...}}')
+        model = dict(BACKUP_MODELS).get(row['section'])
+        if model is None:
+            raise BackupError(f"{position}: unknown section {row['section']}")
+        if not isinstance(row['id'], int) or isinstance(row['id'], bool):
+            raise BackupError(f'{position}: id must be an integer')
+        self.deleted.setdefault(model, set()).add(row['id'])
+
+    def _section(self, name):
+        if name == self.current:
+            return self.sections[name]
+        if name not in self.sections:
+            raise BackupError(f'Unknown backup section: {name}')
+        if name in self.counts:
+            raise BackupError(f'Section {name} appears twice')
+        # Sections must come in BACKUP_MODELS order, so batches are known before their mortality
+        if self.current is not None and self.order.index(name) < self.order.index(self.current):
+            raise BackupError(f'Section {name} must come before {self.current}')
+        self.current = name
+        self.counts[name] = 0
+        return self.sections[name]
+
+    def parse(self, name, row):
+        """Instance of row (None for the marker of an empty section)"""
+        model = self._section(name)
+        if name == DELETED_SECTION and not self.merge:
+            raise BackupError('This is an incremental backup; it can only be merged into the existing data')
+        if row is None:
+            return None
+        self.counts[name] += 1
+        position = f'{name} row {self.counts[name]}'
+        if model is None:
+            self._deletion(position, row)
+            return None
+        if not isinstance(row, dict):
+            raise BackupError(f'{position} is not an object')
+        known = {field.attname for field in model._meta.concrete_fields}
+        unexpected = sorted(set(row) - known)
+        if unexpected:
+            raise BackupError(f"{position}: unknown fields {', '.join(unexpected)}")
+
+        values = {}
+        for field in restored_fields(model):
+            if field.attname not in row:
+                continue
+            try:
+                values[field.attname] = _parse_value(field, row[field.attname])
+            except (ValidationError, TypeError, ValueError) as e:
+                message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                raise BackupError(f'{position}, {field.name}: {message}')
+
+        ids = self.ids.setdefault(model, set())
+        if values.get('id') is None:
+            raise BackupError(f'{position} has no id')
+        if values['id'] in ids:
+            raise BackupError(f"{position}: duplicate id {values['id']}")
+        ids.add(values['id'])
+
+        # Batch references must point at a batch restored before them
+        for field in model._meta.concrete_fields:
+            if field.many_to_one and values.get(field.attname) is not None:
+                pk = values[field.attname]
+                if pk not in self.ids.get(field.related_model, ()) and not (
+                    self.merge and self._exists(field.related_model, pk)
+                ):
+                    raise BackupError(f'{position}: {field.name} {pk} is not in the backup')
+        return model(**values)
+
+
+def _checked(rows, merge=False):
+    parser = RowParser(merge)
+    for name, row in rows:
+        parser.parse(name, row)
+    return parser
+
+
+def _counts(parser):
+    counts = {name: parser.counts.get(name, 0) for name, _ in BACKUP_MODELS}
+    if DELETED_SECTION in parser.counts:
+        counts[DELETED_SECTION] = parser.counts[DELETED_SECTION]
+    return counts
+
+
+def parse_backup(rows, merge=False):
+    """
+    Check every (section name, row) of a backup without keeping the rows.
+    Returns {section name: row count}; raises BackupError for anything that
+    cannot be restored (or merged, with merge).
+    """
+    return _counts(_checked(rows, merge))
+
+
+def _batches(parser, rows):
+    """(model, instances) in chunks of up to RESTORE_BATCH_SIZE rows of one model"""
+    batch, batch_model = [], None
+    for name, row in rows:
+        instance = parser.parse(name, row)
+        if instance is None:
+            continue
+        if batch and (type(instance) is not batch_model or len(batch) >= RESTORE_BATCH_SIZE):
+            yield batch_model, batch
+            batch = []
+        batch.append(instance)
+        batch_model = type(instance)
+    if batch:
+        yield batch_model, batch
+
+
+def _reset_sequences():
+    # Let new rows continue after the restored ids
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model for _, model in BACKUP_MODELS]):
+            cursor.execute(sql)
+
+
+def replace_data(insert):
+    """
+    Replace all farm data, in one transaction: clear the tables, then call
+    insert() to write the new rows in BACKUP_MODELS order.
+    """
+    with deferred_refresh():
+        with transaction.atomic():
+            # Raw DELETEs, dependent rows first. Deleting through the ORM would load
+            # every old row to send its delete signals; the derived tables are
+            # rebuilt below, and replaced rows leave no tombstones
+            for _, model in reversed(BACKUP_MODELS):
+                model.objects.all()._raw_delete(connection.alias)
+            DeletedRow.objects.all()._raw_delete(connection.alias)
+
+            insert()
+            _reset_sequences()
+
+            # bulk_create() sends no signals: rebuild the derived tables from the start
+            for _, model in BACKUP_MODELS:
+                if model in LEDGER_SOURCES:
+                    mark_dirty(model, ledger_from=date_type.min)
+                else:
+                    mark_dirty(model, summary_from=date_type.min)
+
+
+def restore_backup(open_rows):
+    """
+    Replace all farm data with a backup; open_rows() returns a fresh iterator
+    of its (section name, row) pairs (see read_backup and data_rows).
+    Returns {section name: rows restored}.
+    """
+    counts = parse_backup(open_rows())
+
+    def insert():
+        for model, batch in _batches(RowParser(), open_rows()):
+            model.objects.bulk_create(batch)
+
+    replace_data(insert)
+    return counts
+
+
+def _upsert(model, batch):
+    """Insert or update a batch of instances by primary key, refreshing the dates they had and have"""
+    field = tracked_date_field(model)
+    dates = [getattr(instance, field) for instance in batch]
+    dates += model.objects.filter(pk__in=[instance.pk for instance in batch]).values_list(field, flat=True)
+    model.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=[f.name for f in restored_fields(model) if not f.primary_key and f.name != 'created_at'],
+    )
+    # bulk_create() sends no signals
+    mark_rows_changed(model, dates)
+
+
+def merge_backup(open_rows):
+    """
+    Apply a backup on top of the existing data: delete its deleted_rows, then
+    insert or update every other row by primary key, all in one transaction.
+    open_rows() is as for restore_backup(). Returns {section name: row count}.
+    """
+    parser = _checked(open_rows(), merge=True)
+    try:
+        with deferred_refresh():
+            with transaction.atomic():
+                # Deleted one by one through the ORM so cascades, refreshes and tombstones follow
+                for _, model in reversed(BACKUP_MODELS):
+                    ids = sorted(parser.deleted.get(model, ()))
+                    for start in range(0, len(ids), RESTORE_BATCH_SIZE):
+                        model.objects.filter(pk__in=ids[start:start + RESTORE_BATCH_SIZE]).delete()
+
+                for model, batch in _batches(RowParser(merge=True), open_rows()):
+                    _upsert(model, batch)
+                _reset_sequences()
+    except IntegrityError as e:
+        raise BackupError(f'Rows conflict with the existing data: {e}')
+    return _counts(parser)
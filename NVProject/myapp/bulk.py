@@ -0,0 +1,287 @@
+"""
+Bulk upsert of daily records of several types in one request.
+
+Each record is a dict with a 'type' (a key of RECORD_TYPES) and the fields of
+that type. A record is matched to the stored one by its natural key: the date
+for SIAF records, egg out and feed stock, the batch and date for mortality.
+It then replaces that record entirely, as the single-record forms do: missing
+fields take their defaults.
+
+save_records() validates the records of each type together on a DataFrame
+(types, required fields, Yes/No flags, batch references, duplicate keys), so
+the checks cost a few vector operations per type rather than per record.
+Nothing is written unless every record is valid; the writes then run in one
+transaction (check_frame() and write_frame() also serve myapp.imports, which
+keeps the valid rows). Types whose key is unique in the database are written with
+bulk_create(update_conflicts=True); the others are matched with one query
+and written with bulk_update() and bulk_create().
+"""
+from dataclasses import dataclass, field as dataclass_field
+
+import pandas as pd
+from django.db import models, transaction
+from django.utils import timezone
+
+from .analytics import SIAF_FLAG_FIELDS
+from .models import DailyRecordSIAF, EggOut, FeedStock, FemaleBirdsMortality, MaleBirdsMortality
+from .signals import deferred_refresh, mark_rows_changed, tracked_date_field
+
+MAX_BULK_RECORDS = 5000
+
+FLAG_VALUES = ('Yes', 'No')
+
+
+class InvalidRecords(ValueError):
+    """Some records of a bulk request are invalid; results holds the per-record outcome"""
+
+    def __init__(self, results):
+        super().__init__(f"{sum(result['status'] == 'error' for result in results)} record(s) are invalid")
+        self.results = results
+
+
+@dataclass
+class RecordType:
+    model: type
+    key: tuple  # Natural key fields
+    unique_key: bool  # The database enforces the key, so it can resolve conflicts itself
+    computed: dict = dataclass_field(default_factory=dict)  # Field -> function of the record's values
+
+    @property
+    def fields(self):
+        """Fields a record may give (model fields minus ids, timestamps, generated and computed ones)"""
+        return [
+            field for field in self.model._meta.concrete_fields
+            if not field.primary_key and not field.generated and field.name not in self.computed
+            and not getattr(field, 'auto_now', False) and not getattr(field, 'auto_now_add', False)
+        ]
+
+    @property
+    def names(self):
+        """Keys a record of this type may have (batches may be given as batch or batch_id)"""
+        return {'type'} | {field.attname for field in self.fields} | {field.name for field in self.fields}
+
+    def required(self, field):
+        return field.name in self.key or (not field.null and not field.has_default())
+
+
+RECORD_TYPES = {
+    'siaf': RecordType(DailyRecordSIAF, ('date',), unique_key=True),
+    'egg_out': RecordType(EggOut, ('date',), unique_key=True),
+    'feed_stock': RecordType(
+        FeedStock, ('date',), unique_key=False,
+        computed={'bundles': lambda values: round(values['kg'] / 60, 2)},  # As FeedStock.save()
+    ),
+    'male_mortality': RecordType(MaleBirdsMortality, ('batch', 'date'), unique_key=False),
+    'female_mortality': RecordType(FemaleBirdsMortality, ('batch', 'date'), unique_key=False),
+}
+
+
+def _is_flag(field):
+    return field.model is DailyRecordSIAF and field.name in SIAF_FLAG_FIELDS
+
+
+def _check_column(frame, field, required, errors):
+    """Converted column of frame for field, noting the invalid values in errors"""
+    name = field.attname
+    given = frame[name].notna()
+
+    if field.many_to_one or isinstance(field, (models.IntegerField, models.FloatField)):
+        values = pd.to_numeric(frame[name], errors='coerce')
+        invalid = given & (values.isna() | frame[name].map(lambda value: isinstance(value, bool)))
+        if field.many_to_one or isinstance(field, models.IntegerField):
+            invalid |= values.notna() & (values != values.round())
+            message = 'must be a whole number'
+        else:
+            message = 'must be a number'
+    elif isinstance(field, models.DateField):
+        values = pd.to_datetime(frame[name], format='%Y-%m-%d', errors='coerce')
+        invalid = given & values.isna()
+        values = values.dt.date
+        message = 'must be a date (YYYY-MM-DD)'
+    elif _is_flag(field):
+        values = frame[name]
+        invalid = given & ~values.isin(FLAG_VALUES)
+        message = 'must be Yes or No'
+    else:
+        values = frame[name]
+        invalid = given & ~values.map(lambda value: isinstance(value, str))
+        message = 'must be text'
+
+    for index in frame.index[invalid]:
+        errors[index].append(f'{field.name} {message}')
+    if required:
+        for index in frame.index[~given]:
+            errors[index].append(f'{field.name} is required')
+    return values.where(given & ~invalid, None)
+
+
+def check_frame(record_type, frame, errors):
+    """
+    {field attname: converted column} of a DataFrame of records of one type
+    (one column per given field), adding the problems of each row to
+    errors[row index]
+    """
+    fields = record_type.fields
+    for field in fields:
+        # Batches may be given as batch or batch_id
+        if field.many_to_one and field.name in frame:
+            given = frame[field.attname] if field.attname in frame else frame[field.name]
+            frame[field.attname] = given.where(given.notna(), frame[field.name])
+    for field in fields:
+        if field.attname not in frame:
+            frame[field.attname] = None
+        # An empty value means "not given", as in the forms
+        if not isinstance(field, (models.CharField, models.TextField)) or _is_flag(field):
+            frame[field.attname] = frame[field.attname].where(frame[field.attname] != '', None)
+
+    columns = {field.attname: _check_column(frame, field, record_type.required(field), errors) for field in fields}
+
+    for field in fields:
+        if field.many_to_one:
+            references = columns[field.attname].dropna().astype('int64')
+            existing = list(field.related_model.objects.filter(pk__in=set(references.tolist())).values_list('pk', flat=True))
+            for index in references.index[~references.isin(existing)]:
+                errors[index].append(f'{field.name} {int(references[index])} not found')
+
+    key = [record_type.model._meta.get_field(name).attname for name in record_type.key]
+    keys = pd.DataFrame({name: columns[name] for name in key})
+    for index in keys.index[keys.notna().all(axis=1) & keys.duplicated(keep=False)]:
+        errors[index].append('another record here has the same ' + ' and '.join(record_type.key))
+
+    # Without a unique key, a key already matching several rows is ambiguous
+    valid = [index for index in frame.index if not errors[index]]
+    if not record_type.unique_key and valid:
+        instances = _instances(record_type, columns, valid)
+        key, existing = _existing(record_type, instances)
+        for index, instance in zip(valid, instances):
+            if len(existing.get(tuple(getattr(instance, name) for name in key), ())) > 1:
+                errors[index].append('several records exist for this ' + ' and '.join(record_type.key) + '; edit them one by one')
+    return columns
+
+
+def _instances(record_type, columns, indexes):
+    """Unsaved instances of the rows indexes of checked columns"""
+    fields = record_type.fields
+    prepared = []
+    for field in fields:
+        default = field.get_default() if field.has_default() else None
+        if field.many_to_one or isinstance(field, models.IntegerField):
+            convert = int
+        elif isinstance(field, models.FloatField):
+            convert = float
+        else:
+            convert = None
+        prepared.append([
+            default if value is None or value != value else (convert(value) if convert else value)
+            for value in columns[field.attname].loc[indexes].tolist()
+        ])
+
+    now = timezone.now()
+    instances = []
+    for row in zip(*prepared):
+        values = {field.attname: value for field, value in zip(fields, row)}
+        for name, compute in record_type.computed.items():
+            values[name] = compute(values)
+        instances.append(record_type.model(**values, updated_at=now))
+    return instances
+
+
+def _existing(record_type, instances):
+    """{natural key: [ids]} of the stored rows matching instances"""
+    key = [record_type.model._meta.get_field(name).attname for name in record_type.key]
+    dates = {instance.date for instance in instances}
+    existing = {}
+    for row in record_type.model.objects.filter(date__in=dates).values_list('id', *key):
+        existing.setdefault(tuple(row[1:]), []).append(row[0])
+    return key, existing
+
+
+def _write(record_type, instances):
+    """Upsert instances of one type; returns [(status, id)] in their order"""
+    model = record_type.model
+    key, existing = _existing(record_type, instances)
+    keys = [tuple(getattr(instance, name) for name in key) for instance in instances]
+    update_fields = [field.name for field in record_type.fields if field.name not in record_type.key]
+    update_fields += list(record_type.computed) + ['updated_at']
+
+    if record_type.unique_key:
+        model.objects.bulk_create(
+            instances, update_conflicts=True, unique_fields=list(record_type.key), update_fields=update_fields,
+        )
+        # Ids of both the inserted and the updated rows, whatever the backend returns
+        _, stored = _existing(record_type, instances)
+        results = [('updated' if k in existing else 'created', stored[k][0]) for k in keys]
+    else:
+        updates, inserts = [], []
+        for instance, k in zip(instances, keys):
+            if k in existing:
+                instance.pk = existing[k][0]
+                updates.append(instance)
+            else:
+                inserts.append(instance)
+        model.objects.bulk_update(updates, update_fields)
+        model.objects.bulk_create(inserts)
+        results = [('updated' if k in existing else 'created', instance.pk) for instance, k in zip(instances, keys)]
+
+    # Bulk writes send no signals; the natural key holds the date, so no row moved
+    mark_rows_changed(model, [getattr(instance, tracked_date_field(model)) for instance in instances])
+    return results
+
+
+def write_frame(record_type, columns, indexes):
+    """Upsert the rows indexes of columns checked by check_frame(); returns [(status, id)] in their order"""
+    if not indexes:
+        return []
+    return _write(record_type, _instances(record_type, columns, indexes))
+
+
+def save_records(records):
+    """
+    Validate and upsert records (see the module docstring) in one transaction.
+    Returns [{'index', 'type', 'status': 'created' | 'updated', 'id'}] in the
+    order given; raises InvalidRecords, with every record's result, when any
+    record is invalid.
+    """
+    if not isinstance(records, list) or not records:
+        raise ValueError('records must be a non-empty list')
+    if len(records) > MAX_BULK_RECORDS:
+        raise ValueError(f'At most {MAX_BULK_RECORDS} records per request')
+
+    errors = {index: [] for index in range(len(records))}
+    groups = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[index].append('must be an object')
+        elif record.get('type') not in RECORD_TYPES:
+            errors[index].append(f"type must be one of {', '.join(RECORD_TYPES)}")
+        else:
+            unknown = sorted(set(record) - RECORD_TYPES[record['type']].names)
+            if unknown:
+                errors[index].append(f"unknown fields {', '.join(unknown)}")
+            groups.setdefault(record['type'], []).append(index)
+
+    checked = {}
+    for type_name, indexes in groups.items():
+        record_type = RECORD_TYPES[type_name]
+        frame = pd.DataFrame.from_records([records[index] for index in indexes], index=indexes).astype(object)
+        frame = frame.where(frame.notna(), None)
+        checked[type_name] = (frame, check_frame(record_type, frame, errors))
+
+    def result(index, **values):
+        record_type = records[index].get('type') if isinstance(records[index], dict) else None
+        return {'index': index, 'type': record_type, **values}
+
+    if any(errors.values()):
+        raise InvalidRecords([
+            result(index, status='error', errors=messages) if messages else result(index, status='valid')
+            for index, messages in errors.items()
+        ])
+
+    results = {}
+    with deferred_refresh():
+        with transaction.atomic():
+            for type_name, (frame, columns) in checked.items():
+                written = write_frame(RECORD_TYPES[type_name], columns, list(frame.index))
+                for index, (status, pk) in zip(frame.index, written):
+                    results[index] = result(index, status=status, id=pk)
+    return [results[index] for index in range(len(records))]
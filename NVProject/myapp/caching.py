@@ -0,0 +1,187 @@
+"""
+Response caching for the JSON endpoints.
+
+Dashboards use a shared server-side cache (cached_response); list and report
+endpoints answer conditional GETs (conditional_on).
+
+cached_response:
+An entry is keyed by view, query string and the current day, and stamped with
+the data version of every model the view reads. myapp.signals gives a model a
+new version after each committed write to it, so an entry is served exactly
+until one of its models changes.
+
+- Single flight: when an entry is missing, only the request holding the
+  entry's lock runs the view; concurrent requests wait for its result.
+- Stale while revalidate: when an entry is outdated and another request is
+  already recomputing it, the outdated response is served instead of waiting.
+
+Entries live in settings.CACHES['default']: files on local disk by default,
+shared by every worker on the host, or Redis when REDIS_URL is set. Redis
+makes the lock exact; with files two workers may occasionally both recompute.
+
+conditional_on:
+The row count and latest updated_at of the querysets a view reads are its
+validators. The ETag covers all of them, so a delete changes it too; a request
+whose If-None-Match still matches gets 304 Not Modified without running the
+view. Last-Modified (the latest change) is sent for information only: HTTP
+dates have one-second resolution and do not move on deletes, so
+If-Modified-Since alone never produces a 304.
+"""
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models as db_models
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+# How long a recompute may hold an entry's lock, and how long others wait for it
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 10
+LOCK_POLL = 0.05
+
+
+def _version_key(model):
+    return f'data-version:{model._meta.label_lower}'
+
+
+def data_versions(models):
+    """Current data version of each model"""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # First use (or evicted): add() keeps a version another worker set first
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_data_versions(models):
+    """Give the models a new data version, outdating every cached response that read them"""
+    if models:
+        cache.set_many({_version_key(model): uuid.uuid4().hex for model in models}, None)
+
+
+def _entry_key(view, request, args, kwargs):
+    request_state = json.dumps([sorted(request.GET.lists()), args, kwargs], default=str)
+    digest = hashlib.sha256(request_state.encode()).hexdigest()
+    return f'response:{view.__module__}.{view.__name__}:{timezone.now().date()}:{digest}'
+
+
+def _cacheable(response):
+    if response.status_code != 200 or response.streaming or response.get('Content-Type') != 'application/json':
+        return False
+    # Failed calls (e.g. a database error) are answered with success False: never keep them
+    return json.loads(response.content).get('success') is True
+
+
+def _response(entry):
+    return HttpResponse(entry['content'], content_type=entry['content_type'])
+
+
+def cached_response(*models):
+    """
+    Cache the successful JSON GET responses of a view until one of `models`
+    changes (or settings.RESPONSE_CACHE_TIMEOUT passes).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key = _entry_key(view, request, args, kwargs)
+            lock_key = f'{key}:lock'
+            # Read the versions before the data, so a write during the view outdates the entry
+            versions = data_versions(models)
+            entry = cache.get(key)
+            if entry is not None and entry['versions'] == versions:
+                return _response(entry)
+
+            locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            if not locked:
+                if entry is not None:
+                    return _response(entry)
+                deadline = time.monotonic() + LOCK_WAIT
+                while not locked and time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL)
+                    entry = cache.get(key)
+                    if entry is not None and entry['versions'] == versions:
+                        return _response(entry)
+                    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if _cacheable(response):
+                    cache.set(key, {
+                        'versions': versions,
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }, settings.RESPONSE_CACHE_TIMEOUT)
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def data_validators(querysets):
+    """(ETag, Last-Modified) of the rows in querysets, from a single query"""
+    stats = [
+        queryset.order_by().annotate(source=db_models.Value(index)).values('source').annotate(
+            count=db_models.Count('pk'), latest=db_models.Max('updated_at'),
+        )
+        for index, queryset in enumerate(querysets)
+    ]
+    rows = {row['source']: row for row in stats[0].union(*stats[1:], all=True)}
+    state, last_modified = [], None
+    for index, queryset in enumerate(querysets):
+        count, latest = rows[index]['count'], rows[index]['latest']
+        state.append([queryset.model._meta.label_lower, count, latest.isoformat() if latest else None])
+        if latest and (last_modified is None or latest > last_modified):
+            last_modified = latest
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest(), last_modified
+
+
+def conditional_on(sources):
+    """
+    Answer conditional GETs of a view with 304 Not Modified while the rows it
+    reads are unchanged.
+
+    sources(request) returns the querysets the view reads; it may raise
+    ValueError for invalid parameters, in which case the view runs and reports
+    the error.
+    """
+    def validators(request):
+        if not hasattr(request, '_data_validators'):
+            request._data_validators = (None, None)
+            if request.method in ('GET', 'HEAD'):
+                try:
+                    request._data_validators = data_validators(sources(request))
+                except ValueError:
+                    pass
+        return request._data_validators
+
+    def decorator(view):
+        conditional_view = condition(etag_func=lambda request, *args, **kwargs: validators(request)[0])(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            last_modified = validators(request)[1]
+            if last_modified is not None and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+            # Let clients keep the body but always revalidate it
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,416 @@
+"""
+Streaming XLSX / CSV export engine.
+
+An export is described declaratively as a list of Sheet specs (columns,
+header/total formats and an optional summary block) paired with an iterable
+of row dicts - typically a generator over QuerySet.iterator(). Rows are
+written straight into an xlsxwriter workbook in constant_memory mode, which
+flushes every finished row to disk, so memory use does not grow with the
+number of rows. Column widths and totals are tracked while writing.
+
+The same specs can be streamed as plain CSV (optionally gzip-compressed)
+through a StreamingHttpResponse for machine consumers: rows go from the
+database cursor to the socket without being collected first.
+"""
+import csv
+import io
+import tempfile
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+
+from .analytics import add_feed_average, add_flock_columns, add_mortality, feed_totals_before, frame_records, siaf_frame
+from .headcount import FLOCKS
+from .models import EggOut, FeedStock
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows fetched per round trip when streaming a QuerySet into a sheet
+ITERATOR_CHUNK_SIZE = 2000
+
+# Bytes of CSV collected before a chunk is sent to the client
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Days of SIAF records held in one analytics frame
+SIAF_WINDOW_DAYS = 1830
+
+
+@dataclass
+class Column:
+    header: str
+    key: str
+    total: bool = False  # Sum this column into the totals row
+    width: Optional[float] = None  # Fixed width; auto-sized from the content when None
+    num_format: Optional[str] = None
+
+
+@dataclass
+class Sheet:
+    name: str
+    columns: list
+    header_format: dict = field(default_factory=lambda: {'bold': True})
+    totals_label: Optional[str] = None  # Label of the totals row (no totals row when None)
+    totals_format: dict = field(default_factory=lambda: {'bold': True})
+    # summary(stats) -> rows written after a blank row at the end of the sheet.
+    # A cell is either a plain value or a (value, format dict) tuple.
+    summary: Optional[Callable] = None
+
+
+class SheetStats:
+    """Running totals collected while a sheet is written"""
+
+    def __init__(self, columns):
+        self.rows = 0
+        self.totals = {column.key: 0 for column in columns if column.total}
+
+
+def _cell_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+class _Formats:
+    """Cache of xlsxwriter formats keyed by their properties"""
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.cache = {}
+
+    def get(self, properties):
+        if not properties:
+            return None
+        key = tuple(sorted(properties.items()))
+        if key not in self.cache:
+            self.cache[key] = self.workbook.add_format(properties)
+        return self.cache[key]
+
+
+def _write_sheet(workbook, formats, spec, rows, progress=None):
+    worksheet = workbook.add_worksheet(spec.name)
+    widths = [len(column.header) for column in spec.columns]
+    column_formats = [formats.get({'num_format': column.num_format} if column.num_format else None) for column in spec.columns]
+    stats = SheetStats(spec.columns)
+
+    def write_cell(row_index, col_index, value, cell_format=None):
+        value = _cell_value(value)
+        if value is None:
+            return
+        worksheet.write(row_index, col_index, value, cell_format)
+        widths[col_index] = max(widths[col_index], len(str(value)))
+
+    header_format = formats.get(spec.header_format)
+    for col_index, column in enumerate(spec.columns):
+        worksheet.write(0, col_index, column.header, header_format)
+
+    row_index = 0
+    for row in rows:
+        row_index += 1
+        for col_index, column in enumerate(spec.columns):
+            value = row.get(column.key)
+            write_cell(row_index, col_index, value, column_formats[col_index])
+            if column.total and isinstance(value, (int, float)):
+                stats.totals[column.key] += value
+        stats.rows = row_index
+        if progress is not None:
+            progress(row_index)
+
+    if spec.totals_label is not None:
+        # Blank row, then the totals row
+        row_index += 2
+        totals_format = formats.get(spec.totals_format)
+        write_cell(row_index, 0, spec.totals_label, totals_format)
+        for col_index, column in enumerate(spec.columns[1:], 1):
+            if column.total:
+                write_cell(row_index, col_index, stats.totals[column.key], totals_format)
+
+    if spec.summary is not None:
+        row_index += 1
+        for summary_row in spec.summary(stats):
+            row_index += 1
+            for col_index, cell in enumerate(summary_row):
+                value, cell_format = cell if isinstance(cell, tuple) else (cell, None)
+                write_cell(row_index, col_index, value, formats.get(cell_format))
+
+    for col_index, column in enumerate(spec.columns):
+        worksheet.set_column(col_index, col_index, column.width if column.width else widths[col_index] + 2)
+    return stats
+
+
+def write_workbook(target, sheets, progress=None, constant_memory=True):
+    """
+    Write [(Sheet, rows), ...] to target (a path or a binary file object).
+
+    progress, when given, is called with the number of rows written so far.
+    constant_memory=False keeps the whole workbook in memory (benchmark baseline).
+    """
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': constant_memory})
+    formats = _Formats(workbook)
+    written = 0
+    try:
+        for spec, rows in sheets:
+            sheet_progress = None
+            if progress is not None:
+                sheet_progress = lambda count, offset=written: progress(offset + count)
+            written += _write_sheet(workbook, formats, spec, rows, sheet_progress).rows
+    finally:
+        workbook.close()
+    return written
+
+
+def xlsx_response(filename, sheets):
+    """Build the workbook in a temporary file and stream it back as an attachment"""
+    output = tempfile.TemporaryFile()
+    write_workbook(output, sheets)
+    output.seek(0)
+    response = FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+    return response
+
+
+def csv_chunks(spec, rows):
+    """Encode the header and rows of one sheet as CSV, yielding bytes in chunks of about CSV_CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.header for column in spec.columns])
+    # Send the header straight away so the client sees the first byte immediately
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in rows:
+        writer.writerow([_cell_value(row.get(column.key)) for column in spec.columns])
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into a single gzip stream"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_response(filename, sheets, compress=False):
+    """
+    Stream the first sheet of an export as CSV (gzip-compressed when compress is set).
+
+    Totals rows and summary blocks are left out; only the header and data rows are sent.
+    """
+    spec, rows = sheets[0]
+    chunks = csv_chunks(spec, rows)
+    content_type = 'text/csv; charset=utf-8'
+    if compress:
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def wants_csv(request):
+    return request.GET.get('format') == 'csv'
+
+
+def export_response(request, name, sheets):
+    """
+    Respond with the export as name.xlsx, or stream it as name.csv when the
+    request asks for format=csv (add gzip=1 for name.csv.gz).
+    """
+    if wants_csv(request):
+        return csv_response(f'{name}.csv', sheets, compress=request.GET.get('gzip') == '1')
+    return xlsx_response(f'{name}.xlsx', sheets)
+
+
+# ===== Export definitions =====
+# Each returns the [(Sheet, rows), ...] list for write_workbook(); rows are
+# generated lazily, so nothing is read from the database until it is written.
+
+WHITE_ON_BLUE = {'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#4472C4'}
+
+SIAF_COLUMNS = [
+    Column('Date', 'date'),
+    Column('Feed Male Morning', 'feed_male_morning', total=True),
+    Column('Feed Male Evening', 'feed_male_evening', total=True),
+    Column('Feed Female Morning', 'feed_female_morning', total=True),
+    Column('Feed Female Evening', 'feed_female_evening', total=True),
+    Column('Total Feed', 'effective_feed_kg', total=True),
+    Column('Feed Avg', 'feed_average', total=True),
+    Column('Water Intake', 'water_intake', total=True),
+    Column('Tray Egg Morning', 'tray_egg_morning', total=True),
+    Column('Total Egg Morning', 'total_egg_morning', total=True),
+    Column('Damaged Egg Morning', 'damaged_egg_morning', total=True),
+    Column('Double Egg Morning', 'double_egg_morning', total=True),
+    Column('Tray Egg Evening', 'tray_egg_evening', total=True),
+    Column('Total Egg Evening', 'total_egg_evening', total=True),
+    Column('Damaged Egg Evening', 'damaged_egg_evening', total=True),
+    Column('Double Egg Evening', 'double_egg_evening', total=True),
+    Column('AI Status', 'artificial_insemination'),
+    Column('AI Hours', 'ai_hours', total=True),
+    Column('AI Birds Count', 'ai_birds_count', total=True),
+    Column('Fogger Status', 'fogger_used'),
+    Column('Fogger Hours', 'fogger_hours', total=True),
+    Column('Fan Status', 'fan_used'),
+    Column('Fan Hours', 'fan_hours', total=True),
+    Column('Light Status', 'light_used'),
+    Column('Light Hours', 'light_hours', total=True),
+    Column('Temp 1 (6AM)', 'temperature_1', total=True),
+    Column('Temp 2 (10AM)', 'temperature_2', total=True),
+    Column('Temp 3 (2PM)', 'temperature_3', total=True),
+    Column('Temp 4 (6PM)', 'temperature_4', total=True),
+    Column('Temp 5 (10PM)', 'temperature_5', total=True),
+    Column('Temp 6 (2AM)', 'temperature_6', total=True),
+    Column('Feed Per Bird (g)', 'feed_per_gram_per_bird', total=True),
+    Column('Egg %', 'egg_percentage'),
+    Column('Male Mortality', 'male_mortality', total=True),
+    Column('Female Mortality', 'female_mortality', total=True),
+    Column('Total Mortality', 'total_mortality', total=True),
+    Column('Medicine', 'medicine'),
+    Column('Notes', 'notes'),
+]
+
+SIAF_SHEET = Sheet(
+    'SIAF',
+    SIAF_COLUMNS,
+    header_format={'bold': True, 'bg_color': '#CCCCCC'},
+    totals_label='TOTAL',
+    totals_format={'bold': True, 'bg_color': '#E6E6E6'},
+)
+
+# Columns of a sheet row
+SIAF_ROW_FIELDS = [column.key for column in SIAF_COLUMNS]
+
+
+def siaf_rows(start_date, end_date):
+    """SIAF report rows with the running feed average, feed per bird, egg % and mortality"""
+    # Feed average = total feed used up to a date / number of days with feed data up to that date.
+    # Start the running totals from everything recorded before the range.
+    feed_used, days_with_feed = feed_totals_before(start_date)
+
+    # Walk the range window by window so the frame stays a fixed size
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=SIAF_WINDOW_DAYS - 1))
+        frame = add_mortality(add_flock_columns(siaf_frame(window_start, window_end, notes=True)))
+        feed_used, days_with_feed = add_feed_average(frame, feed_used, days_with_feed)
+        yield from frame_records(frame, SIAF_ROW_FIELDS)
+        window_start = window_end + timedelta(days=1)
+
+
+def siaf_export(start_date, end_date):
+    return [(SIAF_SHEET, siaf_rows(start_date, end_date))]
+
+
+FEED_STOCK_COLUMNS = [
+    Column('Date', 'date', width=15),
+    Column('Weight (KG)', 'kg', total=True, width=15),
+    Column('Bundles', 'bundles', total=True, width=15),
+    Column('Notes', 'notes', width=30),
+]
+
+
+def feed_stock_export(start_date, end_date):
+    records = FeedStock.objects.filter(date__range=[start_date, end_date]).order_by('date')
+
+    def rows():
+        for row in records.values('date', 'kg', 'bundles', 'notes').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            row['kg'] = round(row['kg'], 2)
+            row['bundles'] = round(row['bundles'], 2)
+            row['notes'] = row['notes'] or ''
+            yield row
+
+    def summary(stats):
+        total_kg = stats.totals['kg']
+        days = records.values('date').distinct().count()
+        bold = {'bold': True}
+        return [
+            [('SUMMARY', {'bold': True, 'font_size': 12})],
+            [('Total KG:', bold), total_kg],
+            [('Total Bundles:', bold), stats.totals['bundles']],
+            [('Number of Entries:', bold), stats.rows],
+            [('Average per Day:', bold), round(total_kg / max(days, 1), 2) if stats.rows else 0],
+            [('Date Range:', bold), f"{start_date} to {end_date}"],
+        ]
+
+    sheet = Sheet('Feed Stock Report', FEED_STOCK_COLUMNS, header_format=WHITE_ON_BLUE, summary=summary)
+    return [(sheet, rows())]
+
+
+MORTALITY_COLUMNS = [
+    Column('Date', 'date', width=15),
+    Column('Mortality Count', 'mortality_count', total=True, width=15),
+    Column('Mortality Reason', 'mortality_reason', width=30),
+]
+
+BATCH_HISTORY_COLUMNS = [
+    Column('Start Date', 'batch_start_date', width=15),
+    Column('End Date', 'batch_end_date', width=15),
+    Column('Initial Birds', 'initial_birds', width=15),
+    Column('Status', 'status', width=12),
+    Column('Total Mortality', 'total_mortality', width=15),
+    Column('Current Birds', 'current_birds', width=15),
+    Column('Notes', 'notes', width=25),
+]
+
+
+def flock_export(sex, start_date, end_date):
+    """Mortality Report and Batch History sheets for the 'male' or 'female' flock"""
+    stock_model, mortality_model = next((stock, mortality) for name, stock, mortality in FLOCKS if name == sex)
+
+    def mortality_rows():
+        records = mortality_model.objects.filter(date__range=[start_date, end_date]).order_by('date')
+        for row in records.values('date', 'mortality_count', 'mortality_reason').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            row['mortality_reason'] = row['mortality_reason'] or ''
+            yield row
+
+    def batch_rows():
+        for batch in stock_model.objects.with_stats().order_by('-batch_start_date').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            yield {
+                'batch_start_date': batch.batch_start_date or '',
+                'batch_end_date': batch.batch_end_date or '',
+                'initial_birds': batch.initial_birds,
+                'status': batch.status,
+                'total_mortality': batch.get_current_mortality(),
+                'current_birds': batch.get_current_birds(),
+                'notes': batch.notes or '',
+            }
+
+    mortality_sheet = Sheet(
+        'Mortality Report',
+        MORTALITY_COLUMNS,
+        header_format=WHITE_ON_BLUE,
+        summary=lambda stats: [['Summary'], ['Total Mortality:', stats.totals['mortality_count']]],
+    )
+    batch_sheet = Sheet('Batch History', BATCH_HISTORY_COLUMNS, header_format=WHITE_ON_BLUE)
+    return [(mortality_sheet, mortality_rows()), (batch_sheet, batch_rows())]
+
+
+EGG_OUT_COLUMNS = [
+    Column('Date', 'date', width=15),
+    Column('Egg Out Count', 'egg_out_count', width=18),
+    Column('Notes', 'notes', width=30),
+]
+
+
+def egg_out_export(start_date=None, end_date=None):
+    query = EggOut.objects.all()
+    if start_date:
+        query = query.filter(date__gte=start_date)
+    if end_date:
+        query = query.filter(date__lte=end_date)
+    rows = query.order_by('-date').values('date', 'egg_out_count', 'notes').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    sheet = Sheet('Egg Out Report', EGG_OUT_COLUMNS, header_format={'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#366092'})
+    return [(sheet, rows)]
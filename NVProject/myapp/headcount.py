@@ -0,0 +1,129 @@
+"""
+As-of-date flock headcount.
+
+A batch is alive on a date when it started on or before that date and had not
+ended before it. Its headcount on that date is initial_birds minus the
+mortality recorded for the batch up to and including the date. A batch
+without a start date is not counted, as in BatchQuerySet.with_stats().
+
+headcount_on() answers this for one date with one grouped query per sex;
+flock_series() and headcount_series() answer it for every day of a range
+with two queries per sex (batches + cumulative mortality per batch and day),
+whatever the length of the range.
+"""
+from datetime import timedelta
+
+from django.db import models
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import FemaleBirdsMortality, FemaleBirdsStock, MaleBirdsMortality, MaleBirdsStock
+
+FLOCKS = (
+    ('male', MaleBirdsStock, MaleBirdsMortality),
+    ('female', FemaleBirdsStock, FemaleBirdsMortality),
+)
+
+
+def _batches_alive_between(stock_model, start_date, end_date):
+    """Started batches whose start/end interval overlaps [start_date, end_date]"""
+    return stock_model.objects.filter(
+        models.Q(batch_end_date__isnull=True) | models.Q(batch_end_date__gte=start_date),
+        batch_start_date__lte=end_date,
+    )
+
+
+def headcount_on(date):
+    """
+    Birds alive at the end of date.
+
+    Returns {'male': {...}, 'female': {...}} where each entry has 'alive' and
+    'mortality' totals over the batches alive on that date and 'batches', a
+    {batch_id: alive} mapping.
+    """
+    result = {}
+    for sex, stock_model, _ in FLOCKS:
+        batches = _batches_alive_between(stock_model, date, date).annotate(
+            mortality_to_date=Coalesce(
+                models.Sum('mortality_records__mortality_count', filter=models.Q(mortality_records__date__lte=date)),
+                0,
+            )
+        ).values_list('id', 'initial_birds', 'mortality_to_date')
+
+        alive_by_batch = {}
+        total_mortality = 0
+        for batch_id, initial_birds, mortality in batches:
+            alive_by_batch[batch_id] = max(0, initial_birds - mortality)
+            total_mortality += mortality
+        result[sex] = {
+            'alive': sum(alive_by_batch.values()),
+            'mortality': total_mortality,
+            'batches': alive_by_batch,
+        }
+    return result
+
+
+def flock_series(start_date, end_date):
+    """
+    Birds alive and cumulative mortality at the end of every day in [start_date, end_date].
+
+    Returns {date: {'male': {'alive', 'mortality'}, 'female': {...}}} with an
+    entry for each day; each value matches headcount_on() for that date.
+    """
+    days = (end_date - start_date).days + 1
+    series = {
+        start_date + timedelta(days=offset): {sex: {'alive': 0, 'mortality': 0} for sex, _, _ in FLOCKS}
+        for offset in range(max(days, 0))
+    }
+    if not series:
+        return series
+
+    for sex, stock_model, mortality_model in FLOCKS:
+        batches = list(
+            _batches_alive_between(stock_model, start_date, end_date)
+            .values_list('id', 'initial_birds', 'batch_start_date', 'batch_end_date')
+        )
+        if not batches:
+            continue
+
+        # Mortality per batch and day within the range, in date order. Everything
+        # recorded before the range is folded into its first day, so the rows read
+        # depend on the length of the range, not on the length of the history.
+        daily_mortality = {}
+        for batch_id, date, count in (
+            mortality_model.objects.filter(batch_id__in=[batch[0] for batch in batches], date__lte=end_date)
+            .values('batch_id', day=Greatest('date', models.Value(start_date, output_field=models.DateField())))
+            .annotate(count=models.Sum('mortality_count'))
+            .order_by('batch_id', 'day')
+            .values_list('batch_id', 'day', 'count')
+        ):
+            daily_mortality.setdefault(batch_id, []).append((date, count or 0))
+
+        # Sweep each batch's interval, advancing its cumulative mortality day by day
+        for batch_id, initial_birds, batch_start, batch_end in batches:
+            first_day = max(start_date, batch_start)
+            last_day = min(end_date, batch_end) if batch_end else end_date
+            events = daily_mortality.get(batch_id, [])
+            position = 0
+            cumulative = 0
+            day = first_day
+            while day <= last_day:
+                while position < len(events) and events[position][0] <= day:
+                    cumulative += events[position][1]
+                    position += 1
+                flock = series[day][sex]
+                flock['alive'] += max(0, initial_birds - cumulative)
+                flock['mortality'] += cumulative
+                day += timedelta(days=1)
+    return series
+
+
+def headcount_series(start_date, end_date):
+    """
+    Birds alive at the end of every day in [start_date, end_date].
+
+    Returns {date: {'male': alive, 'female': alive}} with an entry for each day.
+    """
+    return {
+        day: {sex: flock['alive'] for sex, flock in flocks.items()}
+        for day, flocks in flock_series(start_date, end_date).items()
+    }
@@ -0,0 +1,141 @@
+"""
+Import of historical records from CSV or Excel files.
+
+A file holds records of one type of myapp.bulk.RECORD_TYPES, one per row,
+with a header row naming the fields (case and spaces do not matter; other
+columns are ignored and reported). read_chunks() reads it IMPORT_CHUNK_SIZE
+rows at a time: pandas chunksize for CSV, openpyxl read-only mode for XLSX.
+
+import_file() checks every chunk with check_frame() and upserts its valid rows
+by natural key in one transaction per chunk, so memory stays flat and a
+re-run after a failure updates rather than duplicates. Invalid rows are
+skipped and reported with their row number in the file. The feed ledger and
+daily summary are refreshed once, after the last chunk.
+"""
+import time
+
+import openpyxl
+import pandas as pd
+from django.db import models, transaction
+
+from .bulk import RECORD_TYPES, check_frame, write_frame
+from .signals import deferred_refresh
+
+IMPORT_CHUNK_SIZE = 1000
+
+# Invalid rows listed in the result; the rest are only counted
+MAX_REPORTED_ERRORS = 200
+
+
+class ImportFileError(ValueError):
+    """File that cannot be imported at all"""
+
+
+def _column_name(header):
+    return '' if header is None else str(header).strip().lower().replace(' ', '_')
+
+
+def _csv_chunks(file, chunk_size):
+    chunks = pd.read_csv(
+        file, chunksize=chunk_size, dtype=str, keep_default_na=False, encoding='utf-8-sig', skipinitialspace=True,
+    )
+    for chunk in chunks:
+        chunk.columns = [_column_name(name) for name in chunk.columns]
+        # Row numbers as in the file, the header being row 1
+        chunk.index = chunk.index + 2
+        yield chunk.astype(object)
+
+
+def _xlsx_chunks(file, chunk_size):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [_column_name(name) for name in header]
+        buffer, numbers = [], []
+        for number, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            buffer.append((tuple(row) + (None,) * len(names))[:len(names)])
+            numbers.append(number)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=names, index=numbers, dtype=object)
+                buffer, numbers = [], []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=names, index=numbers, dtype=object)
+    finally:
+        workbook.close()
+
+
+def read_chunks(file, filename, chunk_size=None):
+    """DataFrames of up to chunk_size rows of a .csv or .xlsx file, indexed by row number"""
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    if filename.lower().endswith('.csv'):
+        return _csv_chunks(file, chunk_size)
+    if filename.lower().endswith('.xlsx'):
+        return _xlsx_chunks(file, chunk_size)
+    raise ImportFileError('Only .csv and .xlsx files can be imported')
+
+
+def _usable_columns(record_type, columns):
+    """(columns mapped to fields, ignored columns); raises ImportFileError when a key column is missing"""
+    names = record_type.names - {'type'}
+    missing = [
+        name for name in record_type.key
+        if name not in columns and record_type.model._meta.get_field(name).attname not in columns
+    ]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    return [name for name in columns if name in names], [name for name in columns if name and name not in names]
+
+
+def import_file(file, filename, type_name, chunk_size=None):
+    """
+    Import the records of type_name in a CSV/XLSX file; returns a summary:
+    rows read, created, updated, failed, the first MAX_REPORTED_ERRORS
+    {'row', 'errors'}, the ignored columns, seconds and rows_per_second.
+    """
+    if type_name not in RECORD_TYPES:
+        raise ImportFileError(f"Type must be one of {', '.join(RECORD_TYPES)}")
+    record_type = RECORD_TYPES[type_name]
+    text_fields = [
+        field.attname for field in record_type.fields if isinstance(field, (models.CharField, models.TextField))
+    ]
+
+    summary = {'type': type_name, 'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': [], 'ignored_columns': []}
+    started = time.perf_counter()
+    columns = None
+    with deferred_refresh():
+        for chunk in read_chunks(file, filename, chunk_size):
+            if columns is None:
+                columns, summary['ignored_columns'] = _usable_columns(record_type, list(chunk.columns))
+            chunk = chunk[columns].copy()
+            chunk = chunk.where(chunk.notna(), None)
+            # Spreadsheets turn codes and notes into numbers
+            for name in text_fields:
+                if name in chunk:
+                    chunk[name] = chunk[name].map(lambda value: value if value is None or isinstance(value, str) else str(value))
+
+            errors = {index: [] for index in chunk.index}
+            checked = check_frame(record_type, chunk, errors)
+            valid = [index for index in chunk.index if not errors[index]]
+            with transaction.atomic():
+                written = write_frame(record_type, checked, valid)
+
+            summary['rows'] += len(chunk)
+            for status, _ in written:
+                summary[status] += 1
+            for index in chunk.index:
+                if errors[index]:
+                    summary['failed'] += 1
+                    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                        summary['errors'].append({'row': int(index), 'errors': errors[index]})
+
+    if columns is None:
+        raise ImportFileError('The file has no rows')
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = round(elapsed, 2)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed) if elapsed else summary['rows']
+    return summary
@@ -0,0 +1,310 @@
+"""
+Background export jobs.
+
+submit_export() turns an export request into an ExportJob and hands it to a
+local worker, so building a large workbook or backup never ties up a web
+worker. Two runners are supported (settings.EXPORT_JOB_RUNNER):
+
+- 'thread': an in-process thread pool started lazily by the web process.
+- 'command': jobs wait in the database until `manage.py run_export_jobs`
+  picks them up, for deployments that prefer a separate worker process.
+
+Identical requests (same kind and parameters) share a key. While a job for a
+key is pending or running, new submissions return that job (a partial unique
+constraint keeps concurrent submissions from queuing two). A finished file
+is reused until the fingerprint of the tables it was built from (row count
+and latest updated_at of each) changes.
+
+A running job reports its progress at least every HEARTBEAT_EVERY, so only
+a job whose worker died goes stale; a job failed as stale is never turned
+back into a finished one.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .backup import BACKUP_MODELS, write_backup
+from .exports import XLSX_CONTENT_TYPE, egg_out_export, feed_stock_export, flock_export, siaf_export, write_workbook
+from .models import (
+    DailyRecordSIAF, EggOut, ExportJob, FeedStock, FemaleBirdsMortality, FemaleBirdsStock,
+    MaleBirdsMortality, MaleBirdsStock,
+)
+from .snapshot import write_snapshot
+
+# Persist rows_written every this many rows, and at least this often while a job runs
+PROGRESS_EVERY = 1000
+HEARTBEAT_EVERY = timedelta(minutes=1)
+
+# A pending/running job not updated for this long is treated as abandoned by its worker
+STALE_AFTER = timedelta(minutes=15)
+
+
+@dataclass
+class ExportKind:
+    filename: str  # May use {start_date} and {end_date}
+    sources: tuple  # Models the export reads; their fingerprint decides when a cached file is stale
+    build: Callable  # build(path, params, progress) -> rows written
+    content_type: str = XLSX_CONTENT_TYPE
+    range_required: bool = True
+
+
+def _workbook_builder(export):
+    def build(path, params, progress):
+        start_date, end_date = (
+            date.fromisoformat(params[name]) if params.get(name) else None for name in ('start_date', 'end_date')
+        )
+        return write_workbook(path, export(start_date, end_date), progress=progress)
+    return build
+
+
+def _build_backup(path, params, progress):
+    with open(path, 'w') as output:
+        return write_backup(output, progress=progress)
+
+
+def _build_snapshot(path, params, progress):
+    return write_snapshot(path, progress=progress)
+
+
+def _flock_builder(sex):
+    return _workbook_builder(lambda start_date, end_date: flock_export(sex, start_date, end_date))
+
+
+EXPORTS = {
+    'siaf': ExportKind(
+        'siaf_report_{start_date}_to_{end_date}.xlsx',
+        (DailyRecordSIAF, MaleBirdsStock, MaleBirdsMortality, FemaleBirdsStock, FemaleBirdsMortality),
+        _workbook_builder(siaf_export),
+    ),
+    'feed_stock': ExportKind(
+        'Feed_Stock_Report_{start_date}_to_{end_date}.xlsx',
+        (FeedStock,),
+        _workbook_builder(feed_stock_export),
+    ),
+    'male_birds': ExportKind(
+        'male_birds_report_{start_date}_{end_date}.xlsx',
+        (MaleBirdsStock, MaleBirdsMortality),
+        _flock_builder('male'),
+    ),
+    'female_birds': ExportKind(
+        'female_birds_report_{start_date}_{end_date}.xlsx',
+        (FemaleBirdsStock, FemaleBirdsMortality),
+        _flock_builder('female'),
+    ),
+    'egg_out': ExportKind(
+        'egg_out_report.xlsx',
+        (EggOut,),
+        _workbook_builder(egg_out_export),
+        range_required=False,
+    ),
+    'backup': ExportKind(
+        'nv_poultry_backup.json',
+        tuple(model for _, model in BACKUP_MODELS),
+        _build_backup,
+        content_type='application/json',
+        range_required=False,
+    ),
+    'snapshot': ExportKind(
+        'nv_poultry_snapshot.npz',
+        tuple(model for _, model in BACKUP_MODELS),
+        _build_snapshot,
+        content_type='application/octet-stream',
+        range_required=False,
+    ),
+}
+
+
+def parse_params(kind, data):
+    """
+    Validate the request parameters of an export kind.
+
+    Returns the normalized {'start_date': 'YYYY-MM-DD', 'end_date': ...} params
+    (only the dates that were given); raises ValueError when they are invalid.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f'Unknown export type: {kind}')
+    params = {}
+    for name in ('start_date', 'end_date'):
+        value = data.get(name)
+        if value:
+            params[name] = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+        elif EXPORTS[kind].range_required:
+            raise ValueError('Start date and end date are required')
+    return params
+
+
+def job_key(kind, params):
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+def data_fingerprint(kind):
+    """Hash of the row count and latest updated_at of every table the export reads"""
+    state = []
+    for model in EXPORTS[kind].sources:
+        stats = model.objects.aggregate(count=models.Count('id'), latest=models.Max('updated_at'))
+        state.append([model.__name__, stats['count'], stats['latest'].isoformat() if stats['latest'] else None])
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+
+def _artifact_exists(job):
+    return bool(job.file_path) and os.path.exists(job.file_path)
+
+
+def submit_export(kind, params, user=None):
+    """
+    Return (job, created) for an export request.
+
+    An in-flight job for the same request, or a finished one whose data has not
+    changed since, is returned as is; otherwise a new job is queued.
+    """
+    key = job_key(kind, params)
+    fingerprint = data_fingerprint(kind)
+    fail_stale_jobs()
+
+    with transaction.atomic():
+        existing = ExportJob.objects.filter(key=key).exclude(status='failed').order_by('-created_at').first()
+        if existing is not None:
+            if existing.status in ('pending', 'running'):
+                return existing, False
+            if existing.fingerprint == fingerprint and _artifact_exists(existing):
+                return existing, False
+
+        try:
+            with transaction.atomic():
+                job = ExportJob.objects.create(
+                    kind=kind,
+                    params=params,
+                    key=key,
+                    fingerprint=fingerprint,
+                    filename=EXPORTS[kind].filename.format(
+                        start_date=params.get('start_date', 'N/A'),
+                        end_date=params.get('end_date', 'N/A'),
+                    ),
+                    requested_by=user if user is not None and user.is_authenticated else None,
+                )
+        except IntegrityError:
+            # A concurrent request queued the same export first
+            active = ExportJob.objects.filter(key=key, status__in=('pending', 'running')).first()
+            if active is None:
+                raise
+            return active, False
+        if settings.EXPORT_JOB_RUNNER == 'thread':
+            transaction.on_commit(lambda: _get_executor().submit(run_job, job.id))
+    return job, True
+
+
+def run_job(job_id):
+    """Build the file of a pending job; does nothing if another worker already claimed it"""
+    try:
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=now, updated_at=now,
+        )
+        if not claimed:
+            return
+        job = ExportJob.objects.get(pk=job_id)
+        kind = EXPORTS[job.kind]
+
+        reported = {'rows': 0, 'at': time.monotonic()}
+
+        def progress(rows):
+            # Also a heartbeat: a job not updated for STALE_AFTER is failed as abandoned
+            if rows - reported['rows'] < PROGRESS_EVERY and time.monotonic() - reported['at'] < HEARTBEAT_EVERY.total_seconds():
+                return
+            reported.update(rows=rows, at=time.monotonic())
+            ExportJob.objects.filter(pk=job_id, status='running').update(rows_written=rows, updated_at=timezone.now())
+
+        os.makedirs(settings.EXPORT_JOBS_DIR, exist_ok=True)
+        extension = os.path.splitext(job.filename)[1]
+        path = os.path.join(settings.EXPORT_JOBS_DIR, f'{job.id}{extension}')
+        partial_path = os.path.join(settings.EXPORT_JOBS_DIR, f'{job.id}.part{extension}')
+        try:
+            # Data may change while the file is built: record the fingerprint from before the reads
+            fingerprint = data_fingerprint(job.kind)
+            rows = kind.build(partial_path, job.params, progress)
+            os.replace(partial_path, path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            ExportJob.objects.filter(pk=job_id, status='running').update(
+                status='failed', error=str(e), finished_at=timezone.now(), updated_at=timezone.now(),
+            )
+            return
+
+        finished = ExportJob.objects.filter(pk=job_id, status='running').update(
+            status='done', rows_written=rows, file_path=path, fingerprint=fingerprint,
+            finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if not finished:
+            # Failed as stale meanwhile; a new submission builds a fresh file
+            os.remove(path)
+            return
+        _discard_older_artifacts(job)
+    finally:
+        # Worker threads own their database connections
+        connections.close_all()
+
+
+def _discard_older_artifacts(job):
+    """Remove files and rows of earlier finished jobs for the same request"""
+    older = ExportJob.objects.filter(key=job.key, created_at__lt=job.created_at).exclude(status__in=('pending', 'running'))
+    for old_job in older:
+        if _artifact_exists(old_job):
+            os.remove(old_job.file_path)
+    older.delete()
+
+
+def fail_stale_jobs():
+    """Mark jobs whose worker stopped updating them as failed"""
+    return ExportJob.objects.filter(
+        status__in=('pending', 'running'),
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='failed', error='Export was not completed by a worker', finished_at=timezone.now())
+
+
+def run_pending_jobs():
+    """Run every pending job in this process, oldest first; returns how many were run"""
+    count = 0
+    for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+        run_job(job_id)
+        count += 1
+    return count
+
+
+def job_status(job):
+    """JSON-serializable state of a job for the status endpoint"""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'rows_written': job.rows_written,
+        'filename': job.filename,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': reverse('export_job_download', args=[job.id]) if job.status == 'done' else None,
+    }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export-job')
+        return _executor
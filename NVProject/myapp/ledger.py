@@ -0,0 +1,76 @@
+"""
+Feed inventory ledger.
+
+FeedLedger keeps one row per day that had feed received (FeedStock) or feed
+used (DailyRecordSIAF), together with the running totals up to that day, so
+the closing stock for any date is a single row lookup instead of a scan over
+the whole feed history.
+
+Every write that changes feed received or used must call
+refresh_feed_ledger() with the earliest date it touched; rows on and after
+that date are recomputed from the row just before it.
+"""
+from django.db import models, transaction
+
+from .models import DailyRecordSIAF, FeedLedger, FeedStock
+
+
+def refresh_feed_ledger(from_date=None):
+    """Recompute ledger rows on and after from_date (the whole ledger when None)"""
+    with transaction.atomic():
+        stock = FeedStock.objects.all()
+        records = DailyRecordSIAF.objects.all()
+        ledger = FeedLedger.objects.all()
+        previous = None
+        if from_date is not None:
+            stock = stock.filter(date__gte=from_date)
+            records = records.filter(date__gte=from_date)
+            ledger = ledger.filter(date__gte=from_date)
+            previous = FeedLedger.objects.filter(date__lt=from_date).order_by('-date').first()
+
+        received = {
+            row['date']: (row['kg'] or 0, row['bundles'] or 0)
+            for row in stock.values('date').annotate(kg=models.Sum('kg'), bundles=models.Sum('bundles'))
+        }
+        used = {
+            row['date']: row['kg'] or 0
+            for row in records.values('date').annotate(kg=models.Sum('effective_feed_kg'))
+        }
+
+        cumulative_received = previous.cumulative_received_kg if previous else 0
+        cumulative_used = previous.cumulative_used_kg if previous else 0
+        rows = []
+        for date in sorted(set(received) | set(used)):
+            received_kg, received_bundles = received.get(date, (0, 0))
+            used_kg = used.get(date, 0)
+            cumulative_received += received_kg
+            cumulative_used += used_kg
+            closing_kg = cumulative_received - cumulative_used
+            rows.append(FeedLedger(
+                date=date,
+                received_kg=received_kg,
+                received_bundles=received_bundles,
+                used_kg=used_kg,
+                used_bundles=round(used_kg / 60, 2),
+                cumulative_received_kg=cumulative_received,
+                cumulative_used_kg=cumulative_used,
+                closing_kg=closing_kg,
+                closing_bundles=round(closing_kg / 60, 2),
+            ))
+
+        ledger.delete()
+        FeedLedger.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def ledger_on(date):
+    """Latest ledger row on or before date, or None when no feed was moved yet"""
+    return FeedLedger.objects.filter(date__lte=date).order_by('-date').first()
+
+
+def closing_stock_on(date):
+    """Return (total received kg, total used kg, closing kg) as of the end of date"""
+    entry = ledger_on(date)
+    if entry is None:
+        return 0, 0, 0
+    return entry.cumulative_received_kg, entry.cumulative_used_kg, entry.closing_kg
@@ -0,0 +1,328 @@
+import json
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.utils import timezone
+
+from myapp.analytics import SIAF_FEED_FIELDS, siaf_fields, siaf_frame
+from myapp.backup import BACKUP_MODELS, RowParser, data_rows, merge_backup, read_backup, restore_backup, write_backup
+from myapp.bulk import save_records
+from myapp.exports import SIAF_ROW_FIELDS, siaf_export, siaf_rows, write_workbook
+from myapp.headcount import FLOCKS, headcount_series
+from myapp.imports import import_file
+from myapp.signals import deferred_refresh
+from myapp.snapshot import restore_snapshot, write_snapshot
+from myapp.models import DailyRecordSIAF, FemaleBirdsMortality, FemaleBirdsStock, MaleBirdsMortality, MaleBirdsStock
+
+
+def seed_records(days):
+    """Fill the (test) database with `days` consecutive days of farm data ending today"""
+    DailyRecordSIAF.objects.all().delete()
+    MaleBirdsStock.objects.all().delete()
+    FemaleBirdsStock.objects.all().delete()
+
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    male_batch = MaleBirdsStock.objects.create(initial_birds=10 * days, batch_start_date=start_date)
+    female_batch = FemaleBirdsStock.objects.create(initial_birds=100 * days, batch_start_date=start_date)
+
+    records, male_mortality, female_mortality = [], [], []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        records.append(DailyRecordSIAF(
+            date=day,
+            feed_male_morning=10 + offset % 5, feed_male_evening=10,
+            feed_female_morning=100 + offset % 7, feed_female_evening=100,
+            water_intake=500, tray_egg_morning=20, total_egg_morning=600 + offset % 30,
+            damaged_egg_morning=2, double_egg_morning=1,
+            tray_egg_evening=15, total_egg_evening=450, damaged_egg_evening=1, double_egg_evening=0,
+            temperature_1=28, temperature_2=30, temperature_3=33,
+            temperature_4=31, temperature_5=29, temperature_6=27,
+            medicine='Vitamin', notes=f'Synthetic record {offset}',
+        ))
+        male_mortality.append(MaleBirdsMortality(batch=male_batch, date=day, mortality_count=offset % 2))
+        female_mortality.append(FemaleBirdsMortality(batch=female_batch, date=day, mortality_count=offset % 3))
+    DailyRecordSIAF.objects.bulk_create(records, batch_size=1000)
+    MaleBirdsMortality.objects.bulk_create(male_mortality, batch_size=1000)
+    FemaleBirdsMortality.objects.bulk_create(female_mortality, batch_size=1000)
+    return start_date, end_date
+
+
+def measure(func, *args, **kwargs):
+    """Run func and return (result, seconds, peak traced memory in MB)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def benchmark_exports(command, rows, scale):
+    """SIAF report export at 1x and `scale`x rows, streaming vs in-memory workbook"""
+    for days in (rows, rows * scale):
+        start_date, end_date = seed_records(days)
+        for constant_memory in (True, False):
+            with tempfile.TemporaryFile() as output:
+                written, elapsed, peak = measure(
+                    write_workbook, output, siaf_export(start_date, end_date), constant_memory=constant_memory,
+                )
+                size = output.tell() / (1024 * 1024)
+            mode = 'constant_memory' if constant_memory else 'in-memory'
+            command.stdout.write(
+                f'{days:>8} rows  {mode:<16} {elapsed:7.2f}s  peak {peak:8.2f} MB  file {size:6.2f} MB  ({written} rows written)'
+            )
+
+
+def loop_siaf_rows(start_date, end_date):
+    """The SIAF report rows built record by record in Python (baseline for the analytics benchmark)"""
+    has_feed = models.Q()
+    for field_name in SIAF_FEED_FIELDS:
+        has_feed |= models.Q(**{f'{field_name}__isnull': False})
+    before_range = DailyRecordSIAF.objects.filter(date__lt=start_date).aggregate(
+        feed_used=models.Sum('effective_feed_kg'), days_with_feed=models.Count('id', filter=has_feed),
+    )
+    total_feed_used_to_date = before_range['feed_used'] or 0
+    records_with_feed = before_range['days_with_feed']
+    headcount = headcount_series(start_date, end_date)
+    mortality = {
+        sex: dict(
+            mortality_model.objects.filter(date__range=[start_date, end_date])
+            .values('date').annotate(total=models.Sum('mortality_count')).values_list('date', 'total')
+        )
+        for sex, _, mortality_model in FLOCKS
+    }
+    records = DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]).order_by('date')
+    for row in records.values(*siaf_fields(notes=True)):
+        total_feed_used_to_date += row['effective_feed_kg']
+        if any(row[field_name] is not None for field_name in SIAF_FEED_FIELDS):
+            records_with_feed += 1
+        row['feed_average'] = round(total_feed_used_to_date / records_with_feed, 2) if records_with_feed > 0 else 0
+        male_birds = headcount[row['date']]['male']
+        female_birds = headcount[row['date']]['female']
+        total_birds = male_birds + female_birds
+        row['feed_per_gram_per_bird'] = round(row['effective_feed_kg'] * 1000 / total_birds, 2) if total_birds > 0 else 0
+        row['egg_percentage'] = round(row['total_eggs'] / female_birds * 100, 2) if female_birds > 0 else 0
+        row['male_mortality'] = mortality['male'].get(row['date'], 0)
+        row['female_mortality'] = mortality['female'].get(row['date'], 0)
+        row['total_mortality'] = row['male_mortality'] + row['female_mortality']
+        yield {key: row[key] for key in SIAF_ROW_FIELDS}
+
+
+def benchmark_analytics(command, rows, scale):
+    """SIAF report rows: per-record Python loop vs the analytics frame, and the frame's memory per year"""
+    for days in (rows, rows * scale):
+        start_date, end_date = seed_records(days)
+        for name, build in (('loop', loop_siaf_rows), ('frame', siaf_rows)):
+            result, elapsed, peak = measure(lambda: list(build(start_date, end_date)))
+            command.stdout.write(f'{days:>8} rows  {name:<6} {elapsed:7.2f}s  peak {peak:8.2f} MB  ({len(result)} rows)')
+        # Raw records only, with and without the compact dtypes
+        year = siaf_frame(end_date - timedelta(days=364), end_date)
+        compact = year.memory_usage(deep=True).sum() / 1024
+        wide = year.astype({name: 'float64' for name in year.select_dtypes('float32').columns}).astype(
+            {name: object for name in year.select_dtypes('category').columns}
+        ).memory_usage(deep=True).sum() / 1024
+        command.stdout.write(f'{days:>8} rows  frame of one year: {compact:8.1f} KB compact, {wide:8.1f} KB float64/object')
+
+
+def save_restore(path):
+    """Load the whole file and restore row by row with save(), no transaction (baseline for the restore benchmark)"""
+    with open(path) as backup_file:
+        data = json.load(backup_file)
+    parser = RowParser()
+    with deferred_refresh():
+        for _, model in reversed(BACKUP_MODELS):
+            model.objects.all().delete()
+        for name, row in data_rows(data):
+            instance = parser.parse(name, row)
+            if instance is not None:
+                instance.save(force_insert=True)
+
+
+def stream_restore(path):
+    with open(path, 'rb') as backup_file:
+        return restore_backup(lambda: read_backup(backup_file))
+
+
+def stream_merge(path):
+    with open(path, 'rb') as backup_file:
+        return merge_backup(lambda: read_backup(backup_file))
+
+
+def benchmark_restore(command, rows, scale):
+    """Backup restore throughput and memory: whole file + per-row save() vs streamed bulk insert in one transaction"""
+    for days in (rows, rows * scale):
+        seed_records(days)
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as output:
+            total = write_backup(output)
+            output.flush()
+            for name, restore in (('save', save_restore), ('bulk', stream_restore)):
+                _, elapsed, peak = measure(restore, output.name)
+                command.stdout.write(
+                    f'{days:>8} days  {name:<5} {total:>7} rows  {elapsed:7.2f}s  {total / elapsed:9.0f} rows/s  peak {peak:8.2f} MB'
+                )
+
+
+def dump_backup(output):
+    """The whole backup built in memory and dumped at once (baseline for the backup benchmark)"""
+    data = {name: list(model.objects.values()) for name, model in BACKUP_MODELS}
+    output.write(json.dumps(data, indent=2, default=str))
+
+
+def benchmark_backup(command, rows, scale):
+    """Backup export memory: in-memory dump vs streamed chunks"""
+    for days in (rows, rows * scale):
+        seed_records(days)
+        for name, write in (('dump', dump_backup), ('stream', write_backup)):
+            with tempfile.TemporaryFile('w') as output:
+                _, elapsed, peak = measure(write, output)
+                size = output.tell() / (1024 * 1024)
+            command.stdout.write(f'{days:>8} days  {name:<6} {elapsed:7.2f}s  peak {peak:8.2f} MB  file {size:6.2f} MB')
+
+
+def benchmark_incremental(command, rows, scale):
+    """Backup size and restore time after one day of changes: full backup + restore vs changes + merge"""
+    for days in (rows, rows * scale):
+        seed_records(days)
+        watermark = timezone.now()
+        # One day's work: a new record, an edited one and a deleted one
+        records = DailyRecordSIAF.objects.order_by('-date')
+        latest = records.first()
+        DailyRecordSIAF.objects.create(date=latest.date + timedelta(days=1), feed_female_morning=100)
+        latest.water_intake = 450
+        latest.save()
+        records.last().delete()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as full, tempfile.NamedTemporaryFile('w', suffix='.json') as changes:
+            # Both written before either is restored: a restore rewrites every updated_at
+            runs = []
+            for name, output, since, restore in (('full', full, None, stream_restore), ('changes', changes, watermark, stream_merge)):
+                total = write_backup(output, since=since)
+                output.flush()
+                runs.append((name, output, total, restore))
+            for name, output, total, restore in runs:
+                size = output.tell() / 1024
+                _, elapsed, peak = measure(restore, output.name)
+                command.stdout.write(
+                    f'{days:>8} days  {name:<8} {total:>7} rows  file {size:9.1f} KB  restore {elapsed:7.2f}s  peak {peak:8.2f} MB'
+                )
+
+
+def benchmark_snapshot(command, rows, scale):
+    """Full backup as JSON vs columnar .npz snapshot: file size, export and restore time"""
+    for days in (rows, rows * scale):
+        seed_records(days)
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as backup_file, tempfile.NamedTemporaryFile(suffix='.npz') as snapshot_file:
+            runs = (
+                ('json', backup_file, write_backup, stream_restore),
+                ('npz', snapshot_file, write_snapshot, restore_snapshot),
+            )
+            for name, output, write, restore in runs:
+                total, export_time, export_peak = measure(write, output)
+                output.flush()
+                size = output.tell() / 1024
+                _, restore_time, restore_peak = measure(restore, output.name)
+                command.stdout.write(
+                    f'{days:>8} days  {name:<5} {total:>7} rows  file {size:9.1f} KB  '
+                    f'export {export_time:6.2f}s peak {export_peak:7.2f} MB  restore {restore_time:6.2f}s peak {restore_peak:7.2f} MB'
+                )
+
+
+def backfill_records(start_date, days, batch):
+    """A back-fill of `days` days after start_date: a SIAF record and a mortality record per day"""
+    records = []
+    for offset in range(days):
+        day = (start_date + timedelta(days=offset)).isoformat()
+        records.append({'type': 'siaf', 'date': day, 'feed_female_morning': 100 + offset % 7, 'total_egg_morning': 600})
+        records.append({'type': 'female_mortality', 'batch': batch.id, 'date': day, 'mortality_count': offset % 3})
+    return records
+
+
+def save_one_by_one(records):
+    """Each record saved as the single-record views do (baseline for the bulk benchmark)"""
+    for record in records:
+        day = date.fromisoformat(record['date'])
+        if record['type'] == 'siaf':
+            siaf, _ = DailyRecordSIAF.objects.get_or_create(date=day)
+            siaf.feed_female_morning = record['feed_female_morning']
+            siaf.total_egg_morning = record['total_egg_morning']
+            siaf.save()
+        else:
+            FemaleBirdsMortality.objects.create(
+                batch=FemaleBirdsStock.objects.get(id=record['batch']), date=day, mortality_count=record['mortality_count'],
+            )
+
+
+def benchmark_bulk(command, rows, scale):
+    """Back-filling days of records: one save() per record vs one bulk request"""
+    for days in (rows, rows * scale):
+        for name, save in (('single', save_one_by_one), ('bulk', save_records)):
+            _, end_date = seed_records(days)
+            batch = FemaleBirdsStock.objects.get()
+            records = backfill_records(end_date + timedelta(days=1), days, batch)
+            _, elapsed, peak = measure(save, records)
+            command.stdout.write(
+                f'{days:>8} days  {name:<7} {len(records):>6} records  {elapsed:7.2f}s  '
+                f'{len(records) / elapsed:8.0f} records/s  peak {peak:7.2f} MB'
+            )
+
+
+def write_history_csv(path, start_date, days):
+    """A CSV of `days` days of SIAF records from start_date, as exported from a spreadsheet"""
+    with open(path, 'w') as output:
+        output.write('Date,Feed Female Morning,Feed Female Evening,Total Egg Morning,Water Intake,Notes\n')
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            output.write(f'{day.isoformat()},{100 + offset % 7},100,{600 + offset % 30},500,Imported {offset}\n')
+
+
+def benchmark_imports(command, rows, scale):
+    """Importing days of SIAF history from CSV, read in small and large chunks"""
+    for days in (rows, rows * scale):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as file:
+            write_history_csv(file.name, date.today() - timedelta(days=days - 1), days)
+            for chunk_size in (100, 1000):
+                DailyRecordSIAF.objects.all().delete()
+                with open(file.name, 'rb') as source:
+                    summary, elapsed, peak = measure(import_file, source, file.name, 'siaf', chunk_size=chunk_size)
+                command.stdout.write(
+                    f'{days:>8} days  chunks of {chunk_size:<5} {summary["created"]:>7} created  {elapsed:7.2f}s  '
+                    f'{days / elapsed:8.0f} rows/s  peak {peak:7.2f} MB'
+                )
+
+
+TARGETS = {
+    'analytics': benchmark_analytics,
+    'backup': benchmark_backup,
+    'bulk': benchmark_bulk,
+    'exports': benchmark_exports,
+    'imports': benchmark_imports,
+    'incremental': benchmark_incremental,
+    'restore': benchmark_restore,
+    'snapshot': benchmark_snapshot,
+}
+
+
+class Command(BaseCommand):
+    help = "Run a performance benchmark against a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=sorted(TARGETS), help='What to benchmark')
+        parser.add_argument('--rows', type=int, default=1000, help='Rows of synthetic data at 1x (default 1000)')
+        parser.add_argument('--scale', type=int, default=10, help='Multiplier for the large run (default 10)')
+
+    def handle(self, *args, **options):
+        # Never touch the real data: build and tear down a separate test database
+        creation = connection.creation
+        old_name = connection.settings_dict['NAME']
+        creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            TARGETS[options['target']](self, options['rows'], options['scale'])
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.summary import check_daily_summary
+
+
+class Command(BaseCommand):
+    help = "Compare the stored daily farm summary with a live calculation from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First date to check (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last date to check (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        dates = []
+        for name in ('start_date', 'end_date'):
+            value = options.get(name)
+            try:
+                dates.append(datetime.strptime(value, '%Y-%m-%d').date() if value else None)
+            except ValueError:
+                raise CommandError('Invalid date format, use YYYY-MM-DD')
+
+        mismatches = check_daily_summary(*dates)
+        for day, field, stored, expected in mismatches:
+            self.stdout.write(f'{day}  {field}: stored {stored}, expected {expected}')
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} mismatch(es) found; run rebuild_daily_summary --from-date {min(m[0] for m in mismatches)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Daily summary matches the source tables'))
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.bulk import RECORD_TYPES
+from myapp.imports import IMPORT_CHUNK_SIZE, ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = "Import historical records of one type from a CSV or XLSX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('type', choices=list(RECORD_TYPES), help='Type of the records in the file')
+        parser.add_argument('path', help='CSV or XLSX file with a header row of field names')
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+            help=f'Rows read and written at a time (default {IMPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        try:
+            with open(path, 'rb') as records_file:
+                summary = import_file(records_file, path, options['type'], chunk_size=options['chunk_size'])
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {'; '.join(error['errors'])}")
+        if summary['ignored_columns']:
+            self.stdout.write(f"Ignored columns: {', '.join(summary['ignored_columns'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['rows']} rows read: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['failed']} skipped in {summary['seconds']}s ({summary['rows_per_second']} rows/s)"
+        ))
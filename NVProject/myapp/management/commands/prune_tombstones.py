@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from myapp.backup import TOMBSTONE_RETENTION, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete the deleted-row tombstones older than the retention period (run daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=TOMBSTONE_RETENTION.days,
+            help=f'Keep the tombstones of the last DAYS days (default {TOMBSTONE_RETENTION.days}); '
+                 'incremental backups can start at most this far back',
+        )
+
+    def handle(self, *args, **options):
+        count = prune_tombstones(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Tombstones pruned: {count}'))
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.ledger import refresh_feed_ledger
+
+
+class Command(BaseCommand):
+    help = "Rebuild the feed inventory ledger from FeedStock and DailyRecordSIAF"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-date',
+            help='Only recompute ledger rows on and after this date (YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        from_date = options.get('from_date')
+        if from_date:
+            try:
+                from_date = datetime.strptime(from_date, '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date format, use YYYY-MM-DD')
+
+        count = refresh_feed_ledger(from_date)
+        self.stdout.write(self.style.SUCCESS(f'Feed ledger rebuilt: {count} day(s) written'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.jobs import fail_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Build queued export jobs (worker for EXPORT_JOB_RUNNER = 'command')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the pending jobs and exit instead of polling')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls (default 2)')
+
+    def handle(self, *args, **options):
+        while True:
+            fail_stale_jobs()
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f'Export jobs run: {count}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
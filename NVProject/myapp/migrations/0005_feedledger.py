@@ -0,0 +1,75 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+def build_feed_ledger(apps, schema_editor):
+    """Populate the ledger from existing feed stock and daily records"""
+    FeedStock = apps.get_model('myapp', 'FeedStock')
+    DailyRecordSIAF = apps.get_model('myapp', 'DailyRecordSIAF')
+    FeedLedger = apps.get_model('myapp', 'FeedLedger')
+
+    received = {}
+    for date, kg, bundles in FeedStock.objects.values_list('date', 'kg', 'bundles'):
+        total_kg, total_bundles = received.get(date, (0, 0))
+        received[date] = (total_kg + (kg or 0), total_bundles + (bundles or 0))
+
+    used = {}
+    for rec in DailyRecordSIAF.objects.all():
+        male_feed = (rec.feed_male_morning or 0) + (rec.feed_male_evening or 0)
+        female_feed = (rec.feed_female_morning or 0) + (rec.feed_female_evening or 0)
+        legacy_feed = (rec.feed_morning or 0) + (rec.feed_evening or 0)
+        feed = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
+        used[rec.date] = used.get(rec.date, 0) + feed
+
+    cumulative_received = 0
+    cumulative_used = 0
+    rows = []
+    for date in sorted(set(received) | set(used)):
+        received_kg, received_bundles = received.get(date, (0, 0))
+        used_kg = used.get(date, 0)
+        cumulative_received += received_kg
+        cumulative_used += used_kg
+        closing_kg = cumulative_received - cumulative_used
+        rows.append(FeedLedger(
+            date=date,
+            received_kg=received_kg,
+            received_bundles=received_bundles,
+            used_kg=used_kg,
+            used_bundles=round(used_kg / 60, 2),
+            cumulative_received_kg=cumulative_received,
+            cumulative_used_kg=cumulative_used,
+            closing_kg=closing_kg,
+            closing_bundles=round(closing_kg / 60, 2),
+        ))
+    FeedLedger.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_add_batch_to_mortality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('received_kg', models.FloatField(default=0)),
+                ('received_bundles', models.FloatField(default=0)),
+                ('used_kg', models.FloatField(default=0)),
+                ('used_bundles', models.FloatField(default=0)),
+                ('cumulative_received_kg', models.FloatField(default=0)),
+                ('cumulative_used_kg', models.FloatField(default=0)),
+                ('closing_kg', models.FloatField(default=0)),
+                ('closing_bundles', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RunPython(build_feed_ledger, migrations.RunPython.noop),
+    ]
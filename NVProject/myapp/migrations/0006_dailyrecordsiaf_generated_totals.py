@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:35
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_feedledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrecordsiaf',
+            name='effective_feed_kg',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.GreaterThan(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_male_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_male_evening', 0.0)), 0), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_male_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_male_evening', 0.0)), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_female_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_female_evening', 0.0)))), models.When(django.db.models.lookups.GreaterThan(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_female_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_female_evening', 0.0)), 0), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_male_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_male_evening', 0.0)), '+', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_female_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_female_evening', 0.0)))), default=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_morning', 0), '+', django.db.models.functions.comparison.Coalesce('feed_evening', 0)), models.FloatField()), output_field=models.FloatField()), output_field=models.FloatField()),
+        ),
+        migrations.AddField(
+            model_name='dailyrecordsiaf',
+            name='female_feed_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_female_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_female_evening', 0.0)), output_field=models.FloatField()),
+        ),
+        migrations.AddField(
+            model_name='dailyrecordsiaf',
+            name='male_feed_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('feed_male_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('feed_male_evening', 0.0)), output_field=models.FloatField()),
+        ),
+        migrations.AddField(
+            model_name='dailyrecordsiaf',
+            name='total_eggs',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce('total_egg_morning', 0.0), '+', django.db.models.functions.comparison.Coalesce('total_egg_evening', 0.0)), output_field=models.FloatField()),
+        ),
+    ]
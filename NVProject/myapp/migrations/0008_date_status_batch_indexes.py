@@ -0,0 +1,119 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:48
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Fields a duplicate record is compared on (not the key, ids, timestamps or generated totals)
+SKIPPED_FIELDS = {'id', 'date', 'created_at', 'updated_at'}
+
+
+def merge_duplicates(records):
+    """
+    ({field: value} to store in the most recently updated of records, [fields
+    whose recorded values disagree]). A value is recorded unless it is empty
+    or the field's default; a field recorded in one record only takes it.
+    """
+    fields = [
+        field for field in records[0]._meta.concrete_fields
+        if field.name not in SKIPPED_FIELDS and not field.generated
+    ]
+    merged, conflicts = {}, []
+    for field in fields:
+        default = field.get_default() if field.has_default() else None
+        recorded = {
+            getattr(record, field.attname) for record in records
+            if getattr(record, field.attname) not in (None, '', default)
+        }
+        if len(recorded) > 1:
+            conflicts.append(field.name)
+        elif recorded:
+            merged[field.attname] = recorded.pop()
+    return merged, conflicts
+
+
+def merge_duplicate_daily_records(apps, schema_editor):
+    """
+    Merge the records of each date field by field into its most recently
+    updated one so date can be unique; stop, changing nothing, when records
+    of a date hold different values for the same field
+    """
+    DailyRecordSIAF = apps.get_model('myapp', 'DailyRecordSIAF')
+    FeedLedger = apps.get_model('myapp', 'FeedLedger')
+
+    duplicate_dates = list(
+        DailyRecordSIAF.objects.values('date')
+        .annotate(records=models.Count('id'))
+        .filter(records__gt=1)
+        .order_by('date')
+        .values_list('date', flat=True)
+    )
+    merges, conflicts = [], []
+    for date in duplicate_dates:
+        records = list(DailyRecordSIAF.objects.filter(date=date).order_by('-updated_at', '-id'))
+        merged, conflicting = merge_duplicates(records)
+        if conflicting:
+            conflicts.append(f"{date} ({', '.join(conflicting)})")
+        merges.append((records, merged))
+    if conflicts:
+        raise RuntimeError(
+            'Cannot make the SIAF record date unique: these dates have several records with different values: '
+            + '; '.join(conflicts) + '. Keep one record per date (or make them agree) and migrate again.'
+        )
+
+    for records, merged in merges:
+        keep = records[0]
+        merged['created_at'] = min(record.created_at for record in records)
+        DailyRecordSIAF.objects.filter(id=keep.id).update(**merged)
+        DailyRecordSIAF.objects.filter(date=keep.date).exclude(id=keep.id).delete()
+
+    if merges:
+        # Feed used changed: rebuild the ledger from scratch
+        FeedLedger.objects.all().delete()
+        import_module('myapp.migrations.0005_feedledger').build_feed_ledger(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_daily_records, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailyrecordsiaf',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.now, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='feedstock',
+            index=models.Index(fields=['date'], name='feedstock_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='femalebirdsmortality',
+            index=models.Index(fields=['batch', 'date'], name='femalemortality_batch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='femalebirdsmortality',
+            index=models.Index(fields=['date'], name='femalemortality_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='femalebirdsstock',
+            index=models.Index(fields=['status'], name='femalestock_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='malebirdsmortality',
+            index=models.Index(fields=['batch', 'date'], name='malemortality_batch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='malebirdsmortality',
+            index=models.Index(fields=['date'], name='malemortality_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='malebirdsstock',
+            index=models.Index(fields=['status'], name='malestock_status_idx'),
+        ),
+    ]
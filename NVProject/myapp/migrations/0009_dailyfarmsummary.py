@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_date_status_batch_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFarmSummary',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('siaf_record_exists', models.BooleanField(default=False)),
+                ('tray_eggs', models.FloatField(default=0)),
+                ('total_eggs', models.FloatField(default=0)),
+                ('male_birds', models.IntegerField(default=0)),
+                ('female_birds', models.IntegerField(default=0)),
+                ('total_birds', models.IntegerField(default=0)),
+                ('male_mortality_to_date', models.IntegerField(default=0)),
+                ('female_mortality_to_date', models.IntegerField(default=0)),
+                ('total_mortality_to_date', models.IntegerField(default=0)),
+                ('male_mortality', models.IntegerField(default=0)),
+                ('female_mortality', models.IntegerField(default=0)),
+                ('feed_kg', models.FloatField(default=0)),
+                ('male_feed_kg', models.FloatField(default=0)),
+                ('female_feed_kg', models.FloatField(default=0)),
+                ('feed_per_gram_per_bird', models.FloatField(default=0)),
+                ('male_feed_per_bird', models.FloatField(default=0)),
+                ('female_feed_per_bird', models.FloatField(default=0)),
+                ('egg_percentage', models.FloatField(default=0)),
+                ('closing_kg', models.FloatField(default=0)),
+                ('egg_out', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """Keep only the latest pending/running job of each request, so the key can be unique among them"""
+    ExportJob = apps.get_model('myapp', 'ExportJob')
+    active = ExportJob.objects.filter(status__in=['pending', 'running']).order_by('key', '-created_at', '-id')
+    seen = set()
+    duplicates = []
+    for job_id, key in active.values_list('id', 'key'):
+        if key in seen:
+            duplicates.append(job_id)
+        seen.add(key)
+    ExportJob.objects.filter(id__in=duplicates).update(status='failed', error='Duplicate of a newer job for the same export')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_deletedrow'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('key',), name='exportjob_one_active_per_key'),
+        ),
+    ]
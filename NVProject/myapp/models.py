@@ -1,8 +1,25 @@
 from django.db import models
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
 from django.utils import timezone
 
+
+# Feed and egg totals shared by the DailyRecordSIAF generated columns. Male and
+# female feed take priority; the legacy morning/evening feed is used only when
+# neither of them was recorded.
+MALE_FEED_KG = Coalesce('feed_male_morning', 0.0) + Coalesce('feed_male_evening', 0.0)
+FEMALE_FEED_KG = Coalesce('feed_female_morning', 0.0) + Coalesce('feed_female_evening', 0.0)
+LEGACY_FEED_KG = Cast(Coalesce('feed_morning', 0) + Coalesce('feed_evening', 0), models.FloatField())
+EFFECTIVE_FEED_KG = models.Case(
+    models.When(GreaterThan(MALE_FEED_KG, 0), then=MALE_FEED_KG + FEMALE_FEED_KG),
+    models.When(GreaterThan(FEMALE_FEED_KG, 0), then=MALE_FEED_KG + FEMALE_FEED_KG),
+    default=LEGACY_FEED_KG,
+    output_field=models.FloatField(),
+)
+TOTAL_EGGS = Coalesce('total_egg_morning', 0.0) + Coalesce('total_egg_evening', 0.0)
+
 class DailyRecordSIAF(models.Model):
-    date = models.DateField(default=timezone.now)
+    date = models.DateField(default=timezone.now, unique=True)
     
     # Feed Data - Male Birds
     feed_male_morning = models.FloatField(null=True, blank=True)
@@ -59,6 +76,12 @@ class DailyRecordSIAF(models.Model):
     temperature_5 = models.FloatField(null=True, blank=True)  # Time 5
     temperature_6 = models.FloatField(null=True, blank=True)  # Time 6
     
+    # Derived totals computed by the database (read-only, refreshed on save)
+    male_feed_kg = models.GeneratedField(expression=MALE_FEED_KG, output_field=models.FloatField(), db_persist=True)
+    female_feed_kg = models.GeneratedField(expression=FEMALE_FEED_KG, output_field=models.FloatField(), db_persist=True)
+    effective_feed_kg = models.GeneratedField(expression=EFFECTIVE_FEED_KG, output_field=models.FloatField(), db_persist=True)
+    total_eggs = models.GeneratedField(expression=TOTAL_EGGS, output_field=models.FloatField(), db_persist=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -79,6 +102,9 @@ class FeedStock(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date'], name='feedstock_date_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Automatically calculate bundles from kg (1 bundle = 60 kg)
@@ -89,6 +115,31 @@ class FeedStock(models.Model):
         return f"Feed Stock - {self.date}: {self.kg} kg ({self.bundles} bundles)"
 
 
+class BatchQuerySet(models.QuerySet):
+    """Shared QuerySet of MaleBirdsStock and FemaleBirdsStock"""
+
+    def with_stats(self):
+        """
+        Annotate mortality_total and current_birds for every batch in one grouped query.
+
+        A batch without a start date has not started: it holds no birds and
+        no mortality (myapp.headcount leaves it out too).
+        get_current_mortality() and get_current_birds() return these values
+        instead of querying again when they are present.
+        """
+        return self.annotate(
+            mortality_total=models.Case(
+                models.When(batch_start_date__isnull=True, then=models.Value(0)),
+                default=Coalesce(models.Sum('mortality_records__mortality_count'), 0),
+            ),
+        ).annotate(
+            current_birds=models.Case(
+                models.When(batch_start_date__isnull=True, then=models.Value(0)),
+                default=Greatest(models.F('initial_birds') - models.F('mortality_total'), 0),
+            ),
+        )
+
+
 class MaleBirdsStock(models.Model):
     """Track male birds batch information with status tracking"""
     STATUS_CHOICES = [
@@ -104,12 +155,20 @@ class MaleBirdsStock(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BatchQuerySet.as_manager()
     
     class Meta:
         ordering = ['-batch_start_date']
+        indexes = [
+            models.Index(fields=['status'], name='malestock_status_idx'),
+        ]
     
     def get_current_mortality(self):
         """Calculate current mortality for this batch"""
+        if hasattr(self, 'mortality_total'):
+            # Annotated by BatchQuerySet.with_stats()
+            return self.mortality_total
         if not self.batch_start_date:
             return 0
         # Use batch-specific mortality records when available
@@ -118,6 +177,10 @@ class MaleBirdsStock(models.Model):
     
     def get_current_birds(self):
         """Get current alive birds in this batch"""
+        if hasattr(self, 'current_birds'):
+            return self.current_birds
+        if not self.batch_start_date:
+            return 0
         mortality = self.get_current_mortality()
         return max(0, self.initial_birds - mortality)
     
@@ -136,6 +199,10 @@ class MaleBirdsMortality(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['batch', 'date'], name='malemortality_batch_date_idx'),
+            models.Index(fields=['date'], name='malemortality_date_idx'),
+        ]
     
     def __str__(self):
         return f"Male Birds Mortality - {self.date}: {self.mortality_count} birds"
@@ -155,12 +222,20 @@ class FemaleBirdsStock(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BatchQuerySet.as_manager()
     
     class Meta:
         ordering = ['-batch_start_date']
+        indexes = [
+            models.Index(fields=['status'], name='femalestock_status_idx'),
+        ]
     
     def get_current_mortality(self):
         """Calculate current mortality for this batch"""
+        if hasattr(self, 'mortality_total'):
+            # Annotated by BatchQuerySet.with_stats()
+            return self.mortality_total
         if not self.batch_start_date:
             return 0
         # Use batch-specific mortality records when available
@@ -169,6 +244,10 @@ class FemaleBirdsStock(models.Model):
     
     def get_current_birds(self):
         """Get current alive birds in this batch"""
+        if hasattr(self, 'current_birds'):
+            return self.current_birds
+        if not self.batch_start_date:
+            return 0
         mortality = self.get_current_mortality()
         return max(0, self.initial_birds - mortality)
     
@@ -187,6 +266,10 @@ class FemaleBirdsMortality(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['batch', 'date'], name='femalemortality_batch_date_idx'),
+            models.Index(fields=['date'], name='femalemortality_date_idx'),
+        ]
     
     def __str__(self):
         return f"Female Birds Mortality - {self.date}: {self.mortality_count} birds"
@@ -206,3 +289,106 @@ class EggOut(models.Model):
     
     def __str__(self):
         return f"Egg Out - {self.date}: {self.egg_out_count} eggs"
+
+
+class FeedLedger(models.Model):
+    """Running feed inventory - one row per day with feed received or used"""
+    date = models.DateField(unique=True)
+    received_kg = models.FloatField(default=0)
+    received_bundles = models.FloatField(default=0)
+    used_kg = models.FloatField(default=0)
+    used_bundles = models.FloatField(default=0)
+    cumulative_received_kg = models.FloatField(default=0)
+    cumulative_used_kg = models.FloatField(default=0)
+    closing_kg = models.FloatField(default=0)  # Cumulative received - cumulative used
+    closing_bundles = models.FloatField(default=0)  # closing_kg / 60
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Feed Ledger - {self.date}: {self.closing_kg} kg closing"
+
+
+class DailyFarmSummary(models.Model):
+    """Dashboard figures of one day, kept up to date by myapp.summary"""
+    date = models.DateField(primary_key=True)
+    siaf_record_exists = models.BooleanField(default=False)
+    tray_eggs = models.FloatField(default=0)
+    total_eggs = models.FloatField(default=0)
+    male_birds = models.IntegerField(default=0)  # Alive at the end of the day
+    female_birds = models.IntegerField(default=0)
+    total_birds = models.IntegerField(default=0)
+    male_mortality_to_date = models.IntegerField(default=0)  # Cumulative, batches alive on the day
+    female_mortality_to_date = models.IntegerField(default=0)
+    total_mortality_to_date = models.IntegerField(default=0)
+    male_mortality = models.IntegerField(default=0)  # Recorded on the day
+    female_mortality = models.IntegerField(default=0)
+    feed_kg = models.FloatField(default=0)  # Effective feed of the day
+    male_feed_kg = models.FloatField(default=0)
+    female_feed_kg = models.FloatField(default=0)
+    # Unrounded ratios; 0 when the day has no record or no birds
+    feed_per_gram_per_bird = models.FloatField(default=0)
+    male_feed_per_bird = models.FloatField(default=0)
+    female_feed_per_bird = models.FloatField(default=0)
+    egg_percentage = models.FloatField(default=0)
+    closing_kg = models.FloatField(default=0)  # Feed stock at the end of the day
+    egg_out = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Daily Farm Summary - {self.date}"
+
+
+class DeletedRow(models.Model):
+    """Tombstone of a deleted farm data row, carried by incremental backups"""
+    model = models.CharField(max_length=50)  # model_name of the deleted row's model
+    row_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"Deleted Row - {self.model} {self.row_id}"
+
+
+class ExportJob(models.Model):
+    """An export built in the background; the finished file stays cached until its data changes"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20)  # Key of myapp.jobs.EXPORTS
+    params = models.JSONField(default=dict)
+    key = models.CharField(max_length=64, db_index=True)  # Hash of kind + params, identical requests share it
+    fingerprint = models.CharField(max_length=64, blank=True)  # Data version the file was built from
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_written = models.IntegerField(default=0)
+    file_path = models.CharField(max_length=255, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # One pending/running job per request; identical submissions share it
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status__in=['pending', 'running']), name='exportjob_one_active_per_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Export Job {self.id} - {self.kind}: {self.status}"
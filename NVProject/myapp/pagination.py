@@ -0,0 +1,71 @@
+"""
+Keyset (cursor) pagination for the list and report endpoints.
+
+Rows are returned newest first, ordered by (date, id) descending. The cursor
+of a page encodes the (date, id) of its last row; the next page continues
+strictly after it, so inserts and deletes between requests never shift or
+repeat rows, and every page costs the same however deep it is.
+"""
+import base64
+import json
+from datetime import date
+
+from django.db.models import Q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidPageRequest(ValueError):
+    """Malformed cursor or limit"""
+
+
+def encode_cursor(row_date, row_id):
+    return base64.urlsafe_b64encode(json.dumps([row_date.isoformat(), row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        row_date, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return date.fromisoformat(row_date), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+def page_limit(request):
+    """limit query parameter, DEFAULT_LIMIT when absent, capped at MAX_LIMIT"""
+    limit = request.GET.get('limit')
+    if not limit:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise InvalidPageRequest('Invalid limit')
+    if limit < 1:
+        raise InvalidPageRequest('Invalid limit')
+    return min(limit, MAX_LIMIT)
+
+
+def keyset_page(queryset, request):
+    """
+    One page of queryset (rows newest first) after the request's cursor.
+
+    Works on model and values() querysets alike (values() must include 'date'
+    and 'id'). Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = page_limit(request)
+    queryset = queryset.order_by('-date', '-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=cursor_id))
+
+    # One extra row tells whether another page follows
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last['date'], last['id'])
+    return rows, encode_cursor(last.date, last.id)
@@ -0,0 +1,161 @@
+"""
+Keep the derived tables in step with the source tables.
+
+Every save or delete of a source row marks the earliest date it affects
+(both the old and the new date when a row moves). The marks are collected per
+thread and applied once when the surrounding transaction commits, so a
+cascade delete or a multi-row write refreshes once: the feed ledger first,
+then the daily summary, which reads the ledger.
+
+After the refresh the changed models get a new data version, which outdates
+the cached responses that read them (see myapp.caching).
+
+Inside deferred_refresh() nothing is refreshed until the block exits; bulk
+writers such as the backup restore use it to refresh once at the end.
+
+Deleting a source row also leaves a DeletedRow tombstone, so an incremental
+backup can carry the deletion.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import date as date_type, datetime
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_data_versions
+from .ledger import refresh_feed_ledger
+from .models import (
+    DailyRecordSIAF, DeletedRow, EggOut, FeedStock, FemaleBirdsMortality, FemaleBirdsStock, MaleBirdsMortality, MaleBirdsStock,
+)
+from .summary import refresh_daily_summary
+
+# Models whose rows feed the ledger (and the summary) / only the summary, with
+# the field holding the date a row affects from
+LEDGER_SOURCES = {DailyRecordSIAF: 'date', FeedStock: 'date'}
+SUMMARY_SOURCES = {
+    MaleBirdsMortality: 'date',
+    FemaleBirdsMortality: 'date',
+    MaleBirdsStock: 'batch_start_date',
+    FemaleBirdsStock: 'batch_start_date',
+}
+# Rows that only affect their own date
+SINGLE_DAY_SOURCES = {EggOut: 'date'}
+
+_pending = threading.local()
+
+
+def _state():
+    if not hasattr(_pending, 'ledger_from'):
+        _pending.ledger_from = None
+        _pending.summary_from = None
+        _pending.summary_days = set()
+        _pending.changed_models = set()
+        _pending.deferred = 0
+    return _pending
+
+
+def _as_date(value):
+    # Unsaved instances may still hold a datetime (e.g. rows rebuilt from a backup)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _earliest(*dates):
+    # A batch without a start date counts from the beginning of the data
+    return min(date_type.min if value is None else value for value in dates)
+
+
+def mark_dirty(model, ledger_from=None, summary_from=None, summary_days=()):
+    state = _state()
+    state.changed_models.add(model)
+    if ledger_from is not None:
+        state.ledger_from = ledger_from if state.ledger_from is None else min(state.ledger_from, ledger_from)
+        summary_from = ledger_from if summary_from is None else min(summary_from, ledger_from)
+    if summary_from is not None:
+        state.summary_from = summary_from if state.summary_from is None else min(state.summary_from, summary_from)
+    state.summary_days.update(summary_days)
+    if not state.deferred:
+        transaction.on_commit(flush)
+
+
+def flush():
+    """Apply the pending refreshes (no-op when there are none)"""
+    state = _state()
+    if state.deferred:
+        return
+    ledger_from, summary_from, summary_days = state.ledger_from, state.summary_from, state.summary_days
+    changed_models = state.changed_models
+    state.ledger_from, state.summary_from, state.summary_days, state.changed_models = None, None, set(), set()
+
+    try:
+        if ledger_from is not None:
+            refresh_feed_ledger(None if ledger_from == date_type.min else ledger_from)
+        if summary_from is not None:
+            refresh_daily_summary(None if summary_from == date_type.min else summary_from)
+        for day in sorted(summary_days):
+            if summary_from is None or day < summary_from:
+                refresh_daily_summary(day, day)
+    finally:
+        bump_data_versions(changed_models)
+
+
+@contextmanager
+def deferred_refresh():
+    """Collect refreshes inside the block and apply them once when it exits"""
+    state = _state()
+    state.deferred += 1
+    try:
+        yield
+    finally:
+        state.deferred -= 1
+        if not state.deferred:
+            transaction.on_commit(flush)
+
+
+def tracked_date_field(sender):
+    for sources in (LEDGER_SOURCES, SUMMARY_SOURCES, SINGLE_DAY_SOURCES):
+        if sender in sources:
+            return sources[sender]
+    return None
+
+
+@receiver(pre_save)
+def remember_previous_date(sender, instance, raw=False, **kwargs):
+    """Stash the stored date of a row about to be updated, so moving it refreshes both dates"""
+    field = tracked_date_field(sender)
+    if field is None or raw or instance.pk is None:
+        return
+    previous = list(sender.objects.filter(pk=instance.pk).values_list(field, flat=True))
+    if previous:
+        instance._previous_date = previous[0]
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def mark_source_change(sender, instance, **kwargs):
+    field = tracked_date_field(sender)
+    if field is None or kwargs.get('raw'):
+        return
+    dates = [_as_date(getattr(instance, field))]
+    if hasattr(instance, '_previous_date'):
+        dates.append(instance._previous_date)
+        del instance._previous_date
+    mark_rows_changed(sender, dates)
+
+
+def mark_rows_changed(model, dates):
+    """Mark the derived tables dirty for rows of a source model on (or moved from/to) dates"""
+    if model in LEDGER_SOURCES:
+        mark_dirty(model, ledger_from=_earliest(*dates))
+    elif model in SUMMARY_SOURCES:
+        mark_dirty(model, summary_from=_earliest(*dates))
+    else:
+        mark_dirty(model, summary_days=[day for day in dates if day is not None])
+
+
+@receiver(post_delete)
+def record_deletion(sender, instance, **kwargs):
+    if tracked_date_field(sender) is None:
+        return
+    DeletedRow.objects.create(model=sender._meta.model_name, row_id=instance.pk)
@@ -0,0 +1,279 @@
+"""
+Columnar binary snapshot of all farm data.
+
+A snapshot is a compressed NumPy .npz archive holding one array per field of
+every backup section ('<section>/<field attname>'), a '<section>/<field>.null'
+mask for the columns that hold NULLs, and a '__schema__' header: a JSON
+object with the format name and version and, per section, the row count and
+the kind of every field. Numbers stay binary and field names are stored once,
+so a snapshot is much smaller and faster to read than the JSON backup.
+
+write_snapshot() reads each table SNAPSHOT_CHUNK_SIZE rows at a time into
+typed arrays and writes a section's columns to the archive as soon as it is
+read, so only one section is ever held in memory, as arrays rather than rows.
+
+restore_snapshot() checks the whole snapshot (header, dtypes, NULLs, unique
+ids, batch references) with array operations before anything is written, then
+replaces all farm data with it like restore_backup(), except that the columns
+go straight to executemany() instead of through model instances (timestamps
+included, as they were).
+"""
+import json
+import zipfile
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from numpy.lib import format as npy_format
+from django.db import connection
+from django.utils import timezone
+
+from .backup import BACKUP_MODELS, RESTORE_BATCH_SIZE, BackupError, replace_data, restored_fields
+
+SNAPSHOT_FORMAT = 'nv-poultry-snapshot'
+SNAPSHOT_VERSION = 1
+SCHEMA_KEY = '__schema__'
+
+SNAPSHOT_CHUNK_SIZE = 500
+
+# Kind of field -> (dtype of its column, value standing in for NULL)
+KINDS = {
+    'int': ('int64', 0),
+    'float': ('float64', 0.0),
+    'bool': ('bool', False),
+    'date': ('datetime64[D]', None),
+    'datetime': ('datetime64[us]', None),  # UTC
+    'str': ('str', ''),
+}
+
+FIELD_KINDS = {
+    'AutoField': 'int', 'BigAutoField': 'int', 'IntegerField': 'int', 'BigIntegerField': 'int',
+    'SmallIntegerField': 'int', 'PositiveIntegerField': 'int', 'ForeignKey': 'int',
+    'FloatField': 'float', 'BooleanField': 'bool', 'DateField': 'date', 'DateTimeField': 'datetime',
+    'CharField': 'str', 'TextField': 'str',
+}
+
+
+def field_kind(field):
+    return FIELD_KINDS[field.get_internal_type()]
+
+
+def _column(values, kind):
+    """(array, NULL mask or None) of a list of Python values"""
+    dtype, null_value = KINDS[kind]
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if kind == 'datetime':
+        values = [None if value is None else value.astimezone(dt_timezone.utc).replace(tzinfo=None) for value in values]
+    if nulls.any():
+        values = [null_value if value is None else value for value in values]
+    return np.array(values, dtype=dtype), (nulls if nulls.any() else None)
+
+
+def _section_arrays(model, fields, progress=None):
+    """({attname: column}, {attname: NULL mask}, rows) of a table, read in chunks"""
+    columns = {field.attname: [] for field in fields}
+    masks = {field.attname: [] for field in fields}
+    rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+    while chunk := list(islice(rows, SNAPSHOT_CHUNK_SIZE)):
+        for field, values in zip(fields, zip(*chunk)):
+            column, nulls = _column(list(values), field_kind(field))
+            columns[field.attname].append(column)
+            masks[field.attname].append(np.zeros(len(column), dtype=bool) if nulls is None else nulls)
+        if progress is not None:
+            progress(len(chunk))
+
+    arrays, nulls = {}, {}
+    for field in fields:
+        parts, mask = columns.pop(field.attname), masks.pop(field.attname)
+        if not parts:
+            arrays[field.attname] = _column([], field_kind(field))[0]
+            continue
+        arrays[field.attname] = np.concatenate(parts)
+        mask = np.concatenate(mask)
+        if mask.any():
+            nulls[field.attname] = mask
+    return arrays, nulls, len(arrays[fields[0].attname])
+
+
+def _write_array(archive, key, array):
+    # As numpy.savez_compressed() stores each array
+    with archive.open(f'{key}.npy', 'w', force_zip64=True) as file:
+        npy_format.write_array(file, np.asanyarray(array), allow_pickle=False)
+
+
+def write_snapshot(output, progress=None):
+    """
+    Write all farm data as a snapshot to output (a path or binary file);
+    returns the number of rows. progress, when given, is called with the
+    rows read so far after every chunk.
+    """
+    schema = {'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION, 'sections': {}}
+    total = read = 0
+
+    def chunk_read(rows):
+        nonlocal read
+        read += rows
+        progress(read)
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for name, model in BACKUP_MODELS:
+            fields = restored_fields(model)
+            arrays, nulls, rows = _section_arrays(model, fields, progress and chunk_read)
+            for attname, column in arrays.items():
+                _write_array(archive, f'{name}/{attname}', column)
+                if attname in nulls:
+                    _write_array(archive, f'{name}/{attname}.null', nulls[attname])
+            schema['sections'][name] = {
+                'rows': rows,
+                'fields': {field.attname: field_kind(field) for field in fields},
+            }
+            total += rows
+        _write_array(archive, SCHEMA_KEY, np.array(json.dumps(schema)))
+    return total
+
+
+def _dtype_matches(column, kind):
+    if kind in ('int', 'float', 'bool'):
+        return column.dtype.kind == {'int': 'i', 'float': 'f', 'bool': 'b'}[kind]
+    if kind == 'str':
+        return column.dtype.kind == 'U'
+    return column.dtype == np.dtype(KINDS[kind][0])
+
+
+def _values(column, nulls, kind):
+    values = column.tolist()
+    if kind == 'datetime':
+        values = [None if value is None else timezone.make_aware(value, dt_timezone.utc) for value in values]
+    if nulls is not None:
+        values = [None if null else value for value, null in zip(values, nulls.tolist())]
+    return values
+
+
+def _schema(archive):
+    if SCHEMA_KEY not in archive.files:
+        raise BackupError('Not a snapshot: no schema header')
+    try:
+        schema = json.loads(str(archive[SCHEMA_KEY]))
+    except (ValueError, TypeError):
+        raise BackupError('Not a snapshot: unreadable schema header')
+    if not isinstance(schema, dict) or schema.get('format') != SNAPSHOT_FORMAT:
+        raise BackupError('Not a snapshot: unknown format')
+    if schema.get('version') != SNAPSHOT_VERSION:
+        raise BackupError(f"Snapshot version {schema.get('version')} is not supported (expected {SNAPSHOT_VERSION})")
+    sections = schema.get('sections', {})
+    unknown = sorted(set(sections) - {name for name, _ in BACKUP_MODELS})
+    if unknown:
+        raise BackupError(f"Unknown snapshot sections: {', '.join(unknown)}")
+    # The restore replaces every table, so a partial snapshot would wipe the missing ones
+    missing = [name for name, _ in BACKUP_MODELS if name not in sections]
+    if missing:
+        raise BackupError(f"Incomplete snapshot, missing sections: {', '.join(missing)}")
+    return sections
+
+
+def _section_columns(archive, name, model, info, ids):
+    """{attname: (column, NULL mask)} of a section, checked against its model"""
+    expected = {field.attname: field for field in restored_fields(model)}
+    kinds = info.get('fields', {})
+    unknown = sorted(set(kinds) - set(expected))
+    if unknown:
+        raise BackupError(f"{name}: unknown fields {', '.join(unknown)}")
+    if 'id' not in kinds:
+        raise BackupError(f'{name} has no id column')
+
+    columns = {}
+    for attname, kind in kinds.items():
+        field = expected[attname]
+        if kind != field_kind(field):
+            raise BackupError(f'{name}, {field.name}: stored as {kind}, expected {field_kind(field)}')
+        key = f'{name}/{attname}'
+        if key not in archive.files:
+            raise BackupError(f'{name}, {field.name}: column missing')
+        column = archive[key]
+        nulls = archive[f'{key}.null'] if f'{key}.null' in archive.files else None
+        if column.ndim != 1 or len(column) != info['rows'] or not _dtype_matches(column, kind):
+            raise BackupError(f'{name}, {field.name}: column does not match the schema')
+        if nulls is not None and (nulls.dtype != bool or nulls.shape != column.shape):
+            raise BackupError(f'{name}, {field.name}: NULL mask does not match the column')
+        if nulls is not None and nulls.any() and not field.null:
+            raise BackupError(f'{name}, {field.name}: NULL in a required field')
+        columns[attname] = (column, nulls)
+
+    section_ids = columns['id'][0]
+    if columns['id'][1] is not None and columns['id'][1].any():
+        raise BackupError(f'{name}: rows without an id')
+    if len(np.unique(section_ids)) != len(section_ids):
+        raise BackupError(f'{name}: duplicate ids')
+    ids[model] = section_ids
+
+    # Batch references must point at a batch restored before them
+    for field in model._meta.concrete_fields:
+        if field.many_to_one and field.attname in columns:
+            references, nulls = columns[field.attname]
+            if nulls is not None:
+                references = references[~nulls]
+            missing = references[~np.isin(references, ids.get(field.related_model, []))]
+            if len(missing):
+                raise BackupError(f'{name}: {field.name} {missing[0]} is not in the snapshot')
+    return columns
+
+
+def read_snapshot(file):
+    """
+    [(model, field attnames, value lists)] of a snapshot in a path or
+    seekable binary file, in BACKUP_MODELS order. Raises BackupError for
+    anything that cannot be restored.
+    """
+    try:
+        archive = np.load(file, allow_pickle=False)
+    except (ValueError, OSError, zipfile.BadZipFile):
+        raise BackupError('Not a snapshot file')
+    if not isinstance(archive, np.lib.npyio.NpzFile):
+        raise BackupError('Not a snapshot file')
+
+    with archive:
+        sections = _schema(archive)
+        ids, tables = {}, []
+        for name, model in BACKUP_MODELS:
+            columns = _section_columns(archive, name, model, sections[name], ids)
+            names = list(columns)
+            tables.append((model, names, [_values(*columns[attname], sections[name]['fields'][attname]) for attname in names]))
+    return tables
+
+
+def _insert(model, names, values):
+    """INSERT the columns of a table with executemany(), without building model instances"""
+    fields = {field.attname: field for field in restored_fields(model)}
+    rows = len(values[0]) if values else 0
+    columns = []
+    for attname, field in fields.items():
+        if attname in names:
+            column = values[names.index(attname)]
+            if field_kind(field) in ('date', 'datetime'):
+                column = [field.get_db_prep_save(value, connection) for value in column]
+        else:
+            # A field added after the snapshot was taken
+            column = [field.get_db_prep_save(field.get_default(), connection)] * rows
+        columns.append(column)
+
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields.values()),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, rows, RESTORE_BATCH_SIZE):
+            cursor.executemany(sql, list(zip(*(column[start:start + RESTORE_BATCH_SIZE] for column in columns))))
+
+
+def restore_snapshot(file):
+    """Replace all farm data with a snapshot; returns {section name: rows restored}"""
+    tables = read_snapshot(file)
+
+    def insert():
+        for model, names, values in tables:
+            _insert(model, names, values)
+
+    replace_data(insert)
+    restored = {model: len(values[0]) if values else 0 for model, _, values in tables}
+    return {name: restored.get(model, 0) for name, model in BACKUP_MODELS}
@@ -0,0 +1,340 @@
+"""
+Daily farm summary.
+
+DailyFarmSummary keeps one row per date with every figure the dashboards
+show, so a dashboard hit is a single primary-key lookup.
+
+Rows cover every day from the first recorded data to today (or the last
+recorded date when that is later). refresh_daily_summary() recomputes a range
+of them in bulk: one query per source table and column-wise arithmetic in a
+pandas DataFrame. myapp.signals calls it with the earliest date touched by a
+write. Dates outside the covered span are computed on first use by
+summary_on().
+
+dashboard_metrics() is the one place the dashboard figures are formatted;
+the dashboard page and /dashboard-data/ both call it. Its result is memoised on
+the request and, for METRICS_TIMEOUT seconds, in the cache under the data
+version of DASHBOARD_SOURCES, so a write is visible on the next call.
+
+kpi_series() returns chosen figures for every day of a range from the stored
+rows in one query, for the trend charts.
+
+live_summary() is the independent per-date calculation the dashboards used
+to run; check_daily_summary() compares stored rows against it.
+"""
+import hashlib
+import math
+from datetime import date as date_type, timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from .caching import data_versions
+from .headcount import FLOCKS, flock_series, headcount_on
+from .ledger import closing_stock_on, ledger_on
+from .models import (
+    DailyFarmSummary, DailyRecordSIAF, EggOut, FeedLedger, FeedStock, FemaleBirdsMortality, FemaleBirdsStock,
+    MaleBirdsMortality, MaleBirdsStock,
+)
+
+# Stored columns, in model order
+SUMMARY_FIELDS = [
+    field.name for field in DailyFarmSummary._meta.concrete_fields if field.name not in ('date', 'updated_at')
+]
+
+# Models the dashboard figures are derived from
+DASHBOARD_SOURCES = (
+    DailyRecordSIAF, FeedStock, MaleBirdsStock, MaleBirdsMortality, FemaleBirdsStock, FemaleBirdsMortality,
+)
+# Seconds the figures of a date are shared between requests
+METRICS_TIMEOUT = 60
+
+# Figures kpi_series() can return (mortality is the count recorded on the day)
+KPI_SERIES = (
+    'egg_percentage', 'feed_per_gram_per_bird', 'male_feed_per_bird', 'female_feed_per_bird',
+    'male_mortality', 'female_mortality', 'total_mortality', 'water_intake', 'closing_stock',
+)
+MAX_SERIES_DAYS = 3660
+
+SIAF_SUMMARY_VALUES = (
+    'date', 'tray_egg_morning', 'tray_egg_evening', 'total_eggs', 'effective_feed_kg', 'male_feed_kg', 'female_feed_kg',
+)
+
+
+def summary_span():
+    """First and last date the stored summary covers, or None when there is no data yet"""
+    spans = [
+        DailyRecordSIAF.objects.aggregate(first=models.Min('date'), last=models.Max('date')),
+        FeedStock.objects.aggregate(first=models.Min('date'), last=models.Max('date')),
+        EggOut.objects.aggregate(first=models.Min('date'), last=models.Max('date')),
+    ]
+    for _, stock_model, mortality_model in FLOCKS:
+        spans.append(stock_model.objects.aggregate(first=models.Min('batch_start_date'), last=models.Max('batch_start_date')))
+        spans.append(mortality_model.objects.aggregate(first=models.Min('date'), last=models.Max('date')))
+    firsts = [span['first'] for span in spans if span['first']]
+    if not firsts:
+        return None
+    lasts = [span['last'] for span in spans if span['last']]
+    return min(firsts), max(lasts + [timezone.now().date()])
+
+
+def _daily_sums(queryset, value):
+    return pd.Series(
+        dict(queryset.values('date').annotate(total=models.Sum(value)).values_list('date', 'total')),
+        dtype='float64',
+    )
+
+
+def compute_summaries(start_date, end_date):
+    """Build (unsaved) DailyFarmSummary rows for every day in [start_date, end_date]"""
+    days = pd.Index([start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)], name='date')
+    frame = pd.DataFrame(index=days)
+
+    # Daily record figures
+    siaf = pd.DataFrame.from_records(
+        list(DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]).values(*SIAF_SUMMARY_VALUES)),
+        columns=SIAF_SUMMARY_VALUES,
+    ).set_index('date').astype('float64')
+    frame = frame.join(siaf)
+    frame['siaf_record_exists'] = frame['effective_feed_kg'].notna()
+    frame['tray_eggs'] = frame['tray_egg_morning'].fillna(0) + frame['tray_egg_evening'].fillna(0)
+    frame['feed_kg'] = frame.pop('effective_feed_kg')
+    frame[['total_eggs', 'feed_kg', 'male_feed_kg', 'female_feed_kg']] = (
+        frame[['total_eggs', 'feed_kg', 'male_feed_kg', 'female_feed_kg']].fillna(0)
+    )
+
+    # Birds alive and mortality
+    flocks = flock_series(start_date, end_date)
+    for sex, _, mortality_model in FLOCKS:
+        frame[f'{sex}_birds'] = [flocks[day][sex]['alive'] for day in days]
+        frame[f'{sex}_mortality_to_date'] = [flocks[day][sex]['mortality'] for day in days]
+        frame[f'{sex}_mortality'] = _daily_sums(
+            mortality_model.objects.filter(date__range=[start_date, end_date]), 'mortality_count',
+        ).reindex(days).fillna(0)
+    frame['total_birds'] = frame['male_birds'] + frame['female_birds']
+    frame['total_mortality_to_date'] = frame['male_mortality_to_date'] + frame['female_mortality_to_date']
+
+    # Ratios, only for days with a record (and birds)
+    has_birds = frame['siaf_record_exists'] & (frame['total_birds'] > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame['feed_per_gram_per_bird'] = np.where(has_birds, frame['feed_kg'] * 1000 / frame['total_birds'], 0)
+        frame['male_feed_per_bird'] = np.where(
+            has_birds & (frame['male_birds'] > 0), frame['male_feed_kg'] * 1000 / frame['male_birds'], 0,
+        )
+        frame['female_feed_per_bird'] = np.where(
+            has_birds & (frame['female_birds'] > 0), frame['female_feed_kg'] * 1000 / frame['female_birds'], 0,
+        )
+        frame['egg_percentage'] = np.where(
+            frame['siaf_record_exists'] & (frame['female_birds'] > 0), frame['total_eggs'] / frame['female_birds'] * 100, 0,
+        )
+
+    # Closing feed stock: the latest ledger row on or before each day
+    previous = ledger_on(start_date - timedelta(days=1)) if start_date > date_type.min else None
+    closing = pd.Series(
+        dict(FeedLedger.objects.filter(date__range=[start_date, end_date]).values_list('date', 'closing_kg')),
+        dtype='float64',
+    ).reindex(days).ffill()
+    frame['closing_kg'] = closing.fillna(previous.closing_kg if previous else 0)
+
+    frame['egg_out'] = _daily_sums(EggOut.objects.filter(date__range=[start_date, end_date]), 'egg_out_count').reindex(days).fillna(0)
+
+    integer_fields = [field.name for field in DailyFarmSummary._meta.concrete_fields if isinstance(field, models.IntegerField)]
+    frame[integer_fields] = frame[integer_fields].astype('int64')
+    records = frame[SUMMARY_FIELDS].to_dict('records')
+    return [
+        DailyFarmSummary(date=day, **{name: value.item() if hasattr(value, 'item') else value for name, value in record.items()})
+        for day, record in zip(days, records)
+    ]
+
+
+def refresh_daily_summary(from_date=None, to_date=None):
+    """
+    Recompute summary rows from from_date (the start of the data when None)
+    up to to_date (the end of the covered span when None); returns the number of rows written.
+    """
+    with transaction.atomic():
+        span = summary_span()
+        rows = DailyFarmSummary.objects.all()
+        if from_date is not None:
+            rows = rows.filter(date__gte=from_date)
+        if to_date is not None:
+            rows = rows.filter(date__lte=to_date)
+        rows.delete()
+        if span is None:
+            return 0
+
+        start_date = max(from_date, span[0]) if from_date else span[0]
+        end_date = to_date or span[1]
+        if start_date > end_date:
+            return 0
+        summaries = compute_summaries(start_date, end_date)
+        DailyFarmSummary.objects.bulk_create(summaries, batch_size=500)
+    return len(summaries)
+
+
+def summary_on(date):
+    """Summary row of date, computed and stored on first use when it is outside the covered span"""
+    summary = DailyFarmSummary.objects.filter(date=date).first()
+    if summary is None:
+        summary = compute_summaries(date, date)[0]
+        DailyFarmSummary.objects.bulk_create([summary], ignore_conflicts=True)
+    return summary
+
+
+def summaries_between(start_date, end_date):
+    """Summary rows of every day in [start_date, end_date], oldest first; missing days are computed and stored"""
+    summaries = {summary.date: summary for summary in DailyFarmSummary.objects.filter(date__range=[start_date, end_date])}
+    missing = [
+        start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)
+        if start_date + timedelta(days=offset) not in summaries
+    ]
+    if missing:
+        computed = [summary for summary in compute_summaries(missing[0], missing[-1]) if summary.date not in summaries]
+        DailyFarmSummary.objects.bulk_create(computed, batch_size=500, ignore_conflicts=True)
+        summaries.update((summary.date, summary) for summary in computed)
+    return [summaries[day] for day in sorted(summaries)]
+
+
+def kpi_series(start_date, end_date, metrics=None):
+    """
+    Figures of every day in [start_date, end_date], rounded for display.
+
+    Returns {'dates': [...], metric: [...]} for each name of metrics (all of
+    KPI_SERIES by default); raises ValueError for an unknown metric or a range
+    that is empty or longer than MAX_SERIES_DAYS.
+    """
+    metrics = list(metrics or KPI_SERIES)
+    unknown = [name for name in metrics if name not in KPI_SERIES]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    if start_date > end_date:
+        raise ValueError('Start date must not be after end date')
+    if (end_date - start_date).days >= MAX_SERIES_DAYS:
+        raise ValueError(f'Range is limited to {MAX_SERIES_DAYS} days')
+
+    columns = ['date'] + SUMMARY_FIELDS
+    frame = pd.DataFrame.from_records(
+        [[getattr(summary, name) for name in columns] for summary in summaries_between(start_date, end_date)],
+        columns=columns,
+    ).set_index('date')
+    frame['closing_stock'] = frame['closing_kg']
+    frame['total_mortality'] = frame['male_mortality'] + frame['female_mortality']
+    if 'water_intake' in metrics:
+        water = _daily_sums(DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]), 'water_intake')
+        frame['water_intake'] = water.reindex(frame.index).fillna(0)
+
+    series = {'dates': [day.isoformat() for day in frame.index]}
+    for name in metrics:
+        series[name] = frame[name].round(2).tolist()
+    return series
+
+
+def dashboard_metrics(date, request=None):
+    """Dashboard figures of date, rounded for display (memoised on request and briefly in the cache)"""
+    memo = getattr(request, '_dashboard_metrics', None)
+    if memo is None:
+        memo = {}
+        if request is not None:
+            request._dashboard_metrics = memo
+    if date not in memo:
+        versions = hashlib.sha256(str(data_versions(DASHBOARD_SOURCES)).encode()).hexdigest()
+        key = f'dashboard-metrics:{date}:{versions}'
+        metrics = cache.get(key)
+        if metrics is None:
+            metrics = _dashboard_metrics(date)
+            cache.set(key, metrics, METRICS_TIMEOUT)
+        memo[date] = metrics
+    return memo[date]
+
+
+def _dashboard_metrics(date):
+    summary = summary_on(date)
+    closing_stock = round(summary.closing_kg, 2)
+    return {
+        'siaf_total_tray_eggs': summary.tray_eggs,
+        'siaf_total_eggs': summary.total_eggs,
+        'siaf_record_exists': summary.siaf_record_exists,
+        'male_current_birds': summary.male_birds,
+        'female_current_birds': summary.female_birds,
+        'total_current_birds': summary.total_birds,
+        'male_total_mortality': summary.male_mortality_to_date,
+        'female_total_mortality': summary.female_mortality_to_date,
+        'male_today_mortality': summary.male_mortality,
+        'female_today_mortality': summary.female_mortality,
+        'total_mortality': summary.total_mortality_to_date,
+        'feed_per_gram_per_bird': round(summary.feed_per_gram_per_bird, 2),
+        'male_feed_per_bird': round(summary.male_feed_per_bird, 2),
+        'female_feed_per_bird': round(summary.female_feed_per_bird, 2),
+        'egg_percentage': round(summary.egg_percentage, 2),
+        'total_feed_today': summary.feed_kg,
+        'closing_stock': closing_stock,
+        'closing_bundles': round(closing_stock / 60, 2),
+    }
+
+
+def live_summary(date):
+    """Summary figures of date computed straight from the source tables (reference for the check)"""
+    siaf_record = DailyRecordSIAF.objects.filter(date=date).first()
+    headcount = headcount_on(date)
+    values = {
+        'siaf_record_exists': siaf_record is not None,
+        'tray_eggs': 0,
+        'total_eggs': 0,
+        'feed_kg': 0,
+        'male_feed_kg': 0,
+        'female_feed_kg': 0,
+        'feed_per_gram_per_bird': 0,
+        'male_feed_per_bird': 0,
+        'female_feed_per_bird': 0,
+        'egg_percentage': 0,
+    }
+    for sex, _, mortality_model in FLOCKS:
+        values[f'{sex}_birds'] = headcount[sex]['alive']
+        values[f'{sex}_mortality_to_date'] = headcount[sex]['mortality']
+        values[f'{sex}_mortality'] = mortality_model.objects.filter(date=date).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
+    values['total_birds'] = values['male_birds'] + values['female_birds']
+    values['total_mortality_to_date'] = values['male_mortality_to_date'] + values['female_mortality_to_date']
+
+    if siaf_record:
+        values['tray_eggs'] = (siaf_record.tray_egg_morning or 0) + (siaf_record.tray_egg_evening or 0)
+        values['total_eggs'] = siaf_record.total_eggs
+        values['feed_kg'] = siaf_record.effective_feed_kg
+        values['male_feed_kg'] = siaf_record.male_feed_kg
+        values['female_feed_kg'] = siaf_record.female_feed_kg
+        if values['total_birds'] > 0:
+            values['feed_per_gram_per_bird'] = siaf_record.effective_feed_kg * 1000 / values['total_birds']
+            if values['male_birds'] > 0:
+                values['male_feed_per_bird'] = siaf_record.male_feed_kg * 1000 / values['male_birds']
+            if values['female_birds'] > 0:
+                values['female_feed_per_bird'] = siaf_record.female_feed_kg * 1000 / values['female_birds']
+        if values['female_birds'] > 0:
+            values['egg_percentage'] = siaf_record.total_eggs / values['female_birds'] * 100
+
+    values['closing_kg'] = closing_stock_on(date)[2]
+    values['egg_out'] = EggOut.objects.filter(date=date).aggregate(models.Sum('egg_out_count'))['egg_out_count__sum'] or 0
+    return values
+
+
+def check_daily_summary(start_date=None, end_date=None):
+    """
+    Compare stored rows in the range (all of them by default) with live_summary().
+
+    Returns a list of (date, field, stored, expected) mismatches. Days without a
+    row are not reported: summary_on() computes them on first use.
+    """
+    summaries = DailyFarmSummary.objects.order_by('date')
+    if start_date:
+        summaries = summaries.filter(date__gte=start_date)
+    if end_date:
+        summaries = summaries.filter(date__lte=end_date)
+
+    mismatches = []
+    for summary in summaries.iterator():
+        for name, expected in live_summary(summary.date).items():
+            value = getattr(summary, name)
+            if not math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-6):
+                mismatches.append((summary.date, name, value, expected))
+    return mismatches
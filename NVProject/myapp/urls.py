@@ -9,8 +9,10 @@ urlpatterns = [
     path("report/", views.report, name="report"), # report page
     path("feed/", views.feed, name="feed"), # feed page
     path("SIAF/", views.SIAF, name="SIAF"), # SIAF page (SIAF)
+    path("SIAF/fields/", views.SIAF_fields, name="SIAF_fields"),
     path("fetch-record-SIAF/", views.fetch_record_SIAF, name="fetch_record_SIAF"),
     path("dashboard-data/", views.dashboard_data, name="dashboard_data"),
+    path("kpi-series/", views.kpi_series_data, name="kpi_series"), # daily figures for trend charts
     path("report-data/", views.report_data, name="report_data"), # report data endpoint
     path("download-excel/", views.download_excel, name="download_excel"), # excel download endpoint
     path("add-user/", views.add_user, name="add_user"),
@@ -38,6 +40,7 @@ urlpatterns = [
     path("male-birds-mortality-delete/<int:mortality_id>/", views.male_birds_mortality_delete, name="male_birds_mortality_delete"),
     # Male Birds Dashboard & Report URLs
     path("male-birds-dashboard/", views.male_birds_dashboard, name="male_birds_dashboard"),
+    path("male-birds-bootstrap/", views.male_birds_bootstrap, name="male_birds_bootstrap"),
     path("male-birds-report-data/", views.male_birds_report_data, name="male_birds_report_data"),
     path("male-birds-download-excel/", views.male_birds_download_excel, name="male_birds_download_excel"),
 
@@ -53,6 +56,7 @@ urlpatterns = [
     path("female-birds-mortality-delete/<int:mortality_id>/", views.female_birds_mortality_delete, name="female_birds_mortality_delete"),
     # Female Birds Dashboard & Report URLs
     path("female-birds-dashboard/", views.female_birds_dashboard, name="female_birds_dashboard"),
+    path("female-birds-bootstrap/", views.female_birds_bootstrap, name="female_birds_bootstrap"),
     path("female-birds-report-data/", views.female_birds_report_data, name="female_birds_report_data"),
     path("female-birds-download-excel/", views.female_birds_download_excel, name="female_birds_download_excel"),
     
@@ -64,9 +68,17 @@ urlpatterns = [
     path("eggout-dashboard/", views.eggout_dashboard, name="eggout_dashboard"),
     path("eggout-download-excel/", views.eggout_download_excel, name="eggout_download_excel"),
 
+    # Bulk save of records of any type (back-filling)
+    path("records-bulk/", views.records_bulk, name="records_bulk"),
+    path("import-records/", views.import_records, name="import_records"), # CSV/XLSX history import
+
     # Backup & Restore URLs
     path("export-backup/", views.export_backup, name="export_backup"),
     path("import-backup/", views.import_backup, name="import_backup"),
 
     path("backup/", views.backup, name="backup"),
+    # Background Export Job URLs
+    path("export-jobs/submit/", views.export_job_submit, name="export_job_submit"),
+    path("export-jobs/<int:job_id>/status/", views.export_job_status, name="export_job_status"),
+    path("export-jobs/<int:job_id>/download/", views.export_job_download, name="export_job_download"),
 ]
@@ -6,14 +6,27 @@ from django.views.decorators.cache import cache_control
 from django.http import JsonResponse
 from django.utils import timezone
 from django.db import models
-from .models import DailyRecordSIAF, FemaleBirdsMortality,FemaleBirdsStock, FeedStock, MaleBirdsStock, MaleBirdsMortality, EggOut
+from .models import DailyRecordSIAF, FemaleBirdsMortality,FemaleBirdsStock, FeedStock, MaleBirdsStock, MaleBirdsMortality, EggOut, ExportJob
+from .autosave import SIAF_FIELDS, InvalidFields, parse_siaf_fields, save_siaf_fields
+from .backup import (
+    TOMBSTONE_RETENTION, BackupError, backup_stream, backup_watermark, merge_backup, read_backup, restore_backup,
+)
+from .bulk import InvalidRecords, save_records
+from .analytics import add_flock_columns, add_mortality, frame_records, siaf_frame, to_frame
+from .caching import cached_response, conditional_on
+from .pagination import InvalidPageRequest, keyset_page
+from .exports import egg_out_export, export_response, feed_stock_export, flock_export, siaf_export, wants_csv
+from .jobs import EXPORTS, job_status, parse_params, submit_export
+from .imports import ImportFileError, import_file
+from .ledger import closing_stock_on
+from .snapshot import restore_snapshot, write_snapshot
+from .summary import DASHBOARD_SOURCES, dashboard_metrics, kpi_series
 from datetime import datetime, timedelta
 import pandas as pd
 from django.contrib.auth.models import User, Group
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 import json
+import tempfile
 from django.core import serializers
 
 
@@ -54,137 +67,20 @@ def dashboard(request):
     except ValueError:
         selected_date = timezone.now().date()
     
-    # Get SIAF (SIAF) record
-    siaf_record = DailyRecordSIAF.objects.filter(date=selected_date).first()
-    
-    # Calculate totals for SIAF
-    siaf_total_tray_eggs = 0
-    siaf_total_eggs = 0
-    if siaf_record:
-        siaf_total_tray_eggs = (siaf_record.tray_egg_morning or 0) + (siaf_record.tray_egg_evening or 0)
-        siaf_total_eggs = (siaf_record.total_egg_morning or 0) + (siaf_record.total_egg_evening or 0)
-    
-    # Set default values for bird counts (no BirdsCount model - removed)
-    initial_siaf_birds = 0
-    current_siaf_birds = 0
-    siaf_mortality = 0
-    
-    # Calculate percentages
-    eggs_per_current_birds = 0
-    eggs_per_initial_birds = 0
-    
-    # Calculate male and female bird counts for active batches
-    male_current_birds = 0
-    female_current_birds = 0
-    total_current_birds = 0
-    male_total_mortality = 0
-    female_total_mortality = 0
-    male_today_mortality = 0
-    female_today_mortality = 0
-    total_mortality = 0
-    
-    active_male_batches = MaleBirdsStock.objects.filter(status='active')
-    active_female_batches = FemaleBirdsStock.objects.filter(status='active')
-    
-    for batch in active_male_batches:
-        male_current_birds += batch.get_current_birds()
-        male_total_mortality += batch.get_current_mortality()
-    
-    # Get today's male mortality
-    male_today_mortality = MaleBirdsMortality.objects.filter(date=selected_date).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-    
-    for batch in active_female_batches:
-        female_current_birds += batch.get_current_birds()
-        female_total_mortality += batch.get_current_mortality()
-    
-    # Get today's female mortality
-    female_today_mortality = FemaleBirdsMortality.objects.filter(date=selected_date).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-    
-    total_current_birds = male_current_birds + female_current_birds
-    total_mortality = male_total_mortality + female_total_mortality
-    
-    # Calculate feed per gram per bird
-    feed_per_gram_per_bird = 0
-    male_feed_per_bird = 0
-    female_feed_per_bird = 0
-    
-    if siaf_record and total_current_birds > 0:
-        # Use new fields if available, otherwise use legacy fields
-        male_feed = (siaf_record.feed_male_morning or 0) + (siaf_record.feed_male_evening or 0)
-        female_feed = (siaf_record.feed_female_morning or 0) + (siaf_record.feed_female_evening or 0)
-        legacy_feed = (siaf_record.feed_morning or 0) + (siaf_record.feed_evening or 0)
-        total_feed_kg = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
-        total_feed_grams = total_feed_kg * 1000
-        feed_per_gram_per_bird = round(total_feed_grams / total_current_birds, 2)
-        
-        # Calculate male feed per bird
-        if male_current_birds > 0:
-            male_feed_grams = male_feed * 1000
-            male_feed_per_bird = round(male_feed_grams / male_current_birds, 2)
-        
-        # Calculate female feed per bird
-        if female_current_birds > 0:
-            female_feed_grams = female_feed * 1000
-            female_feed_per_bird = round(female_feed_grams / female_current_birds, 2)
-    
-    # Calculate egg percentage (total eggs / female birds * 100)
-    egg_percentage = 0
-    if siaf_record:
-        total_eggs = (siaf_record.total_egg_morning or 0) + (siaf_record.total_egg_evening or 0)
-        if female_current_birds > 0:
-            egg_percentage = round((total_eggs / female_current_birds) * 100, 2)
-        else:
-            egg_percentage = 0
-    
-    # Calculate total feed taken today
-    total_feed_today = 0
-    if siaf_record:
-        male_feed = (siaf_record.feed_male_morning or 0) + (siaf_record.feed_male_evening or 0)
-        female_feed = (siaf_record.feed_female_morning or 0) + (siaf_record.feed_female_evening or 0)
-        legacy_feed = (siaf_record.feed_morning or 0) + (siaf_record.feed_evening or 0)
-        total_feed_today = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
-    
-    # Calculate closing stock
-    total_stock_received = FeedStock.objects.filter(date__lte=selected_date).aggregate(models.Sum('kg'))['kg__sum'] or 0
-    siaf_records = DailyRecordSIAF.objects.filter(date__lte=selected_date)
-    total_feed_used = 0
-    for rec in siaf_records:
-        male_feed = (rec.feed_male_morning or 0) + (rec.feed_male_evening or 0)
-        female_feed = (rec.feed_female_morning or 0) + (rec.feed_female_evening or 0)
-        legacy_feed = (rec.feed_morning or 0) + (rec.feed_evening or 0)
-        if male_feed > 0 or female_feed > 0:
-            total_feed_used += male_feed + female_feed
-        else:
-            total_feed_used += legacy_feed
-    closing_stock = round(total_stock_received - total_feed_used, 2)
-    closing_bundles = round(closing_stock / 60, 2)
-    
+    # All dashboard figures come from the precomputed daily summary; the page
+    # script starts from the embedded copy instead of fetching /dashboard-data/
+    metrics = dashboard_metrics(selected_date, request)
     context = {
         'user_groups': user_groups,
         'u': u,
         'today_date': selected_date,
-        'siaf_total_tray_eggs': siaf_total_tray_eggs,
-        'siaf_total_eggs': siaf_total_eggs,
-        'siaf_record_exists': siaf_record is not None,
-        'current_siaf_birds': current_siaf_birds,
-        'initial_siaf_birds': initial_siaf_birds,
-        'eggs_per_current_birds': round(eggs_per_current_birds, 2),
-        'eggs_per_initial_birds': round(eggs_per_initial_birds, 2),
-        'male_current_birds': male_current_birds,
-        'female_current_birds': female_current_birds,
-        'total_current_birds': total_current_birds,
-        'male_total_mortality': male_total_mortality,
-        'female_total_mortality': female_total_mortality,
-        'male_today_mortality': male_today_mortality,
-        'female_today_mortality': female_today_mortality,
-        'total_mortality': total_mortality,
-        'feed_per_gram_per_bird': feed_per_gram_per_bird,
-        'male_feed_per_bird': male_feed_per_bird,
-        'female_feed_per_bird': female_feed_per_bird,
-        'egg_percentage': egg_percentage,
-        'total_feed_today': total_feed_today,
-        'closing_stock': closing_stock,
-        'closing_bundles': closing_bundles
+        # No BirdsCount model - removed
+        'current_siaf_birds': 0,
+        'initial_siaf_birds': 0,
+        'eggs_per_current_birds': 0,
+        'eggs_per_initial_birds': 0,
+        'dashboard_metrics': metrics,
+        **metrics,
     }
     
     return render(request, "dashboard.html", context)
@@ -217,6 +113,77 @@ def females(request):
     u = request.user
     return render(request, "females.html", {'user_groups': user_groups, 'u': u})
 
+
+# Columns returned by report_data for each SIAF record
+REPORT_FIELDS = (
+    'date',
+    'feed_male_morning', 'feed_male_evening',
+    'feed_female_morning', 'feed_female_evening',
+    'feed_morning', 'feed_evening',
+    'water_intake',
+    'tray_egg_morning', 'tray_egg_evening',
+    'total_egg_morning', 'total_egg_evening',
+)
+# Generated totals read for the derived report columns
+REPORT_TOTALS = ('effective_feed_kg', 'male_feed_kg', 'female_feed_kg', 'total_eggs')
+REPORT_DERIVED = ('feed_total', 'feed_per_gram_per_bird', 'egg_percentage')
+
+
+def _report_range(request):
+    """Validated start_date/end_date of a report request (ValueError when missing or invalid)"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    if not all([start_date, end_date]):
+        raise ValueError('Missing required parameters')
+    return datetime.strptime(start_date, '%Y-%m-%d').date(), datetime.strptime(end_date, '%Y-%m-%d').date()
+
+
+# Rows each list and report endpoint reads, for its conditional GET validators
+def _report_sources(request):
+    start_date, end_date = _report_range(request)
+    # Birds alive on a date depend on every batch and all mortality up to it
+    return [
+        DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]),
+        MaleBirdsStock.objects.all(),
+        FemaleBirdsStock.objects.all(),
+        MaleBirdsMortality.objects.filter(date__lte=end_date),
+        FemaleBirdsMortality.objects.filter(date__lte=end_date),
+    ]
+
+
+def _feed_stock_report_sources(request):
+    start_date, end_date = _report_range(request)
+    return [FeedStock.objects.filter(date__range=[start_date, end_date])]
+
+
+def _flock_report_sources(stock_model, mortality_model):
+    def sources(request):
+        start_date, end_date = _report_range(request)
+        return [mortality_model.objects.filter(date__range=[start_date, end_date]), stock_model.objects.all()]
+    return sources
+
+
+def _filtered_rows(queryset, request):
+    """queryset narrowed by the optional start_date, end_date and batch_id query parameters"""
+    if request.GET.get('start_date'):
+        queryset = queryset.filter(date__gte=datetime.strptime(request.GET['start_date'], '%Y-%m-%d').date())
+    if request.GET.get('end_date'):
+        queryset = queryset.filter(date__lte=datetime.strptime(request.GET['end_date'], '%Y-%m-%d').date())
+    if request.GET.get('batch_id'):
+        queryset = queryset.filter(batch_id=int(request.GET['batch_id']))
+    return queryset
+
+
+def _eggout_list_sources(request):
+    return [_filtered_rows(EggOut.objects.all(), request)]
+
+
+def _mortality_list_sources(mortality_model):
+    return lambda request: [_filtered_rows(mortality_model.objects.all(), request)]
+
+
+@login_required
+@conditional_on(_report_sources)
 def report_data(request):
     
     if request.method == 'GET':
@@ -230,63 +197,27 @@ def report_data(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-            # Query SIAF (SIAF breed) records for the date range
-            records = DailyRecordSIAF.objects.filter(
-                date__range=[start_date, end_date]
-            ).order_by('-date')
+            if wants_csv(request):
+                return export_response(request, f'siaf_report_{start_date}_to_{end_date}', siaf_export(start_date, end_date))
 
-            # Convert records to list of dictionaries
-            data = []
-            for record in records:
-                # Calculate feed per gram per bird for this record
-                feed_per_gram_per_bird = 0
-                total_current_birds = 0
-                
-                # Get active male and female batches for the record date
-                active_male_batches = MaleBirdsStock.objects.filter(status='active')
-                active_female_batches = FemaleBirdsStock.objects.filter(status='active')
-                
-                for batch in active_male_batches:
-                    total_current_birds += batch.get_current_birds()
-                
-                for batch in active_female_batches:
-                    total_current_birds += batch.get_current_birds()
-                
-                # Calculate total feed (new fields take priority, fall back to legacy)
-                male_feed = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                female_feed = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                legacy_feed = (record.feed_morning or 0) + (record.feed_evening or 0)
-                
-                if male_feed > 0 or female_feed > 0:
-                    total_feed_kg = male_feed + female_feed
-                else:
-                    total_feed_kg = legacy_feed
-                
-                if total_current_birds > 0:
-                    total_feed_grams = total_feed_kg * 1000
-                    feed_per_gram_per_bird = round(total_feed_grams / total_current_birds, 2)
-                
-                data.append({
-                    'date': record.date,
-                    'feed_male_morning': record.feed_male_morning,
-                    'feed_male_evening': record.feed_male_evening,
-                    'feed_female_morning': record.feed_female_morning,
-                    'feed_female_evening': record.feed_female_evening,
-                    'feed_morning': record.feed_morning,
-                    'feed_evening': record.feed_evening,
-                    'feed_total': total_feed_kg,
-                    'water_intake': record.water_intake,
-                    'tray_egg_morning': record.tray_egg_morning,
-                    'tray_egg_evening': record.tray_egg_evening,
-                    'total_egg_morning': record.total_egg_morning,
-                    'total_egg_evening': record.total_egg_evening,
-                    'feed_per_gram_per_bird': feed_per_gram_per_bird,
-                })
+            # 1) One query for a page of the range's records
+            records, next_cursor = keyset_page(
+                DailyRecordSIAF.objects.filter(date__range=[start_date, end_date]).values('id', *REPORT_FIELDS, *REPORT_TOTALS),
+                request,
+            )
+
+            # 2) Birds alive and per-bird figures for the page, as column operations
+            frame = add_flock_columns(to_frame(records, ('id',) + REPORT_FIELDS + REPORT_TOTALS))
+            frame['feed_total'] = frame['effective_feed_kg']
+            data = frame_records(frame, ('id',) + REPORT_FIELDS + REPORT_DERIVED)
 
             return JsonResponse({
                 'success': True,
-                'records': data
+                'records': data,
+                'next_cursor': next_cursor
             })
+        except InvalidPageRequest as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
         except Exception as e:
@@ -310,67 +241,13 @@ def SIAF(request):
 
     if request.method == 'POST':
         try:
-            # Get or create a record for the specified date
+            # The record's date (today when not given)
             date_str = request.POST.get('date')
             date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.now().date()
-            record, created = DailyRecordSIAF.objects.get_or_create(date=date)
-            
-            # Feed Data - Male Birds
-            record.feed_male_morning = float(request.POST.get('feed_male_morning')) if request.POST.get('feed_male_morning') else None
-            record.feed_male_morning_bundles = float(request.POST.get('feed_male_morning_bundles')) if request.POST.get('feed_male_morning_bundles') else None
-            record.feed_male_evening = float(request.POST.get('feed_male_evening')) if request.POST.get('feed_male_evening') else None
-            record.feed_male_evening_bundles = float(request.POST.get('feed_male_evening_bundles')) if request.POST.get('feed_male_evening_bundles') else None
-            
-            # Feed Data - Female Birds
-            record.feed_female_morning = float(request.POST.get('feed_female_morning')) if request.POST.get('feed_female_morning') else None
-            record.feed_female_morning_bundles = float(request.POST.get('feed_female_morning_bundles')) if request.POST.get('feed_female_morning_bundles') else None
-            record.feed_female_evening = float(request.POST.get('feed_female_evening')) if request.POST.get('feed_female_evening') else None
-            record.feed_female_evening_bundles = float(request.POST.get('feed_female_evening_bundles')) if request.POST.get('feed_female_evening_bundles') else None
-            
-            # Legacy feed data (for backward compatibility)
-            record.feed_morning = int(request.POST.get('feed_morning')) if request.POST.get('feed_morning') else None
-            record.feed_morning_bundles = float(request.POST.get('feed_morning_bundles')) if request.POST.get('feed_morning_bundles') else None
-            record.feed_evening = int(request.POST.get('feed_evening')) if request.POST.get('feed_evening') else None
-            record.feed_evening_bundles = float(request.POST.get('feed_evening_bundles')) if request.POST.get('feed_evening_bundles') else None
-            record.water_intake = float(request.POST.get('water_intake')) if request.POST.get('water_intake') else None
-            
-            # Egg Collection Data - Morning
-            record.tray_egg_morning = float(request.POST.get('tray_egg_morning')) if request.POST.get('tray_egg_morning') else None
-            record.total_egg_morning = float(request.POST.get('total_egg_morning')) if request.POST.get('total_egg_morning') else None
-            record.damaged_egg_morning = int(request.POST.get('damaged_egg_morning')) if request.POST.get('damaged_egg_morning') else None
-            record.double_egg_morning = int(request.POST.get('double_egg_morning')) if request.POST.get('double_egg_morning') else None
-            
-            # Egg Collection Data - Evening
-            record.tray_egg_evening = float(request.POST.get('tray_egg_evening')) if request.POST.get('tray_egg_evening') else None
-            record.total_egg_evening = float(request.POST.get('total_egg_evening')) if request.POST.get('total_egg_evening') else None
-            record.damaged_egg_evening = int(request.POST.get('damaged_egg_evening')) if request.POST.get('damaged_egg_evening') else None
-            record.double_egg_evening = int(request.POST.get('double_egg_evening')) if request.POST.get('double_egg_evening') else None
-            
-            # Equipment Status
-            record.artificial_insemination = request.POST.get('artificial_insemination', 'No')
-            record.ai_hours = float(request.POST.get('ai_hours')) if request.POST.get('ai_hours') else None
-            record.ai_birds_count = int(request.POST.get('ai_birds_count')) if request.POST.get('ai_birds_count') else None
-            record.fogger_used = request.POST.get('fogger_used', 'No')
-            record.fogger_hours = float(request.POST.get('fogger_hours')) if request.POST.get('fogger_hours') else None
-            record.fan_used = request.POST.get('fan_used', 'No')
-            record.fan_hours = float(request.POST.get('fan_hours')) if request.POST.get('fan_hours') else None
-            record.light_used = request.POST.get('light_used', 'No')
-            record.light_hours = float(request.POST.get('light_hours')) if request.POST.get('light_hours') else None
-            
-            # Other Metrics
-            record.medicine = request.POST.get('medicine')
-            record.notes = request.POST.get('notes')
-            
-            # Temperature Data (Fahrenheit)
-            record.temperature_1 = float(request.POST.get('temperature_1')) if request.POST.get('temperature_1') else None
-            record.temperature_2 = float(request.POST.get('temperature_2')) if request.POST.get('temperature_2') else None
-            record.temperature_3 = float(request.POST.get('temperature_3')) if request.POST.get('temperature_3') else None
-            record.temperature_4 = float(request.POST.get('temperature_4')) if request.POST.get('temperature_4') else None
-            record.temperature_5 = float(request.POST.get('temperature_5')) if request.POST.get('temperature_5') else None
-            record.temperature_6 = float(request.POST.get('temperature_6')) if request.POST.get('temperature_6') else None
-            
-            # Save the record
-            record.save()
+            # Every field of the form, parsed and written in one upsert (the feed ledger and
+            # daily summary follow through myapp.signals)
+            values = parse_siaf_fields({name: request.POST.get(name) for name in SIAF_FIELDS})
+            save_siaf_fields(date, values)
             messages.success(request, 'Daily record for SIAF saved successfully!')
             return redirect('SIAF')  # Stay on the same page
             
@@ -380,6 +257,37 @@ def SIAF(request):
     return render(request, "SIAF.html", {'user_groups': user_groups, 'u': u})
 
 @login_required
+def SIAF_fields(request):
+    """
+    Autosave: save only the fields given in a JSON body {"date": "YYYY-MM-DD",
+    "fields": {...}} to the SIAF record of that date (see myapp.autosave)
+    """
+    if request.method == 'PATCH':
+        try:
+            try:
+                body = json.loads(request.body)
+                date = datetime.strptime(body['date'], '%Y-%m-%d').date()
+                fields = body['fields']
+                if not isinstance(fields, dict):
+                    raise TypeError
+            except (ValueError, TypeError, KeyError):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Body must be a JSON object with a date (YYYY-MM-DD) and a fields object',
+                }, status=400)
+            save_siaf_fields(date, parse_siaf_fields(fields))
+            return JsonResponse({'success': True, 'message': f'{len(fields)} field(s) saved', 'fields': sorted(fields)})
+        except InvalidFields as e:
+            return JsonResponse({'success': False, 'message': str(e), 'errors': e.errors}, status=400)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+@login_required
+@cached_response(*DASHBOARD_SOURCES)
 def dashboard_data(request):
     if request.method == 'GET':
         try:
@@ -391,126 +299,36 @@ def dashboard_data(request):
                 })
 
             date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            siaf_record = DailyRecordSIAF.objects.filter(date=date).first()
-
-            # Calculate totals for SIAF
-            siaf_total_tray_eggs = 0
-            siaf_total_eggs = 0
-            if siaf_record:
-                siaf_total_tray_eggs = (siaf_record.tray_egg_morning or 0) + (siaf_record.tray_egg_evening or 0)
-                siaf_total_eggs = (siaf_record.total_egg_morning or 0) + (siaf_record.total_egg_evening or 0)
-
-            # Calculate male and female bird counts for active batches
-            male_current_birds = 0
-            female_current_birds = 0
-            male_total_mortality = 0
-            female_total_mortality = 0
-            male_today_mortality = 0
-            female_today_mortality = 0
-            
-            active_male_batches = MaleBirdsStock.objects.filter(status='active')
-            active_female_batches = FemaleBirdsStock.objects.filter(status='active')
-            
-            for batch in active_male_batches:
-                male_current_birds += batch.get_current_birds()
-                male_total_mortality += batch.get_current_mortality()
-            
-            # Get today's male mortality
-            male_today_mortality = MaleBirdsMortality.objects.filter(date=date).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-            
-            for batch in active_female_batches:
-                female_current_birds += batch.get_current_birds()
-                female_total_mortality += batch.get_current_mortality()
-            
-            # Get today's female mortality
-            female_today_mortality = FemaleBirdsMortality.objects.filter(date=date).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-            
-            total_current_birds = male_current_birds + female_current_birds
-            total_mortality = male_total_mortality + female_total_mortality
-
-            # Calculate feed per gram per bird
-            feed_per_gram_per_bird = 0
-            male_feed_per_bird = 0
-            female_feed_per_bird = 0
-            total_feed_today = 0
-            
-            if siaf_record and total_current_birds > 0:
-                # Use new fields if available, otherwise use legacy fields
-                male_feed = (siaf_record.feed_male_morning or 0) + (siaf_record.feed_male_evening or 0)
-                female_feed = (siaf_record.feed_female_morning or 0) + (siaf_record.feed_female_evening or 0)
-                legacy_feed = (siaf_record.feed_morning or 0) + (siaf_record.feed_evening or 0)
-                total_feed_today = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
-                
-                total_feed_grams = total_feed_today * 1000
-                feed_per_gram_per_bird = round(total_feed_grams / total_current_birds, 2)
-                
-                # Calculate male feed per bird
-                if male_current_birds > 0:
-                    male_feed_grams = male_feed * 1000
-                    male_feed_per_bird = round(male_feed_grams / male_current_birds, 2)
-                
-                # Calculate female feed per bird
-                if female_current_birds > 0:
-                    female_feed_grams = female_feed * 1000
-                    female_feed_per_bird = round(female_feed_grams / female_current_birds, 2)
-            elif siaf_record:
-                # Calculate total feed even without birds for display
-                male_feed = (siaf_record.feed_male_morning or 0) + (siaf_record.feed_male_evening or 0)
-                female_feed = (siaf_record.feed_female_morning or 0) + (siaf_record.feed_female_evening or 0)
-                legacy_feed = (siaf_record.feed_morning or 0) + (siaf_record.feed_evening or 0)
-                total_feed_today = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
-
-            # Calculate egg percentage (total eggs / female birds * 100)
-            egg_percentage = 0
-            if siaf_record:
-                total_eggs = (siaf_record.total_egg_morning or 0) + (siaf_record.total_egg_evening or 0)
-                if female_current_birds > 0:
-                    egg_percentage = round((total_eggs / female_current_birds) * 100, 2)
-                else:
-                    egg_percentage = 0
-            
-            # Calculate closing stock
-            total_stock_received = FeedStock.objects.filter(date__lte=date).aggregate(models.Sum('kg'))['kg__sum'] or 0
-            siaf_records = DailyRecordSIAF.objects.filter(date__lte=date)
-            total_feed_used = 0
-            for rec in siaf_records:
-                male_feed = (rec.feed_male_morning or 0) + (rec.feed_male_evening or 0)
-                female_feed = (rec.feed_female_morning or 0) + (rec.feed_female_evening or 0)
-                legacy_feed = (rec.feed_morning or 0) + (rec.feed_evening or 0)
-                if male_feed > 0 or female_feed > 0:
-                    total_feed_used += male_feed + female_feed
-                else:
-                    total_feed_used += legacy_feed
-            closing_stock = round(total_stock_received - total_feed_used, 2)
-            closing_bundles = round(closing_stock / 60, 2)
 
+            # All dashboard figures come from the precomputed daily summary
             return JsonResponse({
                 'success': True,
-                'data': {
-                    'siaf_total_tray_eggs': siaf_total_tray_eggs,
-                    'siaf_total_eggs': siaf_total_eggs,
-                    'siaf_record_exists': siaf_record is not None,
-                    'male_current_birds': male_current_birds,
-                    'female_current_birds': female_current_birds,
-                    'total_current_birds': total_current_birds,
-                    'male_total_mortality': male_total_mortality,
-                    'female_total_mortality': female_total_mortality,
-                    'male_today_mortality': male_today_mortality,
-                    'female_today_mortality': female_today_mortality,
-                    'total_mortality': total_mortality,
-                    'feed_per_gram_per_bird': feed_per_gram_per_bird,
-                    'male_feed_per_bird': male_feed_per_bird,
-                    'female_feed_per_bird': female_feed_per_bird,
-                    'egg_percentage': egg_percentage,
-                    'total_feed_today': total_feed_today,
-                    'closing_stock': closing_stock,
-                    'closing_bundles': closing_bundles
-                }
+                'data': dashboard_metrics(date, request)
             })
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
+@login_required
+@cached_response(*DASHBOARD_SOURCES)
+def kpi_series_data(request):
+    """Daily figures over start..end for trend charts; metrics is a comma separated subset"""
+    if request.method == 'GET':
+        try:
+            start_date = request.GET.get('start')
+            end_date = request.GET.get('end')
+            if not start_date or not end_date:
+                return JsonResponse({'success': False, 'message': 'Please provide start and end dates'})
+
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            metrics = [name for name in request.GET.get('metrics', '').split(',') if name]
+
+            return JsonResponse({'success': True, 'data': kpi_series(start_date, end_date, metrics)})
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
 @login_required
 @login_required
 def download_excel(request):
@@ -525,370 +343,56 @@ def download_excel(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-            # Create Excel workbook
-            wb = Workbook()
-            
-            # Define header style
-            header_style = Font(bold=True)
-            header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-
-            # Column headers - Enhanced with temperature, feed per bird, and mortality details
-            headers = ['Date', 'Feed Male Morning', 'Feed Male Evening', 'Feed Female Morning', 'Feed Female Evening', 
-                      'Total Feed', 'Feed Avg', 'Water Intake', 
-                      'Tray Egg Morning', 'Total Egg Morning', 'Damaged Egg Morning', 'Double Egg Morning',
-                      'Tray Egg Evening', 'Total Egg Evening', 'Damaged Egg Evening', 'Double Egg Evening',
-                      'AI Status', 'AI Hours', 'AI Birds Count', 'Fogger Status', 'Fogger Hours',
-                      'Fan Status', 'Fan Hours','Light Status', 'Light Hours', 
-                      'Temp 1 (6AM)', 'Temp 2 (10AM)', 'Temp 3 (2PM)', 'Temp 4 (6PM)', 'Temp 5 (10PM)', 'Temp 6 (2AM)',
-                      'Feed Per Bird (g)', 'Male Mortality', 'Female Mortality', 'Total Mortality',
-                      'Medicine', 'Notes']
-
-            # Create SIAF sheet
-            siaf_sheet = wb.active
-            siaf_sheet.title = 'SIAF'
-            
-            # Add headers
-            for col, header in enumerate(headers, 1):
-                cell = siaf_sheet.cell(row=1, column=col, value=header)
-                cell.font = header_style
-                cell.fill = header_fill
-
-            # Get SIAF (SIAF breed) records
-            siaf_records = DailyRecordSIAF.objects.filter(
-                date__range=[start_date, end_date]
-            ).order_by('date')
-
-            # Add data
-            for row, record in enumerate(siaf_records, 2):
-                siaf_sheet.cell(row=row, column=1, value=record.date.strftime('%Y-%m-%d'))
-                siaf_sheet.cell(row=row, column=2, value=record.feed_male_morning)
-                siaf_sheet.cell(row=row, column=3, value=record.feed_male_evening)
-                siaf_sheet.cell(row=row, column=4, value=record.feed_female_morning)
-                siaf_sheet.cell(row=row, column=5, value=record.feed_female_evening)
-                
-                # Calculate total feed (new fields or legacy)
-                male_feed = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                female_feed = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                legacy_feed = (record.feed_morning or 0) + (record.feed_evening or 0)
-                total_feed = (male_feed + female_feed) if (male_feed > 0 or female_feed > 0) else legacy_feed
-                
-                siaf_sheet.cell(row=row, column=6, value=total_feed)
-                
-                # Calculate feed average (total feed / number of days fed)
-                # Count number of records up to this date that have feed data
-                records_with_feed = DailyRecordSIAF.objects.filter(date__lte=record.date).exclude(
-                    feed_male_morning__isnull=True, feed_male_evening__isnull=True,
-                    feed_female_morning__isnull=True, feed_female_evening__isnull=True,
-                    feed_morning__isnull=True, feed_evening__isnull=True
-                ).count()
-                
-                # Calculate total feed used up to this date
-                total_feed_used_to_date = 0
-                records_to_date = DailyRecordSIAF.objects.filter(date__lte=record.date)
-                for rec in records_to_date:
-                    male_f = (rec.feed_male_morning or 0) + (rec.feed_male_evening or 0)
-                    female_f = (rec.feed_female_morning or 0) + (rec.feed_female_evening or 0)
-                    legacy_f = (rec.feed_morning or 0) + (rec.feed_evening or 0)
-                    total_f = (male_f + female_f) if (male_f > 0 or female_f > 0) else legacy_f
-                    total_feed_used_to_date += total_f
-                
-                feed_average = round(total_feed_used_to_date / records_with_feed, 2) if records_with_feed > 0 else 0
-                siaf_sheet.cell(row=row, column=7, value=feed_average)
-                
-                siaf_sheet.cell(row=row, column=8, value=record.water_intake)
-                siaf_sheet.cell(row=row, column=9, value=record.tray_egg_morning)
-                siaf_sheet.cell(row=row, column=10, value=record.total_egg_morning)
-                siaf_sheet.cell(row=row, column=11, value=record.damaged_egg_morning)
-                siaf_sheet.cell(row=row, column=12, value=record.double_egg_morning)
-                siaf_sheet.cell(row=row, column=13, value=record.tray_egg_evening)
-                siaf_sheet.cell(row=row, column=14, value=record.total_egg_evening)
-                siaf_sheet.cell(row=row, column=15, value=record.damaged_egg_evening)
-                siaf_sheet.cell(row=row, column=16, value=record.double_egg_evening)
-                siaf_sheet.cell(row=row, column=17, value=record.artificial_insemination)
-                siaf_sheet.cell(row=row, column=18, value=record.ai_hours)
-                siaf_sheet.cell(row=row, column=19, value=record.ai_birds_count)
-                siaf_sheet.cell(row=row, column=20, value=record.fogger_used)
-                siaf_sheet.cell(row=row, column=21, value=record.fogger_hours)
-                siaf_sheet.cell(row=row, column=22, value=record.fan_used)
-                siaf_sheet.cell(row=row, column=23, value=record.fan_hours)
-                siaf_sheet.cell(row=row, column=24, value=record.light_used)
-                siaf_sheet.cell(row=row, column=25, value=record.light_hours)
-                # Temperature readings
-                siaf_sheet.cell(row=row, column=26, value=record.temperature_1)
-                siaf_sheet.cell(row=row, column=27, value=record.temperature_2)
-                siaf_sheet.cell(row=row, column=28, value=record.temperature_3)
-                siaf_sheet.cell(row=row, column=29, value=record.temperature_4)
-                siaf_sheet.cell(row=row, column=30, value=record.temperature_5)
-                siaf_sheet.cell(row=row, column=31, value=record.temperature_6)
-                
-                # Calculate feed per bird
-                feed_per_gram_per_bird = 0
-                active_male_batches = MaleBirdsStock.objects.filter(status='active')
-                active_female_batches = FemaleBirdsStock.objects.filter(status='active')
-                
-                male_current_birds = sum(batch.get_current_birds() for batch in active_male_batches)
-                female_current_birds = sum(batch.get_current_birds() for batch in active_female_batches)
-                total_current_birds = male_current_birds + female_current_birds
-                
-                if total_current_birds > 0:
-                    # Use new fields if available, otherwise fall back to legacy fields
-                    male_feed_total = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                    female_feed_total = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                    legacy_feed_total = (record.feed_morning or 0) + (record.feed_evening or 0)
-                    total_feed_kg = (male_feed_total + female_feed_total) if (male_feed_total > 0 or female_feed_total > 0) else legacy_feed_total
-                    total_feed_grams = total_feed_kg * 1000
-                    feed_per_gram_per_bird = round(total_feed_grams / total_current_birds, 2)
-                
-                # Get mortality counts for the date
-                male_mortality_total = MaleBirdsMortality.objects.filter(date=record.date).aggregate(
-                    models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                female_mortality_total = FemaleBirdsMortality.objects.filter(date=record.date).aggregate(
-                    models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                total_mortality = male_mortality_total + female_mortality_total
-                
-                # Feed per bird
-                siaf_sheet.cell(row=row, column=32, value=feed_per_gram_per_bird)
-                # Male mortality
-                siaf_sheet.cell(row=row, column=33, value=male_mortality_total)
-                # Female mortality
-                siaf_sheet.cell(row=row, column=34, value=female_mortality_total)
-                # Total mortality
-                siaf_sheet.cell(row=row, column=35, value=total_mortality)
-                
-                siaf_sheet.cell(row=row, column=36, value=record.medicine)
-                siaf_sheet.cell(row=row, column=37, value=record.notes)
-
-            # Add totals for SIAF sheet
-            ws = siaf_sheet
-            last_row = ws.max_row
-            
-            # Add a blank row
-            last_row += 1
-            
-            # Add total row with bold formatting
-            total_row = last_row + 1
-            total_font = Font(bold=True)
-            total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-            
-            ws.cell(row=total_row, column=1, value="TOTAL").font = total_font
-            ws.cell(row=total_row, column=1).fill = total_fill
-            
-            # Calculate totals for numeric columns
-            numeric_cols = [
-                2, 3, 4, 5, 6, 7, 8,  # Feed (male morning, male evening, female morning, female evening, total, feed avg, water)
-                9, 10, 11, 12,  # Morning Eggs
-                13, 14, 15, 16,  # Evening Eggs
-                18, 19, 21, 23, 25,  # AI Hours, AI Birds Count, Fogger Hours, Fan Hours, Light Hours
-                26, 27, 28, 29, 30, 31,  # Temperature readings
-                32, 33, 34, 35  # Feed per bird, Male Mortality, Female Mortality, Total Mortality
-            ]
-            for col in numeric_cols:
-                total = 0
-                for row in range(2, last_row):  # Start from row 2 to skip header
-                    cell_value = ws.cell(row=row, column=col).value
-                    if isinstance(cell_value, (int, float)):
-                        total += cell_value
-                ws.cell(row=total_row, column=col, value=total)
-                ws.cell(row=total_row, column=col).font = total_font
-                ws.cell(row=total_row, column=col).fill = total_fill
-
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column[0].column_letter].width = adjusted_width
-
-            # Create response
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename=siaf_report_{start_date}_to_{end_date}.xlsx'
-
-            # Save the workbook to the response
-            wb.save(response)
-            return response
+            return export_response(request, f'siaf_report_{start_date}_to_{end_date}', siaf_export(start_date, end_date))
 
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
 
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
+# Stored fields returned by fetch_record_SIAF
+FETCH_RECORD_FIELDS = (
+    'feed_male_morning', 'feed_male_evening', 'feed_female_morning', 'feed_female_evening',
+    'feed_morning', 'feed_evening', 'water_intake', 'male_feed_kg', 'female_feed_kg',
+    'tray_egg_morning', 'total_egg_morning', 'damaged_egg_morning', 'double_egg_morning',
+    'tray_egg_evening', 'total_egg_evening', 'damaged_egg_evening', 'double_egg_evening',
+    'artificial_insemination', 'ai_hours', 'ai_birds_count', 'fogger_used', 'fogger_hours',
+    'fan_used', 'fan_hours', 'light_used', 'light_hours', 'medicine', 'notes',
+    'temperature_1', 'temperature_2', 'temperature_3', 'temperature_4', 'temperature_5', 'temperature_6',
+)
+
+
 @login_required
 def fetch_record_SIAF(request):
     if request.method == 'GET':
         date_str = request.GET.get('date')
         try:
             date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            record = DailyRecordSIAF.objects.filter(date=date).first()
-            
-            if record:
-                # Calculate feed per bird
-                feed_per_gram_per_bird = 0
-                male_feed_per_bird = 0
-                female_feed_per_bird = 0
-                egg_percentage = 0
-                total_current_birds = 0
-                
-                # Calculate male and female bird counts for the specific date
-                # Get all active male batches
-                male_birds_on_date = 0
-                active_male_batches = MaleBirdsStock.objects.filter(status='active')
-                for batch in active_male_batches:
-                    # Only count if batch started before or on this date
-                    if batch.batch_start_date and batch.batch_start_date <= date:
-                        # Only count if batch didn't end before this date
-                        if not batch.batch_end_date or batch.batch_end_date >= date:
-                            # Calculate mortality up to this date
-                            mortality_on_date = MaleBirdsMortality.objects.filter(
-                                date__gte=batch.batch_start_date,
-                                date__lte=date
-                            ).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                            male_birds_on_date += max(0, batch.initial_birds - mortality_on_date)
-                
-                # Get all active female batches
-                female_birds_on_date = 0
-                active_female_batches = FemaleBirdsStock.objects.filter(status='active')
-                for batch in active_female_batches:
-                    # Only count if batch started before or on this date
-                    if batch.batch_start_date and batch.batch_start_date <= date:
-                        # Only count if batch didn't end before this date
-                        if not batch.batch_end_date or batch.batch_end_date >= date:
-                            # Calculate mortality up to this date
-                            mortality_on_date = FemaleBirdsMortality.objects.filter(
-                                date__gte=batch.batch_start_date,
-                                date__lte=date
-                            ).aggregate(models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                            female_birds_on_date += max(0, batch.initial_birds - mortality_on_date)
-                
-                total_birds_on_date = male_birds_on_date + female_birds_on_date
-                
-                if record and total_birds_on_date > 0:
-                    # Get total feed for the day (male + female or legacy)
-                    male_feed = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                    female_feed = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                    legacy_feed = (record.feed_morning or 0) + (record.feed_evening or 0)
-                    
-                    # Use new fields if available, otherwise use legacy
-                    if male_feed > 0 or female_feed > 0:
-                        total_feed_kg = male_feed + female_feed
-                    else:
-                        total_feed_kg = legacy_feed
-                    
-                    total_feed_grams = total_feed_kg * 1000
-                    feed_per_gram_per_bird = round(total_feed_grams / total_birds_on_date, 2)
-                    
-                    # Calculate male and female feed per bird
-                    if male_birds_on_date > 0:
-                        male_feed_kg = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                        male_feed_grams = male_feed_kg * 1000
-                        male_feed_per_bird = round(male_feed_grams / male_birds_on_date, 2)
-                    
-                    if female_birds_on_date > 0:
-                        female_feed_kg = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                        female_feed_grams = female_feed_kg * 1000
-                        female_feed_per_bird = round(female_feed_grams / female_birds_on_date, 2)
-                    
-                    # Calculate egg percentage
-                    total_eggs = (record.total_egg_morning or 0) + (record.total_egg_evening or 0)
-                    if female_birds_on_date > 0:
-                        egg_percentage = round((total_eggs / female_birds_on_date) * 100, 2)
-                
-                # Calculate daily closing stock (total received - total used up to this date)
-                # Get total stock received up to this date
-                total_stock_received = FeedStock.objects.filter(
-                    date__lte=date
-                ).aggregate(models.Sum('kg'))['kg__sum'] or 0
-
-                # Get total feed used up to this date (including all daily records up to and including this date)
-                siaf_records = DailyRecordSIAF.objects.filter(date__lte=date)
-                total_feed_used = 0
-                for rec in siaf_records:
-                    # New fields (male and female)
-                    male_feed = (rec.feed_male_morning or 0) + (rec.feed_male_evening or 0)
-                    female_feed = (rec.feed_female_morning or 0) + (rec.feed_female_evening or 0)
-                    # Legacy fields (for backward compatibility)
-                    legacy_feed = (rec.feed_morning or 0) + (rec.feed_evening or 0)
-                    # Use new fields if available, otherwise use legacy fields
-                    if male_feed > 0 or female_feed > 0:
-                        total_feed_used += male_feed + female_feed
-                    else:
-                        total_feed_used += legacy_feed
-
-                # Calculate daily closing stock
-                daily_closing_stock = round(total_stock_received - total_feed_used, 2)
-                daily_closing_bundles = round(daily_closing_stock / 60, 2)
-                
-                # Get mortality counts for the date
-                male_mortality_total = MaleBirdsMortality.objects.filter(date=date).aggregate(
-                    models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                female_mortality_total = FemaleBirdsMortality.objects.filter(date=date).aggregate(
-                    models.Sum('mortality_count'))['mortality_count__sum'] or 0
-                total_mortality = male_mortality_total + female_mortality_total
-                
-                # Calculate male and female feed bundles and kg
-                male_feed_kg = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                female_feed_kg = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                male_feed_bundles = round(male_feed_kg / 60, 2) if male_feed_kg > 0 else 0
-                female_feed_bundles = round(female_feed_kg / 60, 2) if female_feed_kg > 0 else 0
-                
-                return JsonResponse({
-                    'success': True,
-                    'data': {
-                        'feed_male_morning': record.feed_male_morning,
-                        'feed_male_evening': record.feed_male_evening,
-                        'feed_female_morning': record.feed_female_morning,
-                        'feed_female_evening': record.feed_female_evening,
-                        'feed_morning': record.feed_morning,
-                        'feed_evening': record.feed_evening,
-                        'water_intake': record.water_intake,
-                        'male_feed_kg': male_feed_kg,
-                        'female_feed_kg': female_feed_kg,
-                        'male_feed_bundles': male_feed_bundles,
-                        'female_feed_bundles': female_feed_bundles,
-                        'tray_egg_morning': record.tray_egg_morning,
-                        'total_egg_morning': record.total_egg_morning,
-                        'damaged_egg_morning': record.damaged_egg_morning,
-                        'double_egg_morning': record.double_egg_morning,
-                        'tray_egg_evening': record.tray_egg_evening,
-                        'total_egg_evening': record.total_egg_evening,
-                        'damaged_egg_evening': record.damaged_egg_evening,
-                        'double_egg_evening': record.double_egg_evening,
-                        'artificial_insemination': record.artificial_insemination,
-                        'ai_hours': record.ai_hours,
-                        'ai_birds_count': record.ai_birds_count,
-                        'fogger_used': record.fogger_used,
-                        'fogger_hours': record.fogger_hours,
-                        'fan_used': record.fan_used,
-                        'fan_hours': record.fan_hours,
-                        'light_used': record.light_used,
-                        'light_hours': record.light_hours,
-                        'medicine': record.medicine,
-                        'notes': record.notes,
-                        'temperature_1': record.temperature_1,
-                        'temperature_2': record.temperature_2,
-                        'temperature_3': record.temperature_3,
-                        'temperature_4': record.temperature_4,
-                        'temperature_5': record.temperature_5,
-                        'temperature_6': record.temperature_6,
-                        'feed_per_gram_per_bird': feed_per_gram_per_bird,
-                        'male_feed_per_bird': male_feed_per_bird,
-                        'female_feed_per_bird': female_feed_per_bird,
-                        'egg_percentage': egg_percentage,
-                        'daily_closing_stock': daily_closing_stock,
-                        'daily_closing_bundles': daily_closing_bundles,
-                        'male_mortality': male_mortality_total,
-                        'female_mortality': female_mortality_total,
-                        'total_mortality': total_mortality,
-                        'male_current_birds': male_birds_on_date,
-                        'female_current_birds': female_birds_on_date,
-                        'total_current_birds': total_birds_on_date,
-                    }
+            # The record with its birds, per-bird figures and mortality, from the analytics frame
+            frame = add_mortality(add_flock_columns(siaf_frame(date, date, notes=True)))
+            if not frame.empty:
+                record = frame_records(frame)[0]
+                data = {name: record[name] for name in FETCH_RECORD_FIELDS}
+
+                # Daily closing stock (total received - total used up to this date)
+                daily_closing_stock = round(closing_stock_on(date)[2], 2)
+                data.update({
+                    'male_feed_bundles': round(record['male_feed_kg'] / 60, 2),
+                    'female_feed_bundles': round(record['female_feed_kg'] / 60, 2),
+                    'feed_per_gram_per_bird': record['feed_per_gram_per_bird'],
+                    'male_feed_per_bird': record['male_feed_per_bird'],
+                    'female_feed_per_bird': record['female_feed_per_bird'],
+                    'egg_percentage': record['egg_percentage'],
+                    'daily_closing_stock': daily_closing_stock,
+                    'daily_closing_bundles': round(daily_closing_stock / 60, 2),
+                    'male_mortality': record['male_mortality'],
+                    'female_mortality': record['female_mortality'],
+                    'total_mortality': record['total_mortality'],
+                    'male_current_birds': record['male_birds'],
+                    'female_current_birds': record['female_birds'],
+                    'total_current_birds': record['total_birds'],
                 })
+                return JsonResponse({'success': True, 'data': data})
             return JsonResponse({'success': False, 'message': 'No record found for this date'})
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
@@ -1036,24 +540,6 @@ def feed_stock_save(request):
 
             date = datetime.strptime(date_str, '%Y-%m-%d').date()
 
-            # Calculate closing stock for this date
-            total_stock_received = FeedStock.objects.filter(
-                date__lte=date
-            ).aggregate(models.Sum('kg'))['kg__sum'] or 0
-
-            # Add the current KG if it's a new entry or if we're updating
-            if not feed_stock_id:
-                total_stock_received += kg
-
-            # Calculate total feed used up to this date
-            siaf_feed_used = DailyRecordSIAF.objects.filter(
-                date__lte=date
-            ).aggregate(
-                morning=models.Sum('feed_morning'),
-                evening=models.Sum('feed_evening')
-            )
-            total_feed_used = (siaf_feed_used['morning'] or 0) + (siaf_feed_used['evening'] or 0)
-
             if feed_stock_id:
                 # Update existing record
                 feed_stock = FeedStock.objects.get(id=feed_stock_id)
@@ -1093,6 +579,7 @@ def feed_stock_save(request):
 
 
 @login_required
+@conditional_on(lambda request: [FeedStock.objects.all()])
 def feed_stock_list(request):
     """Get list of recent feed stock entries"""
     if request.method == 'GET':
@@ -1157,6 +644,7 @@ def feed_stock_delete(request, feed_stock_id):
 
 
 @login_required
+@cached_response(FeedStock, DailyRecordSIAF)
 def feed_stock_dashboard(request):
     """Get total feed stock and daily closing stock"""
     if request.method == 'GET':
@@ -1167,45 +655,15 @@ def feed_stock_dashboard(request):
             else:
                 selected_date = timezone.now().date()
 
-            # Calculate total stock received (all FeedStock entries up to selected date)
-            total_stock_received = FeedStock.objects.filter(
-                date__lte=selected_date
-            ).aggregate(models.Sum('kg'))['kg__sum'] or 0
-
-            # Calculate total feed used up to selected date (including both male and female, or legacy fields)
-            siaf_records = DailyRecordSIAF.objects.filter(date__lte=selected_date)
-            total_feed_used = 0
-            for record in siaf_records:
-                # New fields (male and female)
-                male_feed = (record.feed_male_morning or 0) + (record.feed_male_evening or 0)
-                female_feed = (record.feed_female_morning or 0) + (record.feed_female_evening or 0)
-                # Legacy fields (for backward compatibility)
-                legacy_feed = (record.feed_morning or 0) + (record.feed_evening or 0)
-                # Use new fields if available, otherwise use legacy fields
-                if male_feed > 0 or female_feed > 0:
-                    total_feed_used += male_feed + female_feed
-                else:
-                    total_feed_used += legacy_feed
-
-            # Calculate daily closing stock (total received - total used up to selected date)
-            closing_stock_kg = total_stock_received - total_feed_used
+            # Total received, total used and closing stock up to selected date from the feed ledger
+            total_stock_received, total_feed_used, closing_stock_kg = closing_stock_on(selected_date)
             closing_stock_bundles = round(closing_stock_kg / 60, 2)
 
             # Get today's feed usage
             today_siaf = DailyRecordSIAF.objects.filter(date=selected_date).first()
 
-            today_feed_used = 0
-            if today_siaf:
-                # New fields
-                male_feed = (today_siaf.feed_male_morning or 0) + (today_siaf.feed_male_evening or 0)
-                female_feed = (today_siaf.feed_female_morning or 0) + (today_siaf.feed_female_evening or 0)
-                # Legacy fields
-                legacy_feed = (today_siaf.feed_morning or 0) + (today_siaf.feed_evening or 0)
-                # Use new fields if available, otherwise use legacy fields
-                if male_feed > 0 or female_feed > 0:
-                    today_feed_used = male_feed + female_feed
-                else:
-                    today_feed_used = legacy_feed
+            # Male + female feed if recorded, otherwise legacy fields
+            today_feed_used = today_siaf.effective_feed_kg if today_siaf else 0
 
             return JsonResponse({
                 'success': True,
@@ -1230,6 +688,7 @@ def feed_stock_dashboard(request):
 
 
 @login_required
+@conditional_on(_feed_stock_report_sources)
 def feed_stock_report_data(request):
     """Get feed stock report data for date range"""
     if request.method == 'GET':
@@ -1243,6 +702,9 @@ def feed_stock_report_data(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
+            if wants_csv(request):
+                return export_response(request, f'Feed_Stock_Report_{start_date}_to_{end_date}', feed_stock_export(start_date, end_date))
+
             # Query feed stock records for the date range
             records = FeedStock.objects.filter(
                 date__range=[start_date, end_date]
@@ -1285,69 +747,11 @@ def feed_stock_download_excel(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-            # Query feed stock records
-            records = FeedStock.objects.filter(
-                date__range=[start_date, end_date]
-            ).order_by('date')
-
-            # Create Excel workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Feed Stock Report"
-
-            # Add headers with styling
-            headers = ['Date', 'Weight (KG)', 'Bundles', 'Notes']
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF")
-
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col)
-                cell.value = header
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Add data rows
-            total_kg = 0
-            total_bundles = 0
-            for row_idx, record in enumerate(records, 2):
-                ws.cell(row=row_idx, column=1).value = record.date.strftime('%Y-%m-%d')
-                ws.cell(row=row_idx, column=2).value = round(record.kg, 2)
-                ws.cell(row=row_idx, column=3).value = round(record.bundles, 2)
-                ws.cell(row=row_idx, column=4).value = record.notes or ''
-                total_kg += record.kg
-                total_bundles += record.bundles
-
-            # Add summary section
-            summary_row = len(records) + 3
-            ws.cell(row=summary_row, column=1).value = "SUMMARY"
-            ws.cell(row=summary_row, column=1).font = Font(bold=True, size=12)
-
-            summary_data = [
-                ('Total KG:', total_kg),
-                ('Total Bundles:', total_bundles),
-                ('Number of Entries:', len(records)),
-                ('Average per Day:', round(total_kg / max(len(set(r.date for r in records)), 1), 2) if records else 0),
-                ('Date Range:', f"{start_date} to {end_date}")
-            ]
-
-            for idx, (label, value) in enumerate(summary_data, 1):
-                ws.cell(row=summary_row + idx, column=1).value = label
-                ws.cell(row=summary_row + idx, column=1).font = Font(bold=True)
-                ws.cell(row=summary_row + idx, column=2).value = value
-
-            # Adjust column widths
-            ws.column_dimensions['A'].width = 15
-            ws.column_dimensions['B'].width = 15
-            ws.column_dimensions['C'].width = 15
-            ws.column_dimensions['D'].width = 30
-
-            # Prepare response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            return export_response(
+                request,
+                f'Feed_Stock_Report_{start_date}_to_{end_date}',
+                feed_stock_export(start_date, end_date),
             )
-            response['Content-Disposition'] = f'attachment; filename="Feed_Stock_Report_{start_date}_to_{end_date}.xlsx"'
-            wb.save(response)
-            return response
 
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
@@ -1357,6 +761,71 @@ def feed_stock_download_excel(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+# Shared by the male and female birds views: rows built from batches annotated
+# with with_stats(), so a batch's aggregates are computed once per request
+def _stock_row(stock):
+    return {
+        'id': stock.id,
+        'initial_birds': stock.initial_birds,
+        'current_birds': stock.get_current_birds(),
+        'mortality': stock.get_current_mortality(),
+        'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else '',
+        'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else '',
+        'status': stock.status,
+        'notes': stock.notes,
+        'created_at': stock.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _flock_dashboard(stocks):
+    """Totals and details of the active batches among stocks (newest first)"""
+    today = timezone.now().date()
+    active_stocks = [stock for stock in stocks if stock.status == 'active']
+    batches_detail = [{
+        'id': stock.id,
+        'initial_birds': stock.initial_birds,
+        'current_birds': stock.get_current_birds(),
+        'mortality': stock.get_current_mortality(),
+        'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else None,
+        'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else None,
+        'days_running': (today - stock.batch_start_date).days if stock.batch_start_date else 0,
+        'status': stock.status
+    } for stock in active_stocks]
+    return {
+        'total_initial_birds': sum(batch['initial_birds'] for batch in batches_detail),
+        'total_current_birds': sum(batch['current_birds'] for batch in batches_detail),
+        'total_mortality': sum(batch['mortality'] for batch in batches_detail),
+        'active_batches': len(active_stocks),
+        'ended_batches': sum(1 for stock in stocks if stock.status == 'ended'),
+        'batches': batches_detail
+    }
+
+
+def _mortality_row(record):
+    return {
+        'id': record.id,
+        'date': record.date.strftime('%Y-%m-%d'),
+        'mortality_count': record.mortality_count,
+        'mortality_reason': record.mortality_reason,
+        'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _flock_bootstrap(request, stock_model, mortality_model):
+    """Dashboard, batch list and first mortality page of one flock in a single payload"""
+    stocks = list(stock_model.objects.with_stats().order_by('-batch_start_date'))
+    mortality_records, next_cursor = keyset_page(_filtered_rows(mortality_model.objects.all(), request), request)
+    return JsonResponse({
+        'success': True,
+        'dashboard': _flock_dashboard(stocks),
+        'stocks': [_stock_row(stock) for stock in stocks],
+        'mortality': {
+            'data': [_mortality_row(record) for record in mortality_records],
+            'next_cursor': next_cursor
+        }
+    })
+
+
 # Male Birds Stock Views
 @login_required
 def male_birds_stock_save(request):
@@ -1419,27 +888,13 @@ def male_birds_stock_save(request):
 
 
 @login_required
+@conditional_on(lambda request: [MaleBirdsStock.objects.all(), MaleBirdsMortality.objects.all()])
 def male_birds_stock_list(request):
     """Get list of male birds stock entries with status and current birds"""
     if request.method == 'GET':
         try:
-            stocks = MaleBirdsStock.objects.all().order_by('-batch_start_date')
-            data = []
-            for stock in stocks:
-                current_mortality = stock.get_current_mortality()
-                current_birds = stock.get_current_birds()
-                
-                data.append({
-                    'id': stock.id,
-                    'initial_birds': stock.initial_birds,
-                    'current_birds': current_birds,
-                    'mortality': current_mortality,
-                    'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else '',
-                    'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else '',
-                    'status': stock.status,
-                    'notes': stock.notes,
-                    'created_at': stock.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                })
+            stocks = MaleBirdsStock.objects.with_stats().order_by('-batch_start_date')
+            data = [_stock_row(stock) for stock in stocks]
             return JsonResponse({'success': True, 'data': data})
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -1540,19 +995,14 @@ def male_birds_mortality_save(request):
 
 
 @login_required
+@conditional_on(_mortality_list_sources(MaleBirdsMortality))
 def male_birds_mortality_list(request):
-    """Get list of male birds mortality entries"""
+    """Get a page of male birds mortality entries, optionally for one batch or date range"""
     if request.method == 'GET':
         try:
-            mortality_records = MaleBirdsMortality.objects.all().order_by('-date')
-            data = [{
-                'id': record.id,
-                'date': record.date.strftime('%Y-%m-%d'),
-                'mortality_count': record.mortality_count,
-                'mortality_reason': record.mortality_reason,
-                'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            } for record in mortality_records]
-            return JsonResponse({'success': True, 'data': data})
+            mortality_records, next_cursor = keyset_page(_filtered_rows(MaleBirdsMortality.objects.all(), request), request)
+            data = [_mortality_row(record) for record in mortality_records]
+            return JsonResponse({'success': True, 'data': data, 'next_cursor': next_cursor})
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
 
@@ -1599,67 +1049,16 @@ def male_birds_mortality_delete(request, mortality_id):
 
 
 @login_required
+@cached_response(MaleBirdsStock, MaleBirdsMortality)
 def male_birds_dashboard(request):
     """Get male birds dashboard data - calculates total for all active batches"""
     if request.method == 'GET':
         try:
-            # Get all active batches
-            active_stocks = MaleBirdsStock.objects.filter(status='active').order_by('-batch_start_date')
-            
-            if not active_stocks.exists():
-                return JsonResponse({
-                    'success': True,
-                    'data': {
-                        'total_initial_birds': 0,
-                        'total_current_birds': 0,
-                        'total_mortality': 0,
-                        'active_batches': 0,
-                        'ended_batches': 0,
-                        'batches': []
-                    }
-                })
-            
-            today = timezone.now().date()
-            total_initial_birds = 0
-            total_current_birds = 0
-            total_mortality = 0
-            batches_detail = []
-            
-            # Calculate totals for all active batches
-            for stock in active_stocks:
-                current_mortality = stock.get_current_mortality()
-                current_birds = stock.get_current_birds()
-                days_running = (today - stock.batch_start_date).days if stock.batch_start_date else 0
-                
-                total_initial_birds += stock.initial_birds
-                total_current_birds += current_birds
-                total_mortality += current_mortality
-                
-                batches_detail.append({
-                    'id': stock.id,
-                    'initial_birds': stock.initial_birds,
-                    'current_birds': current_birds,
-                    'mortality': current_mortality,
-                    'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else None,
-                    'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else None,
-                    'days_running': days_running,
-                    'status': stock.status
-                })
-            
-            # Count active and ended batches
-            active_count = MaleBirdsStock.objects.filter(status='active').count()
-            ended_count = MaleBirdsStock.objects.filter(status='ended').count()
-            
+            # Active batch totals and details; all batches come from one annotated query
+            stocks = list(MaleBirdsStock.objects.with_stats().order_by('-batch_start_date'))
             return JsonResponse({
                 'success': True,
-                'data': {
-                    'total_initial_birds': total_initial_birds,
-                    'total_current_birds': total_current_birds,
-                    'total_mortality': total_mortality,
-                    'active_batches': active_count,
-                    'ended_batches': ended_count,
-                    'batches': batches_detail
-                }
+                'data': _flock_dashboard(stocks)
             })
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -1667,7 +1066,21 @@ def male_birds_dashboard(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+
 @login_required
+@conditional_on(lambda request: [MaleBirdsStock.objects.all(), MaleBirdsMortality.objects.all()])
+def male_birds_bootstrap(request):
+    """Everything the male birds page shows on load, in one request"""
+    if request.method == 'GET':
+        try:
+            return _flock_bootstrap(request, MaleBirdsStock, MaleBirdsMortality)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+@login_required
+@conditional_on(_flock_report_sources(MaleBirdsStock, MaleBirdsMortality))
 def male_birds_report_data(request):
     """Get male birds report data with date filtering"""
     if request.method == 'GET':
@@ -1681,6 +1094,9 @@ def male_birds_report_data(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
+            if wants_csv(request):
+                return export_response(request, f'male_birds_report_{start_date}_{end_date}', flock_export('male', start_date, end_date))
+
             mortality_records = MaleBirdsMortality.objects.filter(
                 date__range=[start_date, end_date]
             ).order_by('-date')
@@ -1717,92 +1133,11 @@ def male_birds_download_excel(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-            # Create workbook
-            wb = Workbook()
-            wb.remove(wb.active)  # Remove default sheet
-
-            # ===== SHEET 1: Mortality Report =====
-            ws_mortality = wb.create_sheet('Mortality Report')
-            
-            # Get mortality records for the date range
-            mortality_records = MaleBirdsMortality.objects.filter(
-                date__range=[start_date, end_date]
-            ).order_by('date')
-
-            # Add headers
-            headers = ['Date', 'Mortality Count', 'Mortality Reason']
-            ws_mortality.append(headers)
-
-            # Style headers
-            header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-            header_font = Font(bold=True, color='FFFFFF')
-            for cell in ws_mortality[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Add data
-            cumulative_mortality = 0
-            for record in mortality_records:
-                cumulative_mortality += record.mortality_count
-                ws_mortality.append([
-                    record.date.strftime('%Y-%m-%d'),
-                    record.mortality_count,
-                    record.mortality_reason or ''
-                ])
-
-            # Add summary section
-            ws_mortality.append([])
-            ws_mortality.append(['Summary'])
-            ws_mortality.append(['Total Mortality:', cumulative_mortality])
-
-            # Adjust column widths
-            ws_mortality.column_dimensions['A'].width = 15
-            ws_mortality.column_dimensions['B'].width = 15
-            ws_mortality.column_dimensions['C'].width = 30
-
-            # ===== SHEET 2: Batch History =====
-            ws_batch = wb.create_sheet('Batch History')
-
-            # Get all male birds batches
-            all_batches = MaleBirdsStock.objects.all().order_by('-batch_start_date')
-
-            # Add headers
-            batch_headers = ['Start Date', 'End Date', 'Initial Birds', 'Status', 'Total Mortality', 'Current Birds', 'Notes']
-            ws_batch.append(batch_headers)
-
-            # Style headers
-            for cell in ws_batch[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Add batch data
-            for batch in all_batches:
-                batch_mortality = batch.get_current_mortality()
-                current_birds = batch.get_current_birds()
-                ws_batch.append([
-                    batch.batch_start_date.strftime('%Y-%m-%d') if batch.batch_start_date else '',
-                    batch.batch_end_date.strftime('%Y-%m-%d') if batch.batch_end_date else '',
-                    batch.initial_birds,
-                    batch.status,
-                    batch_mortality,
-                    current_birds,
-                    batch.notes or ''
-                ])
-
-            # Adjust column widths for batch sheet
-            ws_batch.column_dimensions['A'].width = 15
-            ws_batch.column_dimensions['B'].width = 15
-            ws_batch.column_dimensions['C'].width = 15
-            ws_batch.column_dimensions['D'].width = 12
-            ws_batch.column_dimensions['E'].width = 15
-            ws_batch.column_dimensions['F'].width = 15
-            ws_batch.column_dimensions['G'].width = 25
-
-            # Create response
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="male_birds_report_{start_date}_{end_date}.xlsx"'
-            wb.save(response)
-            return response
+            return export_response(
+                request,
+                f'male_birds_report_{start_date}_{end_date}',
+                flock_export('male', start_date, end_date),
+            )
 
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
@@ -1874,27 +1209,13 @@ def female_birds_stock_save(request):
 
 
 @login_required
+@conditional_on(lambda request: [FemaleBirdsStock.objects.all(), FemaleBirdsMortality.objects.all()])
 def female_birds_stock_list(request):
     """Get list of female birds stock entries with status and current birds"""
     if request.method == 'GET':
         try:
-            stocks = FemaleBirdsStock.objects.all().order_by('-batch_start_date')
-            data = []
-            for stock in stocks:
-                current_mortality = stock.get_current_mortality()
-                current_birds = stock.get_current_birds()
-                
-                data.append({
-                    'id': stock.id,
-                    'initial_birds': stock.initial_birds,
-                    'current_birds': current_birds,
-                    'mortality': current_mortality,
-                    'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else '',
-                    'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else '',
-                    'status': stock.status,
-                    'notes': stock.notes,
-                    'created_at': stock.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                })
+            stocks = FemaleBirdsStock.objects.with_stats().order_by('-batch_start_date')
+            data = [_stock_row(stock) for stock in stocks]
             return JsonResponse({'success': True, 'data': data})
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -1993,19 +1314,14 @@ def female_birds_mortality_save(request):
 
 
 @login_required
+@conditional_on(_mortality_list_sources(FemaleBirdsMortality))
 def female_birds_mortality_list(request):
-    """Get list of female birds mortality entries"""
+    """Get a page of female birds mortality entries, optionally for one batch or date range"""
     if request.method == 'GET':
         try:
-            mortality_records = FemaleBirdsMortality.objects.all().order_by('-date')
-            data = [{
-                'id': record.id,
-                'date': record.date.strftime('%Y-%m-%d'),
-                'mortality_count': record.mortality_count,
-                'mortality_reason': record.mortality_reason,
-                'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            } for record in mortality_records]
-            return JsonResponse({'success': True, 'data': data})
+            mortality_records, next_cursor = keyset_page(_filtered_rows(FemaleBirdsMortality.objects.all(), request), request)
+            data = [_mortality_row(record) for record in mortality_records]
+            return JsonResponse({'success': True, 'data': data, 'next_cursor': next_cursor})
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
 
@@ -2052,67 +1368,16 @@ def female_birds_mortality_delete(request, mortality_id):
 
 
 @login_required
+@cached_response(FemaleBirdsStock, FemaleBirdsMortality)
 def female_birds_dashboard(request):
     """Get female birds dashboard data - calculates total for all active batches"""
     if request.method == 'GET':
         try:
-            # Get all active batches
-            active_stocks = FemaleBirdsStock.objects.filter(status='active').order_by('-batch_start_date')
-            
-            if not active_stocks.exists():
-                return JsonResponse({
-                    'success': True,
-                    'data': {
-                        'total_initial_birds': 0,
-                        'total_current_birds': 0,
-                        'total_mortality': 0,
-                        'active_batches': 0,
-                        'ended_batches': 0,
-                        'batches': []
-                    }
-                })
-            
-            today = timezone.now().date()
-            total_initial_birds = 0
-            total_current_birds = 0
-            total_mortality = 0
-            batches_detail = []
-            
-            # Calculate totals for all active batches
-            for stock in active_stocks:
-                current_mortality = stock.get_current_mortality()
-                current_birds = stock.get_current_birds()
-                days_running = (today - stock.batch_start_date).days if stock.batch_start_date else 0
-                
-                total_initial_birds += stock.initial_birds
-                total_current_birds += current_birds
-                total_mortality += current_mortality
-                
-                batches_detail.append({
-                    'id': stock.id,
-                    'initial_birds': stock.initial_birds,
-                    'current_birds': current_birds,
-                    'mortality': current_mortality,
-                    'batch_start_date': stock.batch_start_date.strftime('%Y-%m-%d') if stock.batch_start_date else None,
-                    'batch_end_date': stock.batch_end_date.strftime('%Y-%m-%d') if stock.batch_end_date else None,
-                    'days_running': days_running,
-                    'status': stock.status
-                })
-            
-            # Count active and ended batches
-            active_count = FemaleBirdsStock.objects.filter(status='active').count()
-            ended_count = FemaleBirdsStock.objects.filter(status='ended').count()
-            
+            # Active batch totals and details; all batches come from one annotated query
+            stocks = list(FemaleBirdsStock.objects.with_stats().order_by('-batch_start_date'))
             return JsonResponse({
                 'success': True,
-                'data': {
-                    'total_initial_birds': total_initial_birds,
-                    'total_current_birds': total_current_birds,
-                    'total_mortality': total_mortality,
-                    'active_batches': active_count,
-                    'ended_batches': ended_count,
-                    'batches': batches_detail
-                }
+                'data': _flock_dashboard(stocks)
             })
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -2120,7 +1385,21 @@ def female_birds_dashboard(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+
 @login_required
+@conditional_on(lambda request: [FemaleBirdsStock.objects.all(), FemaleBirdsMortality.objects.all()])
+def female_birds_bootstrap(request):
+    """Everything the female birds page shows on load, in one request"""
+    if request.method == 'GET':
+        try:
+            return _flock_bootstrap(request, FemaleBirdsStock, FemaleBirdsMortality)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+@login_required
+@conditional_on(_flock_report_sources(FemaleBirdsStock, FemaleBirdsMortality))
 def female_birds_report_data(request):
     """Get female birds report data with date filtering"""
     if request.method == 'GET':
@@ -2134,6 +1413,9 @@ def female_birds_report_data(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
+            if wants_csv(request):
+                return export_response(request, f'female_birds_report_{start_date}_{end_date}', flock_export('female', start_date, end_date))
+
             mortality_records = FemaleBirdsMortality.objects.filter(
                 date__range=[start_date, end_date]
             ).order_by('-date')
@@ -2170,92 +1452,11 @@ def female_birds_download_excel(request):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-            # Create workbook
-            wb = Workbook()
-            wb.remove(wb.active)  # Remove default sheet
-
-            # ===== SHEET 1: Mortality Report =====
-            ws_mortality = wb.create_sheet('Mortality Report')
-            
-            # Get mortality records for the date range
-            mortality_records = FemaleBirdsMortality.objects.filter(
-                date__range=[start_date, end_date]
-            ).order_by('date')
-
-            # Add headers
-            headers = ['Date', 'Mortality Count', 'Mortality Reason']
-            ws_mortality.append(headers)
-
-            # Style headers
-            header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-            header_font = Font(bold=True, color='FFFFFF')
-            for cell in ws_mortality[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Add data
-            cumulative_mortality = 0
-            for record in mortality_records:
-                cumulative_mortality += record.mortality_count
-                ws_mortality.append([
-                    record.date.strftime('%Y-%m-%d'),
-                    record.mortality_count,
-                    record.mortality_reason or ''
-                ])
-
-            # Add summary section
-            ws_mortality.append([])
-            ws_mortality.append(['Summary'])
-            ws_mortality.append(['Total Mortality:', cumulative_mortality])
-
-            # Adjust column widths
-            ws_mortality.column_dimensions['A'].width = 15
-            ws_mortality.column_dimensions['B'].width = 15
-            ws_mortality.column_dimensions['C'].width = 30
-
-            # ===== SHEET 2: Batch History =====
-            ws_batch = wb.create_sheet('Batch History')
-
-            # Get all female birds batches
-            all_batches = FemaleBirdsStock.objects.all().order_by('-batch_start_date')
-
-            # Add headers
-            batch_headers = ['Start Date', 'End Date', 'Initial Birds', 'Status', 'Total Mortality', 'Current Birds', 'Notes']
-            ws_batch.append(batch_headers)
-
-            # Style headers
-            for cell in ws_batch[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Add batch data
-            for batch in all_batches:
-                batch_mortality = batch.get_current_mortality()
-                current_birds = batch.get_current_birds()
-                ws_batch.append([
-                    batch.batch_start_date.strftime('%Y-%m-%d') if batch.batch_start_date else '',
-                    batch.batch_end_date.strftime('%Y-%m-%d') if batch.batch_end_date else '',
-                    batch.initial_birds,
-                    batch.status,
-                    batch_mortality,
-                    current_birds,
-                    batch.notes or ''
-                ])
-
-            # Adjust column widths for batch sheet
-            ws_batch.column_dimensions['A'].width = 15
-            ws_batch.column_dimensions['B'].width = 15
-            ws_batch.column_dimensions['C'].width = 15
-            ws_batch.column_dimensions['D'].width = 12
-            ws_batch.column_dimensions['E'].width = 15
-            ws_batch.column_dimensions['F'].width = 15
-            ws_batch.column_dimensions['G'].width = 25
-
-            # Create response
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="female_birds_report_{start_date}_{end_date}.xlsx"'
-            wb.save(response)
-            return response
+            return export_response(
+                request,
+                f'female_birds_report_{start_date}_{end_date}',
+                flock_export('female', start_date, end_date),
+            )
 
         except ValueError:
             return JsonResponse({'success': False, 'message': 'Invalid date format'})
@@ -2265,6 +1466,57 @@ def female_birds_download_excel(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+# Bulk Record Views
+@login_required
+def records_bulk(request):
+    """
+    Save many records of mixed types from a JSON body {"records": [...]} in one
+    transaction (see myapp.bulk); returns the result of every record
+    """
+    if request.method == 'POST':
+        try:
+            try:
+                records = json.loads(request.body).get('records')
+            except (ValueError, AttributeError):
+                return JsonResponse({'success': False, 'message': 'Body must be a JSON object with a records list'}, status=400)
+            results = save_records(records)
+            return JsonResponse({'success': True, 'message': f'{len(results)} records saved successfully', 'results': results})
+        except InvalidRecords as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'{e}; nothing was saved',
+                'results': e.results,
+            }, status=400)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
+@login_required
+def import_records(request):
+    """Import historical records of one type from an uploaded CSV/XLSX file (see myapp.imports)"""
+    if request.method == 'POST':
+        try:
+            if 'records_file' not in request.FILES:
+                return JsonResponse({'success': False, 'message': 'No file provided'}, status=400)
+            records_file = request.FILES['records_file']
+            summary = import_file(records_file.file, records_file.name, request.POST.get('type'))
+            return JsonResponse({
+                'success': True,
+                'message': f"{summary['created'] + summary['updated']} rows imported, {summary['failed']} rows skipped",
+                **summary,
+            })
+        except ImportFileError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': f'Error importing records: {str(e)}'}, status=400)
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
 # Egg Out Views
 @login_required
 def eggout_save(request):
@@ -2303,27 +1555,20 @@ def eggout_save(request):
 
 
 @login_required
+@conditional_on(_eggout_list_sources)
 def eggout_list(request):
     """Get list of egg out entries"""
     if request.method == 'GET':
         try:
-            start_date = request.GET.get('start_date')
-            end_date = request.GET.get('end_date')
-            
-            query = EggOut.objects.all()
-            
-            if start_date:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(date__gte=start_date)
-            
-            if end_date:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(date__lte=end_date)
-            
-            entries = query.order_by('-date').values('id', 'date', 'egg_out_count', 'notes')
+            # One page of the entries in the optional date range
+            entries, next_cursor = keyset_page(
+                _filtered_rows(EggOut.objects.all(), request).values('id', 'date', 'egg_out_count', 'notes'),
+                request,
+            )
             return JsonResponse({
                 'success': True,
-                'entries': list(entries)
+                'entries': entries,
+                'next_cursor': next_cursor
             })
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -2369,6 +1614,7 @@ def eggout_delete(request, eggout_id):
 
 
 @login_required
+@cached_response(DailyRecordSIAF, EggOut)
 def eggout_dashboard(request):
     """Get egg out dashboard data with optional date range filtering"""
     if request.method == 'GET':
@@ -2397,11 +1643,7 @@ def eggout_dashboard(request):
                     pass
             
             # Calculate total eggs
-            total_eggs = 0
-            for record in siaf_query:
-                morning_eggs = record.total_egg_morning or 0
-                evening_eggs = record.total_egg_evening or 0
-                total_eggs += morning_eggs + evening_eggs
+            total_eggs = siaf_query.aggregate(total=models.Sum('total_eggs'))['total'] or 0
             
             # Build query for EggOut records
             eggout_query = EggOut.objects.all()
@@ -2437,52 +1679,13 @@ def eggout_download_excel(request):
         try:
             start_date = request.GET.get('start_date')
             end_date = request.GET.get('end_date')
-            
-            query = EggOut.objects.all()
-            
+
             if start_date:
                 start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(date__gte=start_date)
-            else:
-                start_date = "N/A"
-            
             if end_date:
                 end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(date__lte=end_date)
-            else:
-                end_date = "N/A"
-            
-            entries = query.order_by('-date')
-            
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Egg Out Report"
-            
-            # Add headers
-            headers = ['Date', 'Egg Out Count', 'Notes']
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num)
-                cell.value = header
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            
-            # Add data
-            for row_num, entry in enumerate(entries, 2):
-                ws.cell(row=row_num, column=1).value = entry.date.strftime('%Y-%m-%d')
-                ws.cell(row=row_num, column=2).value = entry.egg_out_count
-                ws.cell(row=row_num, column=3).value = entry.notes
-            
-            # Adjust column widths
-            ws.column_dimensions['A'].width = 15
-            ws.column_dimensions['B'].width = 18
-            ws.column_dimensions['C'].width = 30
-            
-            # Create response
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = 'attachment; filename="egg_out_report.xlsx"'
-            wb.save(response)
-            return response
+
+            return export_response(request, 'egg_out_report', egg_out_export(start_date, end_date))
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
     
@@ -2500,38 +1703,54 @@ def eggout(request):
 # Backup and Restore Views
 @login_required
 def export_backup(request):
-    """Export all database data as JSON"""
+    """
+    Stream all database data as JSON (format=ndjson for NDJSON, gzip=1 to compress,
+    format=npz for a columnar snapshot, see myapp.snapshot).
+    With since (an ISO date or date-time, at most TOMBSTONE_RETENTION ago), only
+    the changes after it; the X-Backup-Watermark header holds the since to use
+    for the next one. It lags the start of the export by WATERMARK_MARGIN, as rows
+    saved before the export by transactions that commit after it are only visible then.
+    """
     if request.method == 'GET':
         try:
-            # Collect all data from all models
-            backup_data = {
-                'daily_records_siaf': list(DailyRecordSIAF.objects.values()),
-                'feed_stock': list(FeedStock.objects.values()),
-                'male_birds_stock': list(MaleBirdsStock.objects.values()),
-                'male_birds_mortality': list(MaleBirdsMortality.objects.values()),
-                'female_birds_stock': list(FemaleBirdsStock.objects.values()),
-                'female_birds_mortality': list(FemaleBirdsMortality.objects.values()),
-                'egg_out': list(EggOut.objects.values()),
-            }
-            
-            # Convert datetime objects to ISO format strings
-            def convert_datetimes(data):
-                if isinstance(data, dict):
-                    return {k: convert_datetimes(v) for k, v in data.items()}
-                elif isinstance(data, list):
-                    return [convert_datetimes(item) for item in data]
-                elif isinstance(data, datetime):
-                    return data.isoformat()
-                return data
-            
-            backup_data = convert_datetimes(backup_data)
-            
-            # Create JSON response
-            response = HttpResponse(
-                json.dumps(backup_data, indent=2, default=str),
-                content_type='application/json'
+            since = None
+            if request.GET.get('since'):
+                try:
+                    since = datetime.fromisoformat(request.GET['since'])
+                except ValueError:
+                    return JsonResponse({'success': False, 'message': 'Invalid since, use YYYY-MM-DD or YYYY-MM-DDTHH:MM'}, status=400)
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+                if since < timezone.now() - TOMBSTONE_RETENTION:
+                    # Deletions before then may have been pruned
+                    return JsonResponse({'success': False, 'message': 'since is older than the kept deletions; take a full backup'}, status=400)
+            # Taken before reading, so changes made during the export are in the next one too
+            watermark = backup_watermark()
+
+            if request.GET.get('format') == 'npz':
+                if since:
+                    return JsonResponse({'success': False, 'message': 'Snapshots are always complete; since is not supported'}, status=400)
+                # A zip archive needs a seekable file
+                output = tempfile.TemporaryFile()
+                write_snapshot(output)
+                output.seek(0)
+                return FileResponse(output, as_attachment=True, filename='nv_poultry_snapshot.npz', content_type='application/octet-stream')
+
+            ndjson = request.GET.get('format') == 'ndjson'
+            compress = request.GET.get('gzip') == '1'
+            filename = 'nv_poultry_backup_changes' if since else 'nv_poultry_backup'
+            filename += '.ndjson' if ndjson else '.json'
+            content_type = 'application/x-ndjson' if ndjson else 'application/json'
+            if compress:
+                filename += '.gz'
+                content_type = 'application/gzip'
+
+            # Rows go from the database cursor to the client without being collected first
+            response = StreamingHttpResponse(
+                backup_stream(ndjson=ndjson, compress=compress, since=since), content_type=content_type,
             )
-            response['Content-Disposition'] = 'attachment; filename="nv_poultry_backup.json"'
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response['X-Backup-Watermark'] = watermark.isoformat()
             return response
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)}, status=400)
@@ -2541,7 +1760,7 @@ def export_backup(request):
 
 @login_required
 def import_backup(request):
-    """Import JSON backup data and restore to database"""
+    """Import JSON backup data and restore to database (mode=merge to apply it on top of the existing data)"""
     if request.method == 'POST':
         try:
             # Check if file is provided
@@ -2549,139 +1768,27 @@ def import_backup(request):
                 return JsonResponse({'success': False, 'message': 'No file provided'}, status=400)
             
             backup_file = request.FILES['backup_file']
+            ndjson = '.ndjson' in backup_file.name
+            merge = request.POST.get('mode') == 'merge'
+            
+            # Read twice as a stream: validated as a whole, then restored in one transaction
+            open_rows = lambda: read_backup(backup_file.file, ndjson=ndjson)
+            if backup_file.name.endswith('.npz'):
+                if merge:
+                    return JsonResponse({'success': False, 'message': 'A snapshot replaces all data and cannot be merged'}, status=400)
+                restored = restore_snapshot(backup_file.file)
+            else:
+                restored = merge_backup(open_rows) if merge else restore_backup(open_rows)
             
-            # Read JSON file
-            backup_content = backup_file.read().decode('utf-8')
-            backup_data = json.loads(backup_content)
-            
-            # Clear existing data
-            DailyRecordSIAF.objects.all().delete()
-            FeedStock.objects.all().delete()
-            MaleBirdsStock.objects.all().delete()
-            MaleBirdsMortality.objects.all().delete()
-            FemaleBirdsStock.objects.all().delete()
-            FemaleBirdsMortality.objects.all().delete()
-            EggOut.objects.all().delete()
-            
-            # Helper function to convert datetime strings
-            def convert_field(value):
-                if isinstance(value, str):
-                    try:
-                        # Try to parse as datetime
-                        return datetime.fromisoformat(value)
-                    except (ValueError, TypeError):
-                        try:
-                            # Try to parse as date
-                            return datetime.fromisoformat(value).date()
-                        except (ValueError, TypeError):
-                            return value
-                return value
-            
-            # Restore Batch data first (they don't depend on anything)
-            if 'male_birds_stock' in backup_data:
-                for record in backup_data['male_birds_stock']:
-                    # Preserve ID for foreign key relationships
-                    record_id = record.pop('id', None)
-                    if 'batch_start_date' in record and record['batch_start_date']:
-                        record['batch_start_date'] = convert_field(record['batch_start_date'])
-                    if 'batch_end_date' in record and record['batch_end_date']:
-                        record['batch_end_date'] = convert_field(record['batch_end_date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = MaleBirdsStock(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            if 'female_birds_stock' in backup_data:
-                for record in backup_data['female_birds_stock']:
-                    # Preserve ID for foreign key relationships
-                    record_id = record.pop('id', None)
-                    if 'batch_start_date' in record and record['batch_start_date']:
-                        record['batch_start_date'] = convert_field(record['batch_start_date'])
-                    if 'batch_end_date' in record and record['batch_end_date']:
-                        record['batch_end_date'] = convert_field(record['batch_end_date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = FemaleBirdsStock(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            # Restore Mortality data (depends on batch data)
-            if 'male_birds_mortality' in backup_data:
-                for record in backup_data['male_birds_mortality']:
-                    record_id = record.pop('id', None)
-                    batch_id = record.get('batch_id')
-                    if 'date' in record:
-                        record['date'] = convert_field(record['date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = MaleBirdsMortality(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            if 'female_birds_mortality' in backup_data:
-                for record in backup_data['female_birds_mortality']:
-                    record_id = record.pop('id', None)
-                    batch_id = record.get('batch_id')
-                    if 'date' in record:
-                        record['date'] = convert_field(record['date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = FemaleBirdsMortality(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            # Restore other data
-            if 'daily_records_siaf' in backup_data:
-                for record in backup_data['daily_records_siaf']:
-                    record_id = record.pop('id', None)
-                    if 'date' in record:
-                        record['date'] = convert_field(record['date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = DailyRecordSIAF(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            if 'feed_stock' in backup_data:
-                for record in backup_data['feed_stock']:
-                    record_id = record.pop('id', None)
-                    if 'date' in record:
-                        record['date'] = convert_field(record['date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = FeedStock(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            if 'egg_out' in backup_data:
-                for record in backup_data['egg_out']:
-                    record_id = record.pop('id', None)
-                    if 'date' in record:
-                        record['date'] = convert_field(record['date'])
-                    if 'created_at' in record:
-                        record['created_at'] = convert_field(record['created_at'])
-                    if 'updated_at' in record:
-                        record['updated_at'] = convert_field(record['updated_at'])
-                    obj = EggOut(**record)
-                    obj.id = record_id
-                    obj.save()
-            
-            return JsonResponse({'success': True, 'message': 'Backup imported successfully! All data has been restored.'})
+            return JsonResponse({
+                'success': True,
+                'message': 'Backup merged successfully!' if merge else 'Backup imported successfully! All data has been restored.',
+                'restored': restored,
+            })
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'message': 'Invalid JSON file format'}, status=400)
+        except BackupError as e:
+            return JsonResponse({'success': False, 'message': f'Invalid backup: {str(e)}'}, status=400)
         except Exception as e:
             return JsonResponse({'success': False, 'message': f'Error importing backup: {str(e)}'}, status=400)
     
@@ -2693,4 +1800,45 @@ def import_backup(request):
 def backup(request):
     user_groups = request.user.groups.all()
     u = request.user
-    return render(request, "backup.html", {'user_groups': user_groups, 'u': u})
\ No newline at end of file
+    return render(request, "backup.html", {'user_groups': user_groups, 'u': u})
+
+# Background Export Job Views
+@login_required
+def export_job_submit(request):
+    """Queue an export (or reuse an identical pending/cached one) and return its job"""
+    if request.method == 'POST':
+        try:
+            kind = request.POST.get('kind')
+            params = parse_params(kind, request.POST)
+            job, created = submit_export(kind, params, request.user)
+            return JsonResponse({'success': True, 'created': created, 'job': job_status(job)})
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
+@login_required
+def export_job_status(request, job_id):
+    """Get the status and progress of an export job"""
+    if request.method == 'GET':
+        job = get_object_or_404(ExportJob, id=job_id)
+        return JsonResponse({'success': True, 'job': job_status(job)})
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
+@login_required
+def export_job_download(request, job_id):
+    """Download the file of a finished export job"""
+    if request.method == 'GET':
+        job = get_object_or_404(ExportJob, id=job_id)
+        if job.status != 'done' or not job.file_path:
+            return JsonResponse({'success': False, 'message': 'Export is not ready yet'})
+        try:
+            output = open(job.file_path, 'rb')
+        except FileNotFoundError:
+            return JsonResponse({'success': False, 'message': 'Export file is no longer available, please export again'})
+        return FileResponse(output, as_attachment=True, filename=job.filename, content_type=EXPORTS[job.kind].content_type)
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})